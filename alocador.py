@@ -0,0 +1,1219 @@
+"""
+Alocação de professores especialistas nas grades das turmas.
+
+Converte os DataFrames de professores e rotas em estruturas de trabalho e
+resolve a grade de um bloco (escola × dia × turno), respeitando as regras
+de regras_alocacao.py. Não depende do Streamlit.
+"""
+
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Tuple, Optional, Union
+
+import pandas as pd
+
+from config import (
+    SLOTS_AULA, MAX_TENTATIVAS_ALOCACAO, PROCESSOS_GERACAO,
+    TENTATIVAS_ANTES_BUSCA_LOCAL, TEMPO_BUSCA_LOCAL, ITERACOES_BUSCA_LOCAL
+)
+from utils import padronizar, padronizar_materia_interna
+from regras_alocacao import (
+    verificar_compatibilidade_regiao, verificar_janelas_mascara, REGRA_CARGA_HORARIA
+)
+from inteligencia import construir_indice_demanda
+
+
+def carregar_objs(df: pd.DataFrame) -> List[Dict]:
+    """
+    Converte o DataFrame de professores nos objetos usados pelo alocador.
+
+    Args:
+        df: DataFrame de professores (COLS_PADRAO["Professores"])
+
+    Returns:
+        Lista de dicionários de professor (um por CÓDIGO)
+    """
+    professores = {}
+    for _, r in df.iterrows():
+        cod = str(r['CÓDIGO'])
+        mats = [padronizar_materia_interna(m) for m in str(r['COMPONENTES']).split(',') if m]
+        vinc = str(r['VÍNCULO']).strip().upper()
+        professores[cod] = {
+            'id': cod, 'nome': r['NOME'], 'mats': set(mats), 'reg': padronizar(r['REGIÃO']),
+            'vin': vinc, 'tf': padronizar(r['TURNO_FIXO']),
+            'escolas_base': set([padronizar(x) for x in str(r['ESCOLAS_ALOCADAS']).split(',') if padronizar(x)]),
+            'max': int(r['CARGA_HORÁRIA']), 'atrib': 0, 'ocup': {}, 'mascara': 0, 'mascaras_escola': {},
+            'escolas_reais': set(), 'regs_alocadas_historico': set()
+        }
+    return list(professores.values())
+
+
+def carregar_rotas(df: pd.DataFrame) -> Dict[str, set]:
+    """
+    Converte o DataFrame de agrupamentos em {escola: escolas da mesma rota}.
+    """
+    m = {}
+    for _, row in df.iterrows():
+        escs = [padronizar(x) for x in str(row['LISTA_ESCOLAS']).split(',') if padronizar(x)]
+        for e in escs: m[e] = set(escs)
+    return m
+
+
+# ==========================================
+# REGIÕES E ESCOLAS INTERNADAS (MATRIZES)
+# ==========================================
+def _pontos_regiao(reg_prof: str, reg_escola: str) -> int:
+    """Pontos de região do score (0 = o professor não pode dar aula na região)."""
+    # REGRA: Verificar compatibilidade de região
+    pode_dar_aula, prioridade_regiao = verificar_compatibilidade_regiao(reg_prof, reg_escola)
+    if not pode_dar_aula:
+        return 0
+
+    # Alta prioridade: Mesma região ou compatibilidade Fundão ↔ Timbuí
+    # REGRA GERAL: Fundão e Timbuí são compatíveis para TODAS as matérias
+    if ((reg_prof == "FUNDÃO" and reg_escola == "TIMBUÍ") or \
+        (reg_prof == "TIMBUÍ" and reg_escola == "FUNDÃO")):
+        return prioridade_regiao * 1500  # Bonus para facilitar alocação entre Fundão e Timbuí
+    return prioridade_regiao * 1000
+
+
+def internar_regiao(matriz: Dict, reg: str) -> int:
+    """
+    Id inteiro da região na matriz de pontos de região, acrescentando a
+    linha e a coluna dela se ainda não estiver lá.
+
+    Args:
+        matriz: {'ids' {região: id}, 'nomes' [região], 'pontos' [[pontos]]},
+            com pontos[id da região do professor][id da região da escola]
+        reg: Região (como está nos dados)
+    """
+    i = matriz['ids'].get(reg)
+    if i is None:
+        i = len(matriz['nomes'])
+        matriz['ids'][reg] = i
+        matriz['nomes'].append(reg)
+        for linha in matriz['pontos']:
+            linha.append(0)
+        matriz['pontos'].append([0] * (i + 1))
+        for j, outra in enumerate(matriz['nomes']):
+            matriz['pontos'][i][j] = _pontos_regiao(reg, outra)
+            matriz['pontos'][j][i] = _pontos_regiao(outra, reg)
+    return i
+
+
+def construir_indice_escolas(rotas: Dict[str, set], escolas=None) -> Dict:
+    """
+    Interna as escolas em ids inteiros e pré-calcula a matriz de rotas
+    (aba Agrupamentos).
+
+    Args:
+        rotas: {escola: escolas da mesma rota} (carregar_rotas)
+        escolas: Outras escolas a internar, ex.: as do mapa escola → região (opcional)
+
+    Returns:
+        {'ids' {escola: id}, 'mesma_rota' [bytearray]}, com mesma_rota[i][j] = 1
+        se uma das escolas está na rota da outra
+    """
+    ids = {}
+    for escola in rotas:
+        ids.setdefault(escola, len(ids))
+        for outra in sorted(rotas[escola]):
+            ids.setdefault(outra, len(ids))
+    for escola in (escolas if escolas is not None else []):
+        ids.setdefault(padronizar(escola), len(ids))
+
+    mesma_rota = [bytearray(len(ids)) for _ in range(len(ids))]
+    for escola, mesmas in rotas.items():
+        i = ids[escola]
+        for outra in mesmas:
+            j = ids[outra]
+            mesma_rota[i][j] = mesma_rota[j][i] = 1
+    return {'ids': ids, 'mesma_rota': mesma_rota}
+
+
+# ==========================================
+# ÍNDICE DE CANDIDATOS (MATÉRIA × REGIÃO)
+# ==========================================
+def construir_indice_candidatos(profs: List[Dict], regioes=None) -> Dict:
+    """
+    Índice dos professores elegíveis por (matéria, região da escola).
+
+    Matéria e região do professor não mudam durante a geração, então a
+    filtragem por matéria e a compatibilidade de região (com a pontuação
+    correspondente) são calculadas uma vez: as regiões são internadas em uma
+    matriz de pontos (internar_regiao). Os pares não pré-calculados são
+    completados sob demanda por candidatos_elegiveis.
+
+    Args:
+        profs: Professores (carregar_objs); o índice guarda referências a eles
+        regioes: Regiões das escolas a pré-calcular (opcional)
+
+    Returns:
+        {'profs', 'por_materia' {mat: [prof]}, 'candidatos' {(mat, reg): [(prof, pontos_regiao)]},
+         'regioes' (matriz de internar_regiao)}
+    """
+    regioes_matriz = {'ids': {}, 'nomes': [], 'pontos': []}
+    por_materia = {}
+    for p in profs:
+        internar_regiao(regioes_matriz, p['reg'])
+        for mat in p['mats']:
+            por_materia.setdefault(mat, []).append(p)
+
+    indice = {'profs': profs, 'por_materia': por_materia, 'candidatos': {}, 'regioes': regioes_matriz}
+    for reg in set(padronizar(r) for r in (regioes if regioes is not None else [])):
+        for mat in por_materia:
+            candidatos_elegiveis(indice, mat, reg)
+    return indice
+
+
+def candidatos_elegiveis(indice: Dict, mat: str, reg: str) -> List[Tuple[Dict, int]]:
+    """
+    Professores que lecionam a matéria e podem dar aula na região, na ordem
+    de profs, com os pontos de região já aplicados ao score.
+
+    Args:
+        indice: Índice de construir_indice_candidatos
+        mat: Matéria (padronizada)
+        reg: Região da escola (padronizada)
+    """
+    chave = (mat, reg)
+    lista = indice['candidatos'].get(chave)
+    if lista is None:
+        lista = []
+        matriz = indice['regioes']
+        j = internar_regiao(matriz, reg)
+        for p in indice['por_materia'].get(mat, []):
+            # Compatibilidade e pontos de região pré-calculados (0 = incompatível)
+            pontos = matriz['pontos'][matriz['ids'][p['reg']]][j]
+            if pontos:
+                lista.append((p, pontos))
+        indice['candidatos'][chave] = lista
+    return lista
+
+
+# ==========================================
+# ESTADO DA ALOCAÇÃO (REGISTRO PARA DESFAZER)
+# ==========================================
+# A ocupação do professor no bloco dia/turno fica em p['ocup'] ({slot: escola})
+# e, em paralelo, em bitmasks de slots: p['mascara'] (todas as aulas) e
+# p['mascaras_escola'] ({escola: máscara}, só escolas com aula). As máscaras
+# dão conflito, janela e contiguidade em O(1); o dicionário dá a escola de cada slot.
+def definir_ocupacao(prof: Dict, ocup: Dict[int, str]):
+    """Substitui a ocupação do professor ({slot: escola}), recalculando as máscaras."""
+    prof['ocup'] = dict(ocup)
+    prof['mascara'] = 0
+    prof['mascaras_escola'] = {}
+    for slot, escola in ocup.items():
+        prof['mascara'] |= 1 << slot
+        prof['mascaras_escola'][escola] = prof['mascaras_escola'].get(escola, 0) | (1 << slot)
+
+
+def atribuir_aula(prof: Dict, slot: int, escola: str, registro: List):
+    """
+    Atribui uma aula ao professor e anota a operação no registro (undo log).
+
+    Args:
+        prof: Professor (alterado no lugar)
+        slot: Slot da aula (0 a SLOTS_AULA-1)
+        escola: Escola da aula
+        registro: Lista de operações da tentativa atual
+    """
+    escola_nova = escola not in prof['escolas_reais']
+    prof['ocup'][slot] = escola
+    prof['mascara'] |= 1 << slot
+    prof['mascaras_escola'][escola] = prof['mascaras_escola'].get(escola, 0) | (1 << slot)
+    prof['atrib'] += 1
+    if escola_nova:
+        prof['escolas_reais'].add(escola)
+    registro.append((prof, slot, escola, escola_nova))
+
+
+def desfazer_atribuicoes(registro: List):
+    """
+    Desfaz, em ordem inversa, as aulas anotadas no registro e o esvazia.
+    Só o que a tentativa fez é revertido; o restante do estado fica intacto.
+    """
+    while registro:
+        prof, slot, escola, escola_nova = registro.pop()
+        del prof['ocup'][slot]
+        prof['mascara'] &= ~(1 << slot)
+        restante = prof['mascaras_escola'][escola] & ~(1 << slot)
+        if restante:
+            prof['mascaras_escola'][escola] = restante
+        else:
+            del prof['mascaras_escola'][escola]
+        prof['atrib'] -= 1
+        if escola_nova:
+            prof['escolas_reais'].discard(escola)
+
+
+def desfazer_carga(registros: List[List], mantidos: List[List]):
+    """
+    Desfaz só a carga (atrib) e as escolas visitadas das aulas anotadas nos
+    registros, que podem ser de blocos diferentes, e os esvazia.
+
+    A ocupação não é tocada: ela é de um único bloco por vez e é refeita por
+    preparar_ocupacao. Uma escola só sai de escolas_reais se nenhuma aula
+    dos registros mantidos for nela.
+
+    Args:
+        registros: Registros (atribuir_aula) a desfazer
+        mantidos: Registros dos blocos cujas aulas continuam valendo
+    """
+    visitadas = {(id(p), escola) for registro in mantidos for p, _, escola, _ in registro}
+    for registro in registros:
+        while registro:
+            prof, _, escola, escola_nova = registro.pop()
+            prof['atrib'] -= 1
+            if escola_nova and (id(prof), escola) not in visitadas:
+                prof['escolas_reais'].discard(escola)
+
+
+# ==========================================
+# RESOLUÇÃO DE UM BLOCO DE TURMAS
+# ==========================================
+def chave_turma(turma: Dict) -> Tuple[str, str]:
+    """Chave da turma na grade: (escola, turma), única em toda a rede."""
+    return (turma['escola_real'], turma['nome_turma'])
+
+
+def grade_inicial(turmas: List[Dict]) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Grade do bloco antes da alocação: "---" em todos os slots, exceto as
+    células travadas de cada turma (turma['fixas'] = {slot: valor}).
+    """
+    grade = {}
+    for turma in turmas:
+        aulas = ["---"] * SLOTS_AULA
+        for slot, valor in turma.get('fixas', {}).items():
+            aulas[slot] = valor
+        grade[chave_turma(turma)] = aulas
+    return grade
+
+
+def somar_estatisticas(estatisticas: Optional[Dict], tentativas: int, aulas: int, faltas: int):
+    """Acumula os números de um bloco no dicionário de estatísticas, se houver."""
+    if estatisticas is None:
+        return
+    for chave, valor in (('blocos', 1), ('tentativas', tentativas), ('aulas', aulas), ('faltas', faltas)):
+        estatisticas[chave] = estatisticas.get(chave, 0) + valor
+
+
+def semente_do_bloco(semente: Optional[Union[int, str]], chave: Tuple) -> Optional[str]:
+    """
+    Semente própria de um bloco (dia, turno, escola), derivada da semente da
+    geração. Não depende da ordem nem do processo em que o bloco é resolvido.
+    """
+    if semente is None:
+        return None
+    return ":".join(str(parte) for parte in (semente,) + tuple(chave))
+
+
+# Contadores do diagnóstico por (escola, matéria): avaliações e descartes por regra
+REGRAS_DIAGNOSTICO = ('avaliacoes', 'materia', 'turno_fixo', 'regiao', 'carga', 'conflito', 'janela')
+
+
+def somar_tempo(diagnostico: Dict, fase: str, segundos: float):
+    """Acumula os segundos de uma fase em diagnostico['tempos']."""
+    tempos = diagnostico.setdefault('tempos', {})
+    tempos[fase] = tempos.get(fase, 0.0) + segundos
+
+
+def somar_diagnostico(diagnostico: Optional[Dict], chave: Tuple, diagnostico_bloco: Dict):
+    """
+    Soma o diagnóstico de um bloco ao da rede, com as regras por
+    (escola, dia, turno, matéria).
+
+    Args:
+        diagnostico: Acumulador da rede (None = nada a fazer)
+        chave: Chave do bloco (dia, turno, escola)
+        diagnostico_bloco: Preenchido pelo resolver_grade_inteligente
+    """
+    if diagnostico is None:
+        return
+    dia, turno, _ = chave
+    regras = diagnostico.setdefault('regras', {})
+    for (esc, mat), contadores in diagnostico_bloco.get('regras', {}).items():
+        total = regras.setdefault((esc, dia, turno, mat), dict.fromkeys(contadores, 0))
+        for nome, valor in contadores.items():
+            total[nome] += valor
+    for fase, segundos in diagnostico_bloco.get('tempos', {}).items():
+        somar_tempo(diagnostico, fase, segundos)
+
+
+def resolver_grade_inteligente(
+    turmas: List,
+    curriculo: pd.DataFrame,
+    profs: List,
+    rotas: Dict,
+    turno_atual: str,
+    mapa_escola_regiao: Dict,
+    max_tentativas: int = MAX_TENTATIVAS_ALOCACAO,
+    indice_demanda: Optional[Dict] = None,
+    indice_candidatos: Optional[Dict] = None,
+    semente: Optional[Union[int, str]] = None,
+    estatisticas: Optional[Dict] = None,
+    tempo_busca_local: float = TEMPO_BUSCA_LOCAL,
+    indice_escolas: Optional[Dict] = None,
+    diagnostico: Optional[Dict] = None
+) -> Tuple[bool, Dict, str, List]:
+    """
+    Aloca professores nas aulas de especialistas de um bloco de turmas, que
+    pode reunir várias escolas do mesmo dia/turno (aulas simultâneas).
+
+    Cada tentativa embaralha as demandas, atende primeiro as que têm menos
+    candidatos e escolhe, para cada uma, o melhor candidato pelas regras.
+    As atribuições são feitas direto nos professores e anotadas em um
+    registro; entre tentativas, só elas são desfeitas. A busca para assim
+    que todas as aulas possíveis forem alocadas, e a melhor tentativa
+    permanece aplicada em profs, de modo que carga e escolas acumulam
+    entre os blocos.
+
+    Com a busca local ativa (tempo_busca_local > 0), são feitos só
+    TENTATIVAS_ANTES_BUSCA_LOCAL reinícios gulosos; a melhor tentativa é
+    então melhorada por melhorar_com_busca_local, que preenche vagas
+    remanejando aulas entre professores e reduz escolas, deslocamentos e
+    janelas de cada professor.
+
+    Só os professores de indice_candidatos para (matéria, região) são
+    examinados; sem índice (ou com índice de outra lista), ele é montado aqui.
+
+    Células travadas (turma['fixas']) não são alocadas: o valor delas vai
+    direto para a grade, e a ocupação e a carga dos professores travados
+    já devem estar aplicadas em profs (ver preparar_ocupacao).
+
+    Args:
+        semente: Semente do embaralhamento (None = aleatório); com a mesma
+            semente e o mesmo estado inicial, o resultado é sempre o mesmo
+        estatisticas: Dicionário acumulador (opcional) de blocos, tentativas,
+            aulas e faltas, somados a cada chamada
+        tempo_busca_local: Segundos de busca local (0 = desativada); com
+            semente, só o limite de ITERACOES_BUSCA_LOCAL vale, para que o
+            resultado seja reproduzível
+        indice_escolas: Escolas internadas e matriz de rotas
+            (construir_indice_escolas), usadas na busca local; montado aqui se ausente
+        diagnostico: Dicionário acumulador (opcional) do rastro da alocação:
+            em 'regras' {(escola, matéria): contadores}, as aulas, as aulas
+            sem professor, as avaliações de candidatos e quantos candidatos
+            cada regra descartou (somados em todas as tentativas gulosas),
+            e em 'tempos' os segundos de cada fase. O deslocamento entre
+            escolas sem rota só é bloqueado no mesmo slot, então entra em
+            'conflito'. Sem ele (None), nada é contado
+
+    Returns:
+        (sucesso, grade {(escola, turma): [prof por slot]}, mensagem, profs)
+    """
+    contar = diagnostico is not None
+    if contar:
+        inicio = time.perf_counter()
+    turno_atual = padronizar(turno_atual)
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(pd.DataFrame(), curriculo)
+    if indice_candidatos is None or indice_candidatos['profs'] is not profs:
+        indice_candidatos = construir_indice_candidatos(profs)
+
+    # Preparar demandas REAIS
+    demandas = []
+    for turma in turmas:
+        esc, reg = padronizar(turma['escola_real']), padronizar(turma['regiao_real'])
+        fixas = turma.get('fixas', {})
+        for slot, mat in enumerate(indice_demanda['aulas'].get(turma['ano'], [])[:SLOTS_AULA]):
+            if mat != "---" and slot not in fixas:
+                demandas.append({
+                    'chave': chave_turma(turma),
+                    'mat': mat,
+                    'slot': slot,
+                    'esc': esc,
+                    'reg': reg,
+                    # Candidatos possíveis (matéria/região/turno), para atender antes as aulas mais difíceis
+                    'n_candidatos': sum(1 for p, _ in candidatos_elegiveis(indice_candidatos, mat, reg)
+                                        if not p['tf'] or p['tf'] in ["AMBOS", "", turno_atual])
+                })
+                if contar:
+                    demandas[-1]['rejeicoes'] = dict.fromkeys(REGRAS_DIAGNOSTICO, 0)
+
+    # Se não há demandas, retornar grade vazia
+    if not demandas:
+        somar_estatisticas(estatisticas, 0, 0, 0)
+        if contar:
+            somar_tempo(diagnostico, 'preparacao', time.perf_counter() - inicio)
+        return True, grade_inicial(turmas), "Nenhuma demanda de especialistas", profs
+
+    aleatorio = random.Random(semente) if semente is not None else random
+
+    # Aulas sem nenhum candidato nunca serão alocadas: é o mínimo de faltas possível
+    minimo_faltas = sum(1 for d in demandas if d['n_candidatos'] == 0)
+
+    registro = []  # Atribuições da tentativa atual (para desfazer)
+    melhor = None  # (faltas, grade, [(prof, slot, escola)]) da melhor tentativa desfeita
+    if tempo_busca_local > 0:
+        max_tentativas = min(max_tentativas, TENTATIVAS_ANTES_BUSCA_LOCAL)
+    if contar:
+        n_profs = len(indice_candidatos['profs'])
+        agora = time.perf_counter()
+        somar_tempo(diagnostico, 'preparacao', agora - inicio)
+        inicio = agora
+
+    # NÃO criar professores durante alocação - será consolidado depois
+    for tentativa in range(max_tentativas):
+        if tentativa > 0:
+            desfazer_atribuicoes(registro)
+        grade = grade_inicial(turmas)
+        aleatorio.shuffle(demandas)
+        demandas.sort(key=lambda d: d['n_candidatos'])  # Estável: empates seguem o embaralhamento
+
+        faltas = 0
+
+        for item in demandas:
+            mat, slot, esc, reg = item['mat'], item['slot'], item['esc'], item['reg']
+            bit = 1 << slot
+
+            # Encontrar candidatos
+            candidatos = []
+
+            # Matéria e região já filtradas pelo índice
+            elegiveis = candidatos_elegiveis(indice_candidatos, mat, reg)
+            if contar:
+                rejeicoes = item['rejeicoes']
+                rejeicoes['avaliacoes'] += 1
+                n_materia = len(indice_candidatos['por_materia'].get(mat, ()))
+                rejeicoes['materia'] += n_profs - n_materia
+                rejeicoes['regiao'] += n_materia - len(elegiveis)
+            for p, pontos_regiao in elegiveis:
+                # REGRA: Verificar turno fixo (se aplicável)
+                if p['tf'] and p['tf'] not in ["AMBOS", "", turno_atual]:
+                    if contar:
+                        rejeicoes['turno_fixo'] += 1
+                    continue
+
+                # REGRA: Verificar limite de carga horária
+                if p['atrib'] >= min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"]):
+                    if contar:
+                        rejeicoes['carga'] += 1
+                    continue
+
+                # REGRA 1: Verificar conflito de horário (mesmo slot = impossível)
+                # Vale para toda a rede: o bloco reúne as escolas do mesmo dia/turno.
+                # Cobre também o deslocamento entre escolas sem rota, que só é
+                # bloqueado no mesmo slot (1ª aula escola A, 3ª aula escola B é permitido)
+                if p['mascara'] & bit:
+                    if contar:
+                        rejeicoes['conflito'] += 1
+                    continue  # Professor já está ocupado neste horário
+
+                # REGRA 4: Verificar janelas/buracos entre aulas (apenas na mesma escola)
+                # Janelas são permitidas entre escolas diferentes (professor pode se deslocar)
+                mascara_escola = p['mascaras_escola'].get(esc, 0)
+                if mascara_escola:
+                    tem_janela, _ = verificar_janelas_mascara(mascara_escola, 0, slot)
+                    if tem_janela:
+                        if contar:
+                            rejeicoes['janela'] += 1
+                        continue  # Criaria janela/buraco na mesma escola
+
+                # Score de prioridade (quanto maior, melhor)
+                score = 0
+
+                # Máxima prioridade: Professor efetivo na escola base
+                if p['vin'] == "EFETIVO" and esc in p['escolas_base']:
+                    score += 100000
+
+                # Alta prioridade: Mesma região ou compatibilidade Fundão ↔ Timbuí (pré-calculado)
+                score += pontos_regiao
+
+                # Prioridade: Escola base do professor
+                if esc in p['escolas_base']:
+                    score += 2000
+
+                # Prioridade: Escola já visitada pelo professor
+                if esc in p['escolas_reais']:
+                    score += 1000
+
+                # Prioridade: Carga disponível (preferir professores com mais espaço)
+                score += (REGRA_CARGA_HORARIA["maximo_aulas"] - p['atrib']) * 10
+
+                # Prioridade: Aulas consecutivas na mesma escola
+                if mascara_escola:
+                    score += 500
+
+                candidatos.append((score, p))
+
+            if candidatos:
+                # Escolhe o melhor (o primeiro entre empatados, como na ordenação estável)
+                escolhido = max(candidatos, key=lambda x: x[0])[1]
+                grade[item['chave']][slot] = escolhido['id']
+                atribuir_aula(escolhido, slot, esc, registro)
+                item['prof'] = escolhido
+            else:
+                # NÃO criar professores durante alocação - será consolidado depois
+                # Marcar como não alocado ("---") para consolidação posterior
+                item['prof'] = None
+                faltas += 1
+
+        if faltas == 0 or faltas == minimo_faltas:
+            # Nenhuma tentativa pode alocar mais: as faltas restantes não têm candidato
+            break
+
+        if melhor is None or faltas < melhor[0]:
+            melhor = (faltas, grade, [(p, s, e) for p, s, e, _ in registro],
+                      [(item['chave'], item['slot'], item['prof']) for item in demandas])
+    else:
+        # Se não conseguiu, volta para a melhor tentativa (com menos aulas sem professor)
+        if faltas > melhor[0]:
+            desfazer_atribuicoes(registro)
+            for p, slot, esc in melhor[2]:
+                atribuir_aula(p, slot, esc, registro)
+            faltas, grade = melhor[0], melhor[1]
+            prof_de = {(chave, slot): p for chave, slot, p in melhor[3]}
+            for item in demandas:
+                item['prof'] = prof_de[(item['chave'], item['slot'])]
+    tentativas = tentativa + 1
+    if contar:
+        agora = time.perf_counter()
+        somar_tempo(diagnostico, 'guloso', agora - inicio)
+        inicio = agora
+
+    # Busca local a partir da melhor tentativa: vagas e deslocamentos
+    sufixo = ""
+    if tempo_busca_local > 0:
+        if indice_escolas is None:
+            indice_escolas = construir_indice_escolas(rotas, mapa_escola_regiao)
+        desfazer_atribuicoes(registro)
+        atribuicao, iteracoes = melhorar_com_busca_local(
+            demandas, [item['prof'] for item in demandas], indice_candidatos, indice_escolas, turno_atual,
+            aleatorio, tempo_limite=None if semente is not None else tempo_busca_local
+        )
+        grade = grade_inicial(turmas)
+        for item, p in zip(demandas, atribuicao):
+            item['prof'] = p
+            if p is not None:
+                grade[item['chave']][item['slot']] = p['id']
+                atribuir_aula(p, item['slot'], item['esc'], registro)
+        preenchidas = faltas - sum(1 for p in atribuicao if p is None)
+        faltas -= preenchidas
+        sufixo = f"; busca local: {iteracoes} movimentos" + (f", +{preenchidas} aula(s)" if preenchidas else "")
+        if contar:
+            somar_tempo(diagnostico, 'busca_local', time.perf_counter() - inicio)
+
+    somar_estatisticas(estatisticas, tentativas, len(demandas), faltas)
+    if contar:
+        regras = diagnostico.setdefault('regras', {})
+        for item in demandas:
+            contadores = regras.setdefault((item['esc'], item['mat']),
+                                           dict.fromkeys(('aulas', 'sem_professor') + REGRAS_DIAGNOSTICO, 0))
+            contadores['aulas'] += 1
+            contadores['sem_professor'] += item['prof'] is None
+            for nome, valor in item['rejeicoes'].items():
+                contadores[nome] += valor
+    if faltas == 0:
+        return True, grade, f"Sucesso na tentativa {tentativas}{sufixo}", profs
+    if faltas == minimo_faltas:
+        return False, grade, f"{faltas} aula(s) sem professor possível (tentativa {tentativas}){sufixo}", profs
+    return False, grade, f"Não foi possível alocar todas as aulas ({faltas} sem professor){sufixo}", profs
+
+
+# ==========================================
+# BUSCA LOCAL (MELHORIA DA GRADE GULOSA)
+# ==========================================
+# Pesos do custo da busca local: uma aula preenchida vale mais que qualquer melhoria
+PESO_FALTA = 1_000_000
+PESO_ESCOLA = 1000        # Cada escola diferente do professor no bloco
+PESO_DESLOCAMENTO = 500   # Aulas seguidas em escolas diferentes, fora da mesma rota
+PESO_JANELA = 300         # Horário vago entre a primeira e a última aula do professor
+DURACAO_TABU = 20         # Iterações em que uma aula não volta ao professor que a perdeu
+PACIENCIA_BUSCA_LOCAL = 1000  # Iterações sem melhora antes de encerrar
+
+
+def melhorar_com_busca_local(
+    demandas: List[Dict],
+    atribuicao: List[Optional[Dict]],
+    indice_candidatos: Dict,
+    indice_escolas: Dict,
+    turno_atual: str,
+    aleatorio,
+    tempo_limite: Optional[float] = None,
+    max_iteracoes: int = ITERACOES_BUSCA_LOCAL
+) -> Tuple[List[Optional[Dict]], int]:
+    """
+    Busca local (recozimento simulado com lista tabu) sobre a atribuição
+    gulosa de um bloco.
+
+    Movimentos: preencher uma aula vaga com um candidato à força (a aula
+    que ele perde é reencaixada em outro professor), trocar o professor de
+    uma aula e trocar entre si os professores de duas aulas do mesmo slot.
+    Só estados válidos são visitados (matéria, região, turno, carga, um
+    professor por slot e aulas contíguas na mesma escola). O custo soma as
+    faltas, as escolas, os deslocamentos e as janelas de cada professor,
+    menos as preferências fixas do score guloso (efetivo na escola base,
+    região, escola base e escolas já visitadas).
+
+    Os professores não são alterados: a ocupação e a carga de partida
+    (blocos anteriores e aulas fixas) são lidas deles, e a atribuição
+    devolvida deve ser aplicada com atribuir_aula.
+
+    Args:
+        demandas: Demandas do bloco (chave, mat, slot, esc, reg)
+        atribuicao: Professor (ou None) de cada demanda, na mesma ordem
+        indice_escolas: Escolas internadas e matriz de rotas (construir_indice_escolas)
+        aleatorio: Gerador aleatório (random.Random ou o módulo random)
+        tempo_limite: Segundos máximos (None = só o limite de iterações)
+        max_iteracoes: Limite de movimentos examinados
+
+    Returns:
+        (melhor atribuição encontrada, iterações)
+    """
+    maximo = REGRA_CARGA_HORARIA["maximo_aulas"]
+    id_escola, mesma_rota = indice_escolas['ids'], indice_escolas['mesma_rota']
+
+    # Candidatos de cada demanda no estado de partida e preferência fixa de cada par
+    candidatos = []
+    preferencia = {}
+    por_id = {p['id']: p for p in atribuicao if p is not None}
+    for d, item in enumerate(demandas):
+        lista = []
+        esc = item['esc']
+        for p, pontos_regiao in candidatos_elegiveis(indice_candidatos, item['mat'], item['reg']):
+            if p['tf'] and p['tf'] not in ["AMBOS", "", turno_atual]:
+                continue
+            if item['slot'] in p['ocup'] or p['atrib'] >= min(p['max'], maximo):
+                continue
+            lista.append(p)
+            por_id[p['id']] = p
+            score = pontos_regiao
+            if p['vin'] == "EFETIVO" and esc in p['escolas_base']:
+                score += 100000
+            if esc in p['escolas_base']:
+                score += 2000
+            if esc in p['escolas_reais']:
+                score += 1000
+            preferencia[(d, p['id'])] = score
+        candidatos.append(lista)
+    elegiveis = [{p['id'] for p in lista} for lista in candidatos]
+    capacidade = {pid: min(p['max'], maximo) - p['atrib'] for pid, p in por_id.items()}
+
+    por_slot = {}
+    for d, item in enumerate(demandas):
+        por_slot.setdefault(item['slot'], []).append(d)
+
+    atual = list(atribuicao)
+    aulas = {pid: {} for pid in por_id}  # {id: {slot: demanda}}
+    custos = {}
+    vagas = set()
+    total = 0
+
+    def ocupacao(pid):
+        ocup = dict(por_id[pid]['ocup'])
+        for slot, d in aulas[pid].items():
+            ocup[slot] = demandas[d]['esc']
+        return ocup
+
+    def custo_prof(pid):
+        if not aulas[pid]:
+            return 0
+        ocup = ocupacao(pid)
+        slots = sorted(ocup)
+        custo = PESO_ESCOLA * len(set(ocup.values()))
+        custo += PESO_JANELA * (slots[-1] - slots[0] + 1 - len(slots))
+        for s in slots:
+            e1, e2 = ocup[s], ocup.get(s + 1)
+            if e2 is not None and e1 != e2:
+                i, j = id_escola.get(e1), id_escola.get(e2)
+                if i is None or j is None or not mesma_rota[i][j]:
+                    custo += PESO_DESLOCAMENTO
+        return custo
+
+    def valido(pid):
+        if len(aulas[pid]) > capacidade[pid]:
+            return False
+        ocup = ocupacao(pid)
+        for esc in {demandas[d]['esc'] for d in aulas[pid].values()}:
+            slots = [s for s, e in ocup.items() if e == esc]
+            if max(slots) - min(slots) + 1 != len(slots):
+                return False  # Janela na mesma escola
+        return True
+
+    def livre(p, slot):
+        return slot not in p['ocup'] and slot not in aulas[p['id']]
+
+    def mover(d, p, mudancas):
+        """Passa a demanda d para p (None = vaga), anotando a mudança para desfazer."""
+        nonlocal total
+        antigo = atual[d]
+        slot = demandas[d]['slot']
+        if antigo is not None:
+            del aulas[antigo['id']][slot]
+            total += PESO_FALTA + preferencia.get((d, antigo['id']), 0)
+        if p is not None:
+            aulas[p['id']][slot] = d
+            total -= PESO_FALTA + preferencia.get((d, p['id']), 0)
+            vagas.discard(d)
+        elif candidatos[d]:
+            vagas.add(d)
+        atual[d] = p
+        mudancas.append((d, antigo))
+
+    def atualizar(pids):
+        nonlocal total
+        for pid in pids:
+            novo = custo_prof(pid)
+            total += novo - custos.get(pid, 0)
+            custos[pid] = novo
+
+    def desfazer(mudancas):
+        afetados = set()
+        for d, antigo in reversed(mudancas):
+            if atual[d] is not None:
+                afetados.add(atual[d]['id'])
+            if antigo is not None:
+                afetados.add(antigo['id'])
+            mover(d, antigo, [])
+        atualizar(afetados)
+
+    # Estado inicial
+    total = PESO_FALTA * len(demandas)
+    for d, p in enumerate(atual):
+        atual[d] = None
+        mover(d, p, [])
+    atualizar(list(por_id))
+
+    def reencaixar(d, mudancas, tabu, iteracao):
+        """Coloca a demanda d no candidato livre de menor custo (se houver)."""
+        slot = demandas[d]['slot']
+        melhor_q, melhor_total = None, None
+        for q in candidatos[d]:
+            if not livre(q, slot) or tabu.get((d, q['id']), -1) > iteracao:
+                continue
+            teste = []
+            mover(d, q, teste)
+            if valido(q['id']):
+                atualizar([q['id']])
+                if melhor_total is None or total < melhor_total:
+                    melhor_q, melhor_total = q, total
+            desfazer(teste)
+        if melhor_q is not None:
+            mover(d, melhor_q, mudancas)
+            atualizar([melhor_q['id']])
+
+    melhor, melhor_total = list(atual), total
+    tabu = {}
+    inicio = time.perf_counter()
+    iteracao = 0
+    sem_melhora = 0
+    while iteracao < max_iteracoes and sem_melhora < PACIENCIA_BUSCA_LOCAL:
+        if tempo_limite is not None and iteracao % 100 == 0 and time.perf_counter() - inicio > tempo_limite:
+            break
+        iteracao += 1
+        temperatura = PESO_ESCOLA * (1 - iteracao / max_iteracoes) + 1
+        antes = total
+        mudancas = []
+        afetados = set()
+
+        if vagas and aleatorio.random() < 0.6:
+            # Preencher uma vaga: o candidato assume a aula e libera o que impede
+            d = aleatorio.choice(sorted(vagas))
+            p = aleatorio.choice(candidatos[d])
+            pid, slot = p['id'], demandas[d]['slot']
+            if tabu.get((d, pid), -1) > iteracao:
+                continue
+            ejetadas = []
+            if slot in aulas[pid]:
+                ejetadas.append(aulas[pid][slot])
+            elif len(aulas[pid]) >= capacidade[pid]:
+                if not aulas[pid]:
+                    continue
+                ejetadas.append(aleatorio.choice(sorted(aulas[pid].values())))
+            for e in ejetadas:
+                mover(e, None, mudancas)
+            mover(d, p, mudancas)
+            if not valido(pid):
+                desfazer(mudancas)
+                continue
+            atualizar([pid])
+            for e in ejetadas:
+                tabu[(e, pid)] = iteracao + DURACAO_TABU
+                reencaixar(e, mudancas, tabu, iteracao)
+        else:
+            d = aleatorio.randrange(len(demandas))
+            p = atual[d]
+            if p is None:
+                continue
+            slot = demandas[d]['slot']
+            if aleatorio.random() < 0.5:
+                # Trocar o professor da aula
+                q = aleatorio.choice(candidatos[d])
+                if q is p or not livre(q, slot) or tabu.get((d, q['id']), -1) > iteracao:
+                    continue
+                mover(d, q, mudancas)
+                afetados = {p['id'], q['id']}
+            else:
+                # Trocar os professores de duas aulas do mesmo slot
+                d2 = aleatorio.choice(por_slot[slot])
+                q = atual[d2]
+                if q is None or q is p or q['id'] not in elegiveis[d] or p['id'] not in elegiveis[d2]:
+                    continue
+                mover(d, None, mudancas)
+                mover(d2, p, mudancas)
+                mover(d, q, mudancas)
+                afetados = {p['id'], q['id']}
+            if not all(valido(pid) for pid in afetados):
+                desfazer(mudancas)
+                continue
+            atualizar(afetados)
+
+        delta = total - antes
+        if delta <= 0 or aleatorio.random() < math.exp(-delta / temperatura):
+            if total < melhor_total:
+                melhor, melhor_total = list(atual), total
+                sem_melhora = 0
+            else:
+                sem_melhora += 1
+        else:
+            desfazer(mudancas)
+            sem_melhora += 1
+
+    return melhor, iteracao
+
+
+# ==========================================
+# ALOCAÇÃO DA REDE POR DIA/TURNO
+# ==========================================
+def preparar_ocupacao(profs: List, fixa: Optional[Dict] = None):
+    """
+    Zera a ocupação dos professores no início de um bloco dia/turno, mantendo
+    apenas as aulas fixas do bloco ({id: {slot: escola}}), se houver.
+    """
+    fixa = fixa or {}
+    for p in profs:
+        definir_ocupacao(p, fixa.get(p['id'], {}))
+
+
+def montar_particoes_rede(merged: pd.DataFrame) -> Dict[Tuple, List[Dict]]:
+    """
+    Agrupa as turmas da rede em blocos de aulas simultâneas.
+
+    Turmas com o mesmo DIA_PLANEJAMENTO e TURNO ficam no mesmo bloco, mesmo
+    em escolas diferentes, para que um professor não seja alocado em duas
+    escolas no mesmo horário. Turmas sem dia configurado ('NÃO CONFIGURADO')
+    ficam em um bloco por escola, já que o dia real delas é desconhecido.
+
+    Args:
+        merged: Turmas (dt) unidas à configuração de dias (dd), com
+            DIA_PLANEJAMENTO preenchido ('NÃO CONFIGURADO' quando ausente)
+
+    Returns:
+        {(dia, turno, escola ou None): [turma]} na ordem em que aparecem
+    """
+    particoes = {}
+    for r in merged.to_dict('records'):
+        dia, turno = r['DIA_PLANEJAMENTO'], r['TURNO']
+        escola = r['ESCOLA'] if dia == 'NÃO CONFIGURADO' else None
+        particoes.setdefault((dia, turno, escola), []).append({
+            'nome_turma': r['TURMA'],
+            'ano': r['SÉRIE/ANO'],
+            'escola_real': r['ESCOLA'],
+            'regiao_real': r['REGIÃO']
+        })
+    return particoes
+
+
+def grade_materias(turmas: List[Dict], indice_demanda: Dict) -> Dict[Tuple, List[str]]:
+    """
+    Matéria de cada slot das turmas de um bloco: a aula de especialista que
+    os resolvedores alocam naquele slot ("---" = sem aula de especialista).
+    É a grade paralela à de professores, na mesma ordem de slots. Células
+    travadas mantêm a matéria do Horario (turma['materias_fixas']).
+
+    Returns:
+        {(escola, turma): [matéria por slot]}
+    """
+    materias = {}
+    for turma in turmas:
+        aulas = list(indice_demanda['aulas'].get(turma['ano'], [])[:SLOTS_AULA])
+        aulas += ["---"] * (SLOTS_AULA - len(aulas))
+        for slot, mat in turma.get('materias_fixas', {}).items():
+            aulas[slot] = mat
+        materias[chave_turma(turma)] = aulas
+    return materias
+
+
+def juntar_materias_slots(materias: List[str]) -> str:
+    """Matérias dos slots no texto da coluna COMPONENTE do Horario ("ARTE,---,...")."""
+    return ",".join(materias)
+
+
+def ler_materias_slots(texto) -> Optional[List[str]]:
+    """
+    Matérias por slot gravadas na coluna COMPONENTE de uma linha do Horario.
+
+    Returns:
+        Lista com SLOTS_AULA matérias (formato interno), ou None se a linha não
+        tiver a grade de matérias (linhas antigas, editadas à mão ou de PL)
+    """
+    if not isinstance(texto, str) or texto.count(",") != SLOTS_AULA - 1:
+        return None
+    return [padronizar_materia_interna(m.strip()) or "---" for m in texto.split(",")]
+
+
+def linhas_horario(grade: Dict, dia: str, turno: str, materias: Optional[Dict] = None) -> List[List]:
+    """
+    Converte a grade {(escola, turma): [prof por slot]} em linhas da aba
+    Horario, na ordem de COLS_PADRAO["Horario"].
+
+    Args:
+        materias: Grade de matérias do bloco (grade_materias), gravada na
+            coluna COMPONENTE de cada linha (opcional)
+    """
+    materias = materias or {}
+    return [[esc, juntar_materias_slots(materias[(esc, t_nome)]) if (esc, t_nome) in materias else "",
+             "", t_nome, turno, dia] + list(aulas)
+            for (esc, t_nome), aulas in grade.items()]
+
+
+def resolver_rede(
+    particoes: Dict[Tuple, List[Dict]],
+    curriculo: pd.DataFrame,
+    profs: List,
+    rotas: Dict,
+    mapa_escola_regiao: Dict,
+    resolver: Callable = resolver_grade_inteligente,
+    indice_demanda: Optional[Dict] = None,
+    indice_candidatos: Optional[Dict] = None,
+    ao_resolver: Optional[Callable] = None,
+    semente: Optional[int] = None,
+    estatisticas: Optional[Dict] = None,
+    ocupacao_fixa: Optional[Dict] = None,
+    diagnostico: Optional[Dict] = None
+) -> List[List]:
+    """
+    Aloca a rede inteira, um bloco de aulas simultâneas (dia × turno) por vez.
+
+    A ocupação dos professores é zerada no início de cada bloco (dias/turnos
+    são independentes) e compartilhada por todas as escolas do bloco; a
+    carga e as escolas visitadas acumulam entre os blocos.
+
+    Args:
+        particoes: Blocos de montar_particoes_rede
+        resolver: resolver_grade_inteligente ou resolver_grade_exata
+        ao_resolver: Função chamada após cada bloco com
+            (dia, turno, turmas, sucesso, grade, mensagem), para exibir progresso
+        semente: Semente da geração (None = aleatória); cada bloco usa
+            semente_do_bloco
+        estatisticas: Acumulador repassado ao resolver (opcional)
+        ocupacao_fixa: Aulas já existentes por bloco, que não são refeitas
+            ({chave do bloco: {id: {slot: escola}}}, ver preparar_ocupacao)
+        diagnostico: Acumulador (opcional) do rastro da alocação, somado por
+            somar_diagnostico; só o resolver_grade_inteligente o preenche
+
+    Returns:
+        Linhas da aba Horario (COLS_PADRAO["Horario"]), com a matéria de cada
+        slot na coluna COMPONENTE (grade_materias)
+    """
+    ocupacao_fixa = ocupacao_fixa or {}
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(pd.DataFrame(), curriculo)
+    if indice_candidatos is None or indice_candidatos['profs'] is not profs:
+        indice_candidatos = construir_indice_candidatos(
+            profs, [t['regiao_real'] for turmas in particoes.values() for t in turmas]
+        )
+    indice_escolas = construir_indice_escolas(rotas, mapa_escola_regiao)
+
+    linhas = []
+    for chave, turmas in particoes.items():
+        dia, turno, _ = chave
+        # Cada dia/turno é independente (exceto pelas aulas fixas do próprio bloco)
+        preparar_ocupacao(profs, ocupacao_fixa.get(chave))
+        diagnostico_bloco = {} if diagnostico is not None else None
+
+        # Resolve o bloco (NÃO cria professores - apenas marca "---" se não encontrar)
+        sucesso, grade, mensagem, profs = resolver(
+            turmas, curriculo, profs, rotas, turno, mapa_escola_regiao,
+            indice_demanda=indice_demanda,
+            indice_candidatos=indice_candidatos,
+            indice_escolas=indice_escolas,
+            semente=semente_do_bloco(semente, chave),
+            estatisticas=estatisticas,
+            diagnostico=diagnostico_bloco
+        )
+        if diagnostico is not None:
+            somar_diagnostico(diagnostico, chave, diagnostico_bloco)
+        if ao_resolver is not None:
+            ao_resolver(dia, turno, turmas, sucesso, grade, mensagem)
+        linhas.extend(linhas_horario(grade, dia, turno, grade_materias(turmas, indice_demanda)))
+    return linhas
+
+
+# ==========================================
+# ALOCAÇÃO DA REDE EM PARALELO (PROCESSOS)
+# ==========================================
+def _resolver_particao(resolver: Callable, turmas: List[Dict], curriculo: pd.DataFrame,
+                       profs: List, rotas: Dict, turno: str, mapa_escola_regiao: Dict,
+                       indice_demanda: Dict, indice_escolas: Dict, semente: Optional[str],
+                       fixa: Optional[Dict], diagnostico: bool = False
+                       ) -> Tuple[bool, Dict, str, Dict, Optional[Dict]]:
+    """Resolve um bloco em um processo de trabalho, a partir do estado inicial de profs."""
+    preparar_ocupacao(profs, fixa)
+    estatisticas = {}
+    diagnostico_bloco = {} if diagnostico else None
+    sucesso, grade, mensagem, _ = resolver(
+        turmas, curriculo, profs, rotas, turno, mapa_escola_regiao,
+        indice_demanda=indice_demanda,
+        indice_escolas=indice_escolas,
+        semente=semente,
+        estatisticas=estatisticas,
+        diagnostico=diagnostico_bloco
+    )
+    return sucesso, grade, mensagem, estatisticas, diagnostico_bloco
+
+
+def resolver_rede_paralela(
+    particoes: Dict[Tuple, List[Dict]],
+    curriculo: pd.DataFrame,
+    profs: List,
+    rotas: Dict,
+    mapa_escola_regiao: Dict,
+    resolver: Callable = resolver_grade_inteligente,
+    indice_demanda: Optional[Dict] = None,
+    indice_candidatos: Optional[Dict] = None,
+    ao_resolver: Optional[Callable] = None,
+    processos: int = PROCESSOS_GERACAO,
+    semente: Optional[int] = None,
+    estatisticas: Optional[Dict] = None,
+    ocupacao_fixa: Optional[Dict] = None,
+    diagnostico: Optional[Dict] = None,
+    cancelado: Optional[Callable[[], bool]] = None
+) -> List[List]:
+    """
+    Como resolver_rede, mas resolve os blocos dia/turno em paralelo.
+
+    Os blocos não compartilham ocupação; só a carga acumulada (e as escolas
+    visitadas) os liga. Cada bloco é resolvido em um processo a partir do
+    mesmo estado inicial dos professores, e os resultados são fundidos na
+    ordem dos blocos: uma aula só é aceita se o professor ainda tiver carga
+    disponível. Os blocos que perderam aulas nessa fusão têm as aulas
+    aceitas desfeitas e são resolvidos de novo, em sequência, sobre o estado
+    fundido. A fusão não depende da ordem em que os processos terminam, e
+    cada bloco usa a mesma semente que teria em resolver_rede. No
+    diagnóstico, um bloco refeito conta só a nova resolução (os tempos das
+    duas são somados).
+
+    Args:
+        processos: Número máximo de processos (1 = sequencial)
+        cancelado: Consultada enquanto os processos trabalham e entre os
+            blocos refeitos; se True, os blocos ainda na fila do pool são
+            cancelados e nenhuma linha é devolvida (opcional)
+        (demais argumentos como em resolver_rede)
+
+    Returns:
+        Linhas da aba Horario (COLS_PADRAO["Horario"]); vazia se cancelada
+    """
+    if processos <= 1 or len(particoes) <= 1:
+        return resolver_rede(particoes, curriculo, profs, rotas, mapa_escola_regiao,
+                             resolver=resolver, indice_demanda=indice_demanda,
+                             indice_candidatos=indice_candidatos, ao_resolver=ao_resolver,
+                             semente=semente, estatisticas=estatisticas,
+                             ocupacao_fixa=ocupacao_fixa, diagnostico=diagnostico)
+
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(pd.DataFrame(), curriculo)
+    if indice_candidatos is None or indice_candidatos['profs'] is not profs:
+        indice_candidatos = construir_indice_candidatos(
+            profs, [t['regiao_real'] for turmas in particoes.values() for t in turmas]
+        )
+
+    ocupacao_fixa = ocupacao_fixa or {}
+    indice_escolas = construir_indice_escolas(rotas, mapa_escola_regiao)
+    preparar_ocupacao(profs)
+
+    # "spawn": processos limpos, sem herdar as threads do servidor
+    chaves = list(particoes.keys())
+    contexto = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=min(processos, len(chaves)), mp_context=contexto)
+    interrompido = False
+    try:
+        futuros = [
+            executor.submit(_resolver_particao, resolver, particoes[chave], curriculo, profs,
+                            rotas, chave[1], mapa_escola_regiao, indice_demanda, indice_escolas,
+                            semente_do_bloco(semente, chave), ocupacao_fixa.get(chave),
+                            diagnostico is not None)
+            for chave in chaves
+        ]
+        # Espera em passos curtos para atender o cancelamento sem aguardar o pool inteiro
+        pendentes = set(futuros)
+        while pendentes:
+            if cancelado is not None and cancelado():
+                interrompido = True
+                return []
+            concluidos, pendentes = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                futuro.result()  # Propaga logo o erro de um bloco
+        resultados = [f.result() for f in futuros]
+    finally:
+        # Cancelado: descarta os blocos na fila sem esperar os que estão em andamento
+        executor.shutdown(wait=not interrompido, cancel_futures=interrompido)
+
+    # Fusão determinística, na ordem dos blocos
+    por_id = {p['id']: p for p in profs}
+    maximo = REGRA_CARGA_HORARIA["maximo_aulas"]
+    fundidos = []
+    diagnosticos = {}
+    for chave, (sucesso, grade, mensagem, est_bloco, diag_bloco) in zip(chaves, resultados):
+        diagnosticos[chave] = diag_bloco
+        if estatisticas is not None:
+            for nome, valor in est_bloco.items():
+                estatisticas[nome] = estatisticas.get(nome, 0) + valor
+        preparar_ocupacao(profs, ocupacao_fixa.get(chave))
+        registro = []
+        perdeu_aulas = False
+        fixas = {chave_turma(t): t.get('fixas', {}) for t in particoes[chave]}
+        for (esc, t_nome), aulas in grade.items():
+            for slot, pid in enumerate(aulas):
+                if pid == "---" or slot in fixas[(esc, t_nome)]:
+                    continue  # Células travadas já estão na carga e na ocupação
+                p = por_id[pid]
+                if p['atrib'] < min(p['max'], maximo):
+                    atribuir_aula(p, slot, padronizar(esc), registro)
+                else:
+                    aulas[slot] = "---"
+                    perdeu_aulas = True
+        fundidos.append([chave, sucesso, grade, mensagem, registro, perdeu_aulas, est_bloco])
+
+    # Blocos que excederam a carga de algum professor: refazer sobre o estado fundido.
+    # A carga de todos eles é desfeita antes (a ocupação de cada bloco já foi
+    # substituída pela do bloco seguinte) e eles são resolvidos na ordem.
+    refazer = [item for item in fundidos if item[5]]
+    desfazer_carga([item[4] for item in refazer], [item[4] for item in fundidos if not item[5]])
+    for item in refazer:
+        if cancelado is not None and cancelado():
+            return []
+        chave, _, _, _, _, _, est_bloco = item
+        if estatisticas is not None:
+            # O bloco volta a ser contado pelo resolver (as tentativas já gastas continuam)
+            for nome in ('blocos', 'aulas', 'faltas'):
+                estatisticas[nome] -= est_bloco.get(nome, 0)
+        preparar_ocupacao(profs, ocupacao_fixa.get(chave))
+        if diagnostico is not None:
+            # Só os tempos da primeira resolução continuam valendo
+            diagnosticos[chave] = {'tempos': diagnosticos[chave].get('tempos', {})}
+        sucesso, grade, mensagem, profs = resolver(
+            particoes[chave], curriculo, profs, rotas, chave[1], mapa_escola_regiao,
+            indice_demanda=indice_demanda,
+            indice_candidatos=indice_candidatos,
+            indice_escolas=indice_escolas,
+            semente=semente_do_bloco(semente, chave),
+            estatisticas=estatisticas,
+            diagnostico=diagnosticos[chave]
+        )
+        item[1:4] = [sucesso, grade, f"{mensagem} (refeito após a fusão de carga)"]
+
+    linhas = []
+    for chave, sucesso, grade, mensagem, _, _, _ in fundidos:
+        if diagnostico is not None:
+            somar_diagnostico(diagnostico, chave, diagnosticos[chave])
+        dia, turno, _ = chave
+        if ao_resolver is not None:
+            ao_resolver(dia, turno, particoes[chave], sucesso, grade, mensagem)
+        linhas.extend(linhas_horario(grade, dia, turno, grade_materias(particoes[chave], indice_demanda)))
+    return linhas
@@ -0,0 +1,205 @@
+"""
+Modo exato do gerador de horários (CP-SAT do OR-Tools).
+
+Resolve o mesmo bloco de turmas (dia × turno da rede) que resolver_grade_inteligente,
+com as mesmas regras escritas como restrições e os termos do score como
+objetivo. O solver roda localmente com limite de tempo e devolve a melhor
+solução encontrada. Requer o pacote opcional `ortools`.
+"""
+
+import importlib.util
+import zlib
+from typing import Dict, List, Tuple, Optional, Union
+
+import pandas as pd
+
+from config import SLOTS_AULA, TEMPO_LIMITE_SOLVER_EXATO
+from utils import padronizar
+from regras_alocacao import REGRA_CARGA_HORARIA
+from inteligencia import construir_indice_demanda
+from alocador import (
+    construir_indice_candidatos, candidatos_elegiveis, atribuir_aula, chave_turma,
+    grade_inicial, somar_estatisticas
+)
+
+# Peso de cada aula preenchida: maior que qualquer score, para que o solver
+# nunca troque uma aula alocada por um professor "melhor" em outra
+PESO_AULA_ALOCADA = 1_000_000
+
+
+def solver_exato_disponivel() -> bool:
+    """True se o OR-Tools estiver instalado."""
+    return importlib.util.find_spec("ortools") is not None
+
+
+def resolver_grade_exata(
+    turmas: List,
+    curriculo: pd.DataFrame,
+    profs: List,
+    rotas: Dict,
+    turno_atual: str,
+    mapa_escola_regiao: Dict,
+    indice_demanda: Optional[Dict] = None,
+    indice_candidatos: Optional[Dict] = None,
+    tempo_limite: float = TEMPO_LIMITE_SOLVER_EXATO,
+    semente: Optional[Union[int, str]] = None,
+    estatisticas: Optional[Dict] = None,
+    **_
+) -> Tuple[bool, Dict, str, List]:
+    """
+    Aloca o bloco de turmas com CP-SAT (mesma assinatura e retorno de
+    resolver_grade_inteligente).
+
+    Restrições: matéria, região e turno fixo (pelo índice de candidatos),
+    limite de carga, um professor por slot (o que também cobre o
+    deslocamento sem rota, bloqueado só no mesmo slot) e aulas contíguas na
+    mesma escola — o estado final que verificar_janelas garante aula a aula.
+    Objetivo: máximo de aulas alocadas e, entre elas, a soma dos scores do
+    modo heurístico (a carga disponível é a do início do bloco).
+
+    Args:
+        tempo_limite: Segundos máximos de busca
+        semente: Com semente, a busca usa um único worker e limite de tempo
+            determinístico, para que a mesma entrada dê sempre a mesma grade
+        estatisticas: Acumulador de blocos, tentativas (1 por bloco), aulas e faltas
+        (demais argumentos como em resolver_grade_inteligente)
+
+    Returns:
+        (sucesso, grade {(escola, turma): [prof por slot]}, mensagem, profs)
+    """
+    from ortools.sat.python import cp_model
+
+    turno_atual = padronizar(turno_atual)
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(pd.DataFrame(), curriculo)
+    if indice_candidatos is None or indice_candidatos['profs'] is not profs:
+        indice_candidatos = construir_indice_candidatos(profs)
+
+    grade = grade_inicial(turmas)  # Com as células travadas (turma['fixas'])
+    maximo = REGRA_CARGA_HORARIA["maximo_aulas"]
+
+    # Variáveis: x[(demanda, professor)] = 1 se o professor assume a aula
+    modelo = cp_model.CpModel()
+    demandas = []
+    x = {}
+    por_prof = {}        # {id: [var]}
+    por_prof_slot = {}   # {(id, slot): [var]}
+    por_prof_escola = {}  # {(id, escola): {slot: [var]}}
+    objetivo = []
+    profs_usados = {}
+
+    for turma in turmas:
+        esc, reg = padronizar(turma['escola_real']), padronizar(turma['regiao_real'])
+        aulas = list(indice_demanda['aulas'].get(turma['ano'], []))[:SLOTS_AULA]
+        fixas = turma.get('fixas', {})
+        for slot, mat in enumerate(aulas):
+            if mat == "---" or slot in fixas:
+                continue
+            d = len(demandas)
+            demandas.append((chave_turma(turma), slot, esc))
+            vars_demanda = []
+
+            for p, pontos_regiao in candidatos_elegiveis(indice_candidatos, mat, reg):
+                # REGRA: Verificar turno fixo (se aplicável)
+                if p['tf'] and p['tf'] not in ["AMBOS", "", turno_atual]:
+                    continue
+                # REGRA: Limite de carga e conflito com aulas de blocos anteriores
+                if p['atrib'] >= min(p['max'], maximo) or slot in p['ocup']:
+                    continue
+
+                var = modelo.NewBoolVar(f"x_{d}_{p['id']}")
+                x[(d, p['id'])] = var
+                vars_demanda.append(var)
+                profs_usados[p['id']] = p
+                por_prof.setdefault(p['id'], []).append(var)
+                por_prof_slot.setdefault((p['id'], slot), []).append(var)
+                por_prof_escola.setdefault((p['id'], esc), {}).setdefault(slot, []).append(var)
+
+                score = pontos_regiao
+                if p['vin'] == "EFETIVO" and esc in p['escolas_base']:
+                    score += 100000
+                if esc in p['escolas_base']:
+                    score += 2000
+                if esc in p['escolas_reais']:
+                    score += 1000
+                score += (maximo - p['atrib']) * 10
+                objetivo.append((PESO_AULA_ALOCADA + score) * var)
+
+            if vars_demanda:
+                # Cada aula recebe no máximo um professor ("---" se nenhum)
+                modelo.Add(sum(vars_demanda) <= 1)
+
+    if not demandas:
+        somar_estatisticas(estatisticas, 0, 0, 0)
+        return True, grade, "Nenhuma demanda de especialistas", profs
+
+    # REGRA 1: Um professor por slot
+    for vars_slot in por_prof_slot.values():
+        if len(vars_slot) > 1:
+            modelo.Add(sum(vars_slot) <= 1)
+
+    # REGRA: Limite de carga horária
+    for pid, vars_prof in por_prof.items():
+        p = profs_usados[pid]
+        capacidade = min(p['max'], maximo) - p['atrib']
+        if len(vars_prof) > capacidade:
+            modelo.Add(sum(vars_prof) <= capacidade)
+
+    # REGRA 4: Sem janelas na mesma escola (aulas contíguas) + bônus de aulas na mesma escola
+    for (pid, esc), por_slot in por_prof_escola.items():
+        p = profs_usados[pid]
+        fixos = {s for s, e in p['ocup'].items() if e == esc}
+        usado = {}
+        for s in range(SLOTS_AULA):
+            if s in fixos:
+                usado[s] = 1
+            elif s in por_slot:
+                u = modelo.NewBoolVar(f"u_{pid}_{s}")
+                modelo.Add(u == sum(por_slot[s]))
+                usado[s] = u
+        # Para i < j < k: aula em i e em k exige aula em j
+        for i in range(SLOTS_AULA):
+            for k in range(i + 2, SLOTS_AULA):
+                if i not in usado or k not in usado:
+                    continue
+                for j in range(i + 1, k):
+                    modelo.Add(usado[i] + usado[k] - usado.get(j, 0) <= 1)
+
+        # +500 por aula na escola, exceto a primeira (se ainda não havia aula lá)
+        vars_esc = [v for vs in por_slot.values() for v in vs]
+        objetivo.append(500 * sum(vars_esc))
+        if not fixos:
+            presente = modelo.NewBoolVar(f"y_{pid}")
+            for v in vars_esc:
+                modelo.Add(v <= presente)
+            objetivo.append(-500 * presente)
+
+    modelo.Maximize(sum(objetivo))
+
+    solver = cp_model.CpSolver()
+    if semente is None:
+        solver.parameters.max_time_in_seconds = float(tempo_limite)
+    else:
+        solver.parameters.num_workers = 1
+        solver.parameters.random_seed = zlib.crc32(str(semente).encode()) & 0x7FFFFFFF
+        solver.parameters.max_deterministic_time = float(tempo_limite)
+    status = solver.Solve(modelo)
+
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        somar_estatisticas(estatisticas, 1, len(demandas), len(demandas))
+        return False, grade, f"Solver sem solução ({solver.StatusName(status)})", profs
+
+    registro = []
+    alocadas = 0
+    for (d, pid), var in x.items():
+        if solver.Value(var):
+            chave, slot, esc = demandas[d]
+            grade[chave][slot] = pid
+            atribuir_aula(profs_usados[pid], slot, esc, registro)
+            alocadas += 1
+
+    sucesso = alocadas == len(demandas)
+    somar_estatisticas(estatisticas, 1, len(demandas), len(demandas) - alocadas)
+    situacao = "ótima" if status == cp_model.OPTIMAL else "melhor encontrada"
+    mensagem = f"Solver exato: solução {situacao} ({alocadas}/{len(demandas)} aulas)"
+    return sucesso, grade, mensagem, profs
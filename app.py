@@ -4,35 +4,53 @@ Aplicação Streamlit para gestão de turmas, professores e geração automátic
 """
 import hashlib
 import colorsys
+import json
 import streamlit as st
 import pandas as pd
 import time
 from datetime import datetime
 from typing import Tuple, List, Dict, Optional
 import re
-import random
 import io
 import xlsxwriter
 import math
-import copy
 import gspread
 from google.oauth2 import service_account
 from inteligencia import analisar_demanda_inteligente
 from inteligencia import gerar_novos_professores_inteligentes
+from inteligencia import construir_indice_demanda
+from alocador import resolver_grade_inteligente, ler_materias_slots
+from alocador_exato import resolver_grade_exata, solver_exato_disponivel
+from gerador import (
+    gerar_grade_rede, impressoes_blocos, ler_impressoes_geracao, gravar_impressoes_geracao
+)
+from tarefa_geracao import TarefaGeracao
 from ch import gerar_dataframe_ch
+from database import (
+    montar_dataframe_aba,
+    valores_para_planilha,
+    impressao_digital, CacheLocal, ArmazenamentoBase, criar_armazenamento,
+    gravar_aba
+)
+from fila_gravacao import FilaGravacao
+from limitador_taxa import LimitadorTaxa, eh_erro_de_cota
 # Importar configurações e utilitários
 from config import (
     REGIOES, MATERIAS_ESPECIALISTAS, ORDEM_SERIES, DIAS_SEMANA, VINCULOS,
     COLS_PADRAO, CARGA_MINIMA_PADRAO, CARGA_MAXIMA_PADRAO, MEDIA_ALVO_PADRAO,
-    MAX_TENTATIVAS_ALOCACAO, LIMITE_NOVOS_PROFESSORES, CACHE_TTL_SEGUNDOS, SLOTS_AULA
+    LIMITE_NOVOS_PROFESSORES, CACHE_TTL_SEGUNDOS,
+    TEMPO_LIMITE_SOLVER_EXATO, PROCESSOS_GERACAO, ARQUIVO_IMPRESSOES_GERACAO,
+    CACHE_LOCAL_ARQUIVO, BACKEND_ARMAZENAMENTO, ARQUIVO_BANCO_LOCAL,
+    QUOTA_LEITURAS_POR_MINUTO, QUOTA_ESCRITAS_POR_MINUTO
 )
 from utils import (
     remover_acentos, padronizar, limpar_materia, padronizar_materia_interna,
     gerar_sigla_regiao, gerar_sigla_materia, gerar_codigo_padrao,
-    extrair_id_do_link, validar_dataframe
+    extrair_id_do_link, validar_dataframe,
+    MATERIAS_ESPECIALISTAS_INTERNAS
 )
 from regras_alocacao import (
-    verificar_compatibilidade_regiao, verificar_janelas,
+    verificar_compatibilidade_regiao,
     calcular_pl_ldb, calcular_carga_total,
     verificar_limites_carga, distribuir_carga_inteligente,
     REGRA_CARGA_HORARIA, REGRA_DISTRIBUICAO
@@ -72,7 +90,7 @@ def gerar_pdf_escola(df_horario, nome_escola, dia_filtro="Todos", config_visual=
     estilo_recreio = ParagraphStyle('Recreio', parent=styles['Normal'], fontSize=6, alignment=1, textColor=colors.gray)
 
     # --- HELPER DE FORMATAÇÃO (REPLICA A LÓGICA DA UI) ---
-    def formatar_para_pdf(codigo):
+    def formatar_para_pdf(codigo, mat_slot=None):
         if not config_visual: return codigo
         if not codigo or codigo == "---": return "-"
         
@@ -87,7 +105,8 @@ def gerar_pdf_escola(df_horario, nome_escola, dia_filtro="Todos", config_visual=
         else:
             nome_curto = nome
             
-        mat = map_comp.get(codigo, "?")
+        # Matéria da aula pela grade do alocador; sem ela, as matérias do professor
+        mat = mat_slot if mat_slot and mat_slot != "---" else map_comp.get(codigo, "?")
         
         # Lógica de Exibição (Igual ao formatar_celula da Aba 8)
         if modo == "Apenas Código": return codigo
@@ -165,6 +184,7 @@ def gerar_pdf_escola(df_horario, nome_escola, dia_filtro="Todos", config_visual=
                 card_styles.append(('BOTTOMPADDING', (0,0), (1,0), 6))
                 
                 # Aulas
+                materias_linha = ler_materias_slots(row_dados.get('COMPONENTE')) or [None] * 5
                 for i, slot in enumerate(["1ª", "2ª", "3ª", "4ª", "5ª"]):
                     prof_cod = row_dados.get(slot, "---")
                     
@@ -178,7 +198,7 @@ def gerar_pdf_escola(df_horario, nome_escola, dia_filtro="Todos", config_visual=
                         txt_color = colors.black
 
                     # TEXTO FORMATADO (AQUI ESTÁ A MÁGICA QUE SEGUE O FILTRO)
-                    texto_formatado = formatar_para_pdf(prof_cod)
+                    texto_formatado = formatar_para_pdf(prof_cod, materias_linha[i])
                     
                     # Estilo da Célula
                     estilo_celula = ParagraphStyle(f'Cell{turma}{slot}', parent=estilo_aula, textColor=txt_color)
@@ -455,6 +475,10 @@ if 'hora_db' not in st.session_state:
 col_emergencia1, col_emergencia2 = st.columns([1, 5])
 with col_emergencia1:
     if st.button("🚨 Reset Sistema", help="Limpa todo cache e recarrega dados do zero", type="primary"):
+        try:
+            CacheLocal(CACHE_LOCAL_ARQUIVO).limpar()
+        except Exception:
+            pass
         st.cache_data.clear()
         st.cache_resource.clear()
         st.success("✅ Sistema resetado! Recarregue a página.")
@@ -569,6 +593,17 @@ def gerar_estilo_professor_dinamico(id_professor):
 # ==========================================
 # 5 CONEXÃO COM GOOGLE SHEETS
 # ==========================================
+@st.cache_resource
+def obter_limitador_taxa() -> LimitadorTaxa:
+    """
+    Limitador de taxa único do processo: todas as sessões dividem a cota
+    por minuto de leituras e escritas da API do Google Sheets.
+    """
+    return LimitadorTaxa({
+        "leitura": QUOTA_LEITURAS_POR_MINUTO,
+        "escrita": QUOTA_ESCRITAS_POR_MINUTO,
+    })
+
 @st.cache_resource
 def init_gsheets_connection():
     """
@@ -695,6 +730,7 @@ def init_gsheets_connection():
         max_retries = 3
         for tentativa in range(max_retries):
             try:
+                obter_limitador_taxa().adquirir("leitura")
                 spreadsheet = client.open_by_key(PLANILHA_ID)
                 st.sidebar.success(f"✅ Conectado!")
                 st.sidebar.caption(f"📋 {spreadsheet.title}")
@@ -793,15 +829,19 @@ def init_gsheets_connection():
         st.error(f"❌ Erro na conexão: {str(e)}")
         return None, None
 
-# Inicializar conexão
-gs_client, PLANILHA_ID = init_gsheets_connection()
+# Inicializar conexão (o backend SQLite local dispensa o Google Sheets)
+USA_GSHEETS = BACKEND_ARMAZENAMENTO.strip().lower() == "gsheets"
+if USA_GSHEETS:
+    gs_client, PLANILHA_ID = init_gsheets_connection()
+else:
+    gs_client, PLANILHA_ID = None, None
 # Definimos sistema_seguro imediatamente para que o resto do código o reconheça
-sistema_seguro = (gs_client is not None and PLANILHA_ID is not None)
+sistema_seguro = (gs_client is not None and PLANILHA_ID is not None) or not USA_GSHEETS
 
 # ==========================================
 # 6 VERIFICAR E AJUSTAR SECRETS.TOML
 # ==========================================
-if gs_client is None or not PLANILHA_ID:
+if USA_GSHEETS and (gs_client is None or not PLANILHA_ID):
     st.error("""
     ## ⚠️ Conexão não estabelecida
     
@@ -998,186 +1038,226 @@ if gs_client is None or not PLANILHA_ID:
 # 8 FUNÇÕES DE LEITURA/ESCRITA
 # ==========================================
 
+@st.cache_resource
+def obter_registro_abas() -> Dict[str, List[List[str]]]:
+    """
+    Último conteúdo conhecido de cada aba ({aba: linhas crus}), atualizado a cada
+    leitura e gravação. Compartilhado entre sessões; serve de base para as
+    gravações incrementais de escrever_aba_gsheets.
+    """
+    return {}
+
+@st.cache_resource
+def obter_impressoes_abas() -> Dict[str, str]:
+    """
+    Hash do conteúdo de cada aba ({aba: sha1}) registrado em carregar_banco e
+    após cada gravação. salvar_seguro só grava as abas cujo hash mudou.
+    """
+    return {}
+
+@st.cache_resource
+def obter_cache_local() -> Optional[CacheLocal]:
+    """
+    Cache em disco das abas (SQLite), compartilhado pelo processo.
+    Retorna None se o arquivo não puder ser criado (ex.: disco somente leitura).
+    """
+    try:
+        return CacheLocal(CACHE_LOCAL_ARQUIVO)
+    except Exception:
+        return None
+
+@st.cache_resource
+def obter_armazenamento(backend: str, _client, planilha_id: Optional[str]) -> ArmazenamentoBase:
+    """
+    Mecanismo de armazenamento escolhido em BACKEND_ARMAZENAMENTO
+    (compartilhado pelo processo).
+    """
+    return criar_armazenamento(
+        backend, client=_client, planilha_id=planilha_id,
+        cache=obter_cache_local(), caminho_sqlite=ARQUIVO_BANCO_LOCAL,
+        limitador=obter_limitador_taxa()
+    )
+
+# Armazenamento usado por todas as leituras e gravações
+try:
+    armazenamento = obter_armazenamento(BACKEND_ARMAZENAMENTO, gs_client, PLANILHA_ID) if sistema_seguro else None
+except Exception as e:
+    st.error(f"❌ Erro ao iniciar o armazenamento '{BACKEND_ARMAZENAMENTO}': {e}")
+    armazenamento = None
+sistema_seguro = armazenamento is not None
+
 def ler_aba_gsheets(aba_nome: str, colunas_esperadas: List[str]) -> Tuple[pd.DataFrame, bool]:
     """
-    Lê uma aba do Google Sheets e retorna um DataFrame padronizado.
-    Versão BLINDADA: Usa get_all_values para evitar erro 'list index out of range' em abas vazias.
+    Lê uma aba do armazenamento configurado e retorna um DataFrame padronizado.
     """
-    max_retries = 5
-    base_delay = 2
-    
-    for tentativa in range(max_retries):
-        try:
-            if gs_client is None or not PLANILHA_ID:
-                return pd.DataFrame(columns=colunas_esperadas), False
+    return ler_abas_gsheets_lote({aba_nome: colunas_esperadas})[aba_nome]
 
-            # Rate limiting
-            if tentativa > 0:
-                time.sleep(base_delay * (2 ** tentativa))
 
-            spreadsheet = gs_client.open_by_key(PLANILHA_ID)
-            worksheet = spreadsheet.worksheet(aba_nome)
+def escrever_aba_gsheets(aba_nome: str, df: pd.DataFrame, incremental: bool = True) -> bool:
+    """
+    Escreve dados em uma aba do armazenamento configurado.
+    Versão corrigida: Permite salvar DataFrames vazios (apenas cabeçalho) sem erro.
+    """
+    sucesso, _ = gravar_aba_gsheets(aba_nome, df, incremental)
+    return sucesso
 
-            # --- MUDANÇA PRINCIPAL AQUI ---
-            # get_all_values() retorna uma lista de listas (crua), o que não dá erro se estiver vazia
-            dados_brutos = worksheet.get_all_values()
-            
-            # Se a lista estiver vazia ou tiver apenas cabeçalho
-            if not dados_brutos:
-                return pd.DataFrame(columns=colunas_esperadas), True
-            
-            # A primeira linha é o cabeçalho
-            headers = dados_brutos.pop(0)
-            
-            # Cria o DataFrame
-            df = pd.DataFrame(dados_brutos, columns=headers)
-            # ------------------------------
-            
-            # Padronizar nomes das colunas para maiúsculas/sem acento
-            df.columns = [padronizar(c) for c in df.columns]
-            
-            # Garantir que temos todas as colunas esperadas
-            for col in colunas_esperadas:
-                col_norm = padronizar(col)
-                if col_norm not in df.columns:
-                    df[col_norm] = ""
-            
-            # Renomear para os nomes bonitos (originais)
-            rename_dict = {}
-            for col in colunas_esperadas:
-                col_norm = padronizar(col)
-                if col_norm in df.columns:
-                    rename_dict[col_norm] = col
-            
-            if rename_dict:
-                df = df.rename(columns=rename_dict)
-            
-            # Manter apenas as colunas esperadas na ordem certa
-            df = df[colunas_esperadas].copy()
-            
-            # Limpeza final
-            df = df.fillna("")
-            for c in df.columns:
-                if c in ["QTD_AULAS", "CARGA_HORÁRIA", "QTD_PL", "HORA_ALUNO", "HORA_PL", "TOTAL_HORAS", "MINUTOS_TOTAL"]:
-                    # Converte para número, força 0 se der erro
-                    df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype(int)
-                else:
-                    df[c] = df[c].astype(str).apply(padronizar)
-                    
-            return df, True
-            
-        except gspread.exceptions.WorksheetNotFound:
-            # Se a aba não existe, retornamos DataFrame vazio mas com status True (para o sistema criar depois)
-            return pd.DataFrame(columns=colunas_esperadas), False
-            
-        except gspread.exceptions.APIError as e:
-            error_str = str(e).lower()
-            if '429' in error_str or 'quota exceeded' in error_str:
-                if tentativa < max_retries - 1:
-                    continue
-            st.error(f"❌ Erro API ao ler '{aba_nome}': {e}")
-            return pd.DataFrame(columns=colunas_esperadas), False
-            
-        except Exception as e:
-            # Se for erro de índice (aba vazia), retornamos vazio sem alarde
-            if "list index out of range" in str(e):
-                return pd.DataFrame(columns=colunas_esperadas), True
-                
-            if tentativa < max_retries - 1:
-                continue
-            st.error(f"❌ Erro ao ler aba '{aba_nome}': {e}")
-            return pd.DataFrame(columns=colunas_esperadas), False
+
+def gravar_aba_gsheets(aba_nome: str, df: pd.DataFrame, incremental: bool = True) -> Tuple[bool, int]:
+    """
+    Grava uma aba imediatamente e retorna (sucesso, células enviadas).
+    
+    Modo incremental: compara com o último conteúdo conhecido da aba (registro
+    de snapshots) e envia só as faixas alteradas em um único batch_update.
+    Se não houver snapshot ou o cabeçalho mudou, reescreve a aba inteira.
+    Novas tentativas com backoff só para armazenamento remoto (cota da API).
+    """
+    if armazenamento is None:
+        st.error(f"❌ Conexão não disponível para escrever na aba '{aba_nome}'")
+        return False, 0
+    
+    # SE ESTIVER VAZIO, SALVA APENAS O CABEÇALHO (Isso corrige o erro)
+    values = valores_para_planilha(df)
+    try:
+        celulas = gravar_aba(armazenamento, obter_registro_abas(), aba_nome, values, incremental)
+    except Exception as e:
+        obter_impressoes_abas().pop(aba_nome, None)
+        st.error(f"❌ Erro ao salvar aba '{aba_nome}': {e}")
+        return False, 0
     
-    return pd.DataFrame(columns=colunas_esperadas), False
+    obter_impressoes_abas()[aba_nome] = impressao_digital(values)
+    return True, celulas
 
 
+@st.cache_resource
+def obter_fila_gravacao(_armazenamento: ArmazenamentoBase) -> FilaGravacao:
+    """
+    Fila de gravação em segundo plano (uma thread por processo).
+    Em caso de falha, esquece o snapshot e a impressão digital da aba para
+    que o próximo salvamento a grave por completo.
+    """
+    registro = obter_registro_abas()
+    impressoes = obter_impressoes_abas()
+    
+    def gravar(aba: str, df: pd.DataFrame) -> int:
+        return gravar_aba(_armazenamento, registro, aba, valores_para_planilha(df))
+    
+    def ao_falhar(aba: str):
+        registro.pop(aba, None)
+        impressoes.pop(aba, None)
+    
+    # Sem pausas fixas: o ritmo das chamadas é dado pelo limitador de taxa
+    return FilaGravacao(gravar, ao_falhar)
+
 
-def escrever_aba_gsheets(aba_nome: str, df: pd.DataFrame) -> bool:
+def ler_abas_gsheets_lote(abas: Dict[str, List[str]]) -> Dict[str, Tuple[pd.DataFrame, bool]]:
     """
-    Escreve dados em uma aba do Google Sheets.
-    Versão corrigida: Permite salvar DataFrames vazios (apenas cabeçalho) sem erro.
+    Lê várias abas do armazenamento configurado em uma única operação
+    (no Google Sheets, um values:batchGet, servido do cache em disco quando
+    a versão da planilha não mudou). Devolve, para cada aba, o par
+    (DataFrame, sucesso); abas inexistentes vêm vazias com sucesso False.
     """
-    max_retries = 5
+    vazios = {aba: (pd.DataFrame(columns=cols), False) for aba, cols in abas.items()}
+    if armazenamento is None:
+        return vazios
+    
+    max_retries = 5 if armazenamento.remoto else 1
     base_delay = 2
     
     for tentativa in range(max_retries):
         try:
-            if gs_client is None or not PLANILHA_ID:
-                st.error(f"❌ Conexão não disponível para escrever na aba '{aba_nome}'")
-                return False
-            
-            # Rate limiting
-            if tentativa > 0:
-                delay = base_delay * (2 ** tentativa)
-                time.sleep(delay)
-            
-            spreadsheet = gs_client.open_by_key(PLANILHA_ID)
-            
-            # Verificar/Criar aba
-            try:
-                worksheet = spreadsheet.worksheet(aba_nome)
-            except gspread.exceptions.WorksheetNotFound:
-                cols = len(df.columns) if not df.empty else 1
-                worksheet = spreadsheet.add_worksheet(title=aba_nome, rows=1000, cols=cols)
-            
-            # Limpar
-            worksheet.clear()
-            
-            # Preparar dados (cabeçalho + valores)
-            # SE ESTIVER VAZIO, SALVA APENAS O CABEÇALHO (Isso corrige o erro)
-            if df.empty:
-                values = [df.columns.tolist()]
-            else:
-                values = [df.columns.tolist()] + df.fillna("").values.tolist()
-            
-            # Atualizar
-            worksheet.update(values, 'A1')
-            
-            return True
-            
-        except gspread.exceptions.APIError as e:
-            error_str = str(e).lower()
-            if '429' in error_str or 'quota exceeded' in error_str:
-                if tentativa < max_retries - 1:
-                    delay = base_delay * (2 ** tentativa)
-                    time.sleep(delay)
+            # Salvamentos ainda na fila prevalecem sobre o armazenamento.
+            # A fila é consultada ANTES da leitura: uma aba que terminar de
+            # gravar no meio do caminho já estará atualizada no armazenamento.
+            pendentes = obter_fila_gravacao(armazenamento).pendentes()
+            valores = armazenamento.ler_valores(list(abas.keys()))
+
+            registro = obter_registro_abas()
+            impressoes = obter_impressoes_abas()
+            resultado = {}
+            for aba, cols in abas.items():
+                if aba in pendentes:
+                    linhas = valores_para_planilha(pendentes[aba])
+                    resultado[aba] = (montar_dataframe_aba(linhas, cols), True)
+                elif valores[aba] is None:
+                    # Aba inexistente: vazio com status False (para o sistema criar depois)
+                    resultado[aba] = (pd.DataFrame(columns=cols), False)
                     continue
-            return False
-                
+                else:
+                    linhas = valores[aba]
+                    registro[aba] = linhas
+                    resultado[aba] = (montar_dataframe_aba(linhas, cols), True)
+                # Impressão digital do conteúdo entregue (base para detectar abas alteradas)
+                impressoes[aba] = impressao_digital(linhas)
+            return resultado
+
+        except gspread.exceptions.APIError as e:
+            if eh_erro_de_cota(e) and tentativa < max_retries - 1:
+                # Cota excedida: a próxima tentativa espera na fila do limitador
+                armazenamento.registrar_erro(e, "leitura")
+                continue
+            st.error(f"❌ Erro API ao ler abas: {e}")
+            return vazios
+
         except Exception as e:
             if tentativa < max_retries - 1:
                 time.sleep(base_delay * (2 ** tentativa))
                 continue
-            st.error(f"❌ Erro ao salvar aba '{aba_nome}': {e}")
-            return False
-    
-    return False
+            st.error(f"❌ Erro ao ler abas: {e}")
+            return vazios
 
+    return vazios
 
-# 2. SEGUNDO: Defina a função carregar_banco
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner=False)
+
+# ==========================================
+# 9 LEITURA DE DADOS (CACHE)
+# ==========================================
+@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner=False, max_entries=1)
 def carregar_banco():
+    """
+    Carrega todas as abas do Google Sheets com uma única leitura em lote.
+    Retorna (turmas, curriculo, professores, dias, rotas, horario, ch, pl, travas, sucesso).
+    """
     # Verifica se o sistema está seguro
     if not sistema_seguro: 
         return (pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), 
-                pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), False)
-    
-    # Carrega todas as abas
-    t, _ = ler_aba_gsheets("Turmas", COLS_PADRAO["Turmas"])
-    c, _ = ler_aba_gsheets("Curriculo", COLS_PADRAO["Curriculo"])
-    pe, _ = ler_aba_gsheets("ProfessoresEF", COLS_PADRAO["Professores"])
-    pd_dt, _ = ler_aba_gsheets("ProfessoresDT", COLS_PADRAO["Professores"])
-    p = pd.concat([pe, pd_dt], ignore_index=True)
-    d, _ = ler_aba_gsheets("ConfigDias", COLS_PADRAO["ConfigDias"])
-    r, _ = ler_aba_gsheets("Agrupamentos", COLS_PADRAO["Agrupamentos"])
-    h, _ = ler_aba_gsheets("Horario", COLS_PADRAO["Horario"])
-    ch, _ = ler_aba_gsheets("CH", COLS_PADRAO["CH"])
+                pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(),
+                pd.DataFrame(columns=COLS_PADRAO["Travas"]), False)
+    
+    # Carrega todas as abas (inclusive a antiga "Professores", usada só como fallback)
+    abas = ler_abas_gsheets_lote({
+        "Turmas": COLS_PADRAO["Turmas"],
+        "Curriculo": COLS_PADRAO["Curriculo"],
+        "ProfessoresEF": COLS_PADRAO["Professores"],
+        "ProfessoresDT": COLS_PADRAO["Professores"],
+        "Professores": COLS_PADRAO["Professores"],
+        "ConfigDias": COLS_PADRAO["ConfigDias"],
+        "Agrupamentos": COLS_PADRAO["Agrupamentos"],
+        "Horario": COLS_PADRAO["Horario"],
+        "CH": COLS_PADRAO["CH"],
+        "HorarioPL": COLS_PADRAO["Horario"],
+        "Travas": COLS_PADRAO["Travas"],
+    })
+    
+    t, ok_t = abas["Turmas"]
+    c, ok_c = abas["Curriculo"]
+    pe, ok_ef = abas["ProfessoresEF"]
+    pd_dt, ok_dt = abas["ProfessoresDT"]
+    d, ok_d = abas["ConfigDias"]
+    r, ok_r = abas["Agrupamentos"]
+    h, _ = abas["Horario"]
+    ch, _ = abas["CH"]
+    pl, _ = abas["HorarioPL"]
+    tv, _ = abas["Travas"]
+    
+    # Professores: abas separadas por vínculo ou, se não existirem, a aba antiga
+    if ok_ef or ok_dt:
+        p = pd.concat([pe, pd_dt], ignore_index=True)
+        ok_p = True
+    else:
+        p, ok_p = abas["Professores"]
     
     # Se CH estiver vazio, gera padrão
     if ch.empty: ch = gerar_dataframe_ch()
-    
-    # Carrega PL
-    pl, _ = ler_aba_gsheets("HorarioPL", COLS_PADRAO["Horario"])
 
     # === CALCULAR CARGA HORÁRIA E PL DOS PROFESSORES BASEADO NO HORÁRIO ATUAL ===
     if not p.empty and (not h.empty or not pl.empty):
@@ -1219,12 +1299,14 @@ def carregar_banco():
             if escs:
                 p.at[idx, 'ESCOLAS_ALOCADAS'] = ",".join(sorted(escs))
 
-    return t, c, p, d, r, h, ch, pl, True
+    # Verificar se tudo essencial carregou
+    sucesso = ok_t and ok_c and ok_p and ok_d and ok_r
+
+    return t, c, p, d, r, h, ch, pl, tv, sucesso
 
-# 3. TERCEIRO: Agora sim, chame a função (bloco try...except)
 # --- CARREGAMENTO INICIAL ---
 try:
-    dt, dc, dp, dd, da, dh, dch, dpl, dados_ok = carregar_banco()
+    dt, dc, dp, dd, da, dh, dch, dpl, dtv, dados_ok = carregar_banco()
 except Exception as e:
     # Se der erro, cria tabelas vazias
     dt = pd.DataFrame(columns=COLS_PADRAO["Turmas"])
@@ -1235,181 +1317,89 @@ except Exception as e:
     dh = pd.DataFrame(columns=COLS_PADRAO["Horario"])
     dch = pd.DataFrame(columns=COLS_PADRAO["CH"])
     dpl = pd.DataFrame(columns=COLS_PADRAO["Horario"]) # dpl definido aqui!
+    dtv = pd.DataFrame(columns=COLS_PADRAO["Travas"])
 
-# ==========================================
-# 9 LEITURA DE DADOS (CACHE)
-# ==========================================
-@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, show_spinner=False, max_entries=1)
-def carregar_banco():
-    """
-    Carrega todos os dados do Google Sheets com pausas estratégicas para evitar erro 429 (Quota Exceeded).
-    """
-    with st.spinner("🔄 Carregando sistema (com pausas de segurança)..."):
-        # Se não houver conexão, retorna 7 dataframes vazios
-        if gs_client is None or not PLANILHA_ID:
-            empty_dfs = [pd.DataFrame() for _ in range(7)]
-            return (*empty_dfs, False)
-            
-        try:
-            # 1. Ler Turmas
-            t, ok_t = ler_aba_gsheets("Turmas", COLS_PADRAO["Turmas"])
-            time.sleep(1.5) # <--- PAUSA DE SEGURANÇA
-            
-            # 2. Ler Curriculo
-            c, ok_c = ler_aba_gsheets("Curriculo", COLS_PADRAO["Curriculo"])
-            time.sleep(1.5) # <--- PAUSA DE SEGURANÇA
-            
-            # 3. Ler Professores (combinando abas)
-            p_ef, ok_ef = ler_aba_gsheets("ProfessoresEF", COLS_PADRAO["Professores"])
-            time.sleep(1.0) 
-            p_dt, ok_dt = ler_aba_gsheets("ProfessoresDT", COLS_PADRAO["Professores"])
-            time.sleep(1.5) # <--- PAUSA DE SEGURANÇA
-            
-            if ok_ef and ok_dt:
-                p = pd.concat([p_ef, p_dt], ignore_index=True)
-                ok_p = True
-            elif ok_ef:
-                p = p_ef
-                ok_p = True
-            elif ok_dt:
-                p = p_dt
-                ok_p = True
-            else:
-                p, ok_p = ler_aba_gsheets("Professores", COLS_PADRAO["Professores"])
-            
-            # 4. Ler ConfigDias e Agrupamentos
-            d, ok_d = ler_aba_gsheets("ConfigDias", COLS_PADRAO["ConfigDias"])
-            time.sleep(1.0)
-            r, ok_r = ler_aba_gsheets("Agrupamentos", COLS_PADRAO["Agrupamentos"])
-            time.sleep(1.0)
-            
-            # 5. Ler Horario (opcional)
-            h, ok_h = ler_aba_gsheets("Horario", COLS_PADRAO["Horario"])
-            if not ok_h: h = pd.DataFrame()
-            time.sleep(1.0)
-
-            # 6. Ler Tabela CH
-            ch_df, ok_ch = ler_aba_gsheets("CH", COLS_PADRAO["CH"])
-            time.sleep(1.0)
-            if not ok_ch or ch_df.empty:
-                from ch import gerar_dataframe_ch
-                ch_df = gerar_dataframe_ch()
-            
-            # 7. Ler HorarioPL (NOVA)
-            pl, ok_pl = ler_aba_gsheets("HorarioPL", COLS_PADRAO["Horario"])
-            if not ok_pl: pl = pd.DataFrame()
-
-            # Verificar se tudo essencial carregou
-            sucesso = ok_t and ok_c and ok_p and ok_d and ok_r
-            
-            # Retorna os 8 DataFrames + Status (Note que adicionei 'pl' no final)
-            return t, c, p, d, r, h, ch_df, pl, sucesso
-            
-        except Exception as e:
-            st.cache_data.clear()
-            error_msg = str(e)
-            if '429' in error_msg:
-                st.warning("⚠️ O sistema está lendo muito rápido. Aguarde 1 minuto e recarregue a página.")
-            else:
-                st.error(f"❌ Erro ao carregar dados: {error_msg}")
-            
-            # Retorna vazios em caso de erro (8 dataframes agora)
-            empty_dfs = [pd.DataFrame() for _ in range(8)]
-            return (*empty_dfs, False)
+# Índice de demanda (currículo por série, demanda por turma, dias por série),
+# montado uma vez por execução e compartilhado por todas as abas
+indice_demanda = construir_indice_demanda(dt, dc, dd)
 
 # ==========================================
 # 10 FUNÇÕES DE SALVAR
 # ==========================================
-def salvar_seguro(dt, dc, dp, dd, da, dh=None, dpl=None):
-    """Salva todos os dados no Google Sheets com rate limiting"""
+def montar_abas_para_salvar(dt, dc, dp, dd, da, dh=None, dpl=None, dtv=None) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Monta a lista (aba, DataFrame) na ordem de gravação.
+    Professores são separados por vínculo entre ProfessoresEF e ProfessoresDT.
+    """
+    abas = [("Turmas", dt.fillna("")), ("Curriculo", dc.fillna(""))]
+    
+    # Separar professores por vínculo e salvar nas abas corretas
+    if not dp.empty:
+        # Garantir que a coluna VÍNCULO existe e está padronizada
+        if 'VÍNCULO' in dp.columns:
+            dp['VÍNCULO'] = dp['VÍNCULO'].astype(str).apply(padronizar)
+            efetivo = dp['VÍNCULO'].str.contains('EFETIVO', case=False, na=False)
+            abas.append(("ProfessoresEF", dp[efetivo].copy().fillna("")))
+            abas.append(("ProfessoresDT", dp[~efetivo].copy().fillna("")))
+        else:
+            # Se não tiver coluna VÍNCULO, salvar tudo em ProfessoresDT (compatibilidade)
+            abas.append(("ProfessoresDT", dp.fillna("")))
+    else:
+        # Se estiver vazio, criar abas vazias
+        vazio = pd.DataFrame(columns=COLS_PADRAO["Professores"])
+        abas.append(("ProfessoresEF", vazio.copy()))
+        abas.append(("ProfessoresDT", vazio.copy()))
+    
+    abas.append(("ConfigDias", dd.fillna("")))
+    abas.append(("Agrupamentos", da.fillna("")))
+    if dh is not None:
+        abas.append(("Horario", dh.fillna("")))
+    if dpl is not None:
+        abas.append(("HorarioPL", dpl.fillna("")))
+    if dtv is not None:
+        abas.append(("Travas", dtv.fillna("")))
+    return abas
+
+def salvar_seguro(dt, dc, dp, dd, da, dh=None, dpl=None, dtv=None):
+    """
+    Salva os dados em segundo plano: só enfileira as abas cujo conteúdo mudou
+    desde a última leitura/gravação (comparando impressões digitais) e devolve
+    o controle à interface. O andamento aparece na barra lateral.
+    """
     try:
-        with st.status("💾 Salvando...", expanded=True) as status:
-            # Escrever cada aba com delay entre requisições para evitar quota exceeded
-            status.write("📝 Salvando Turmas...")
-            if not escrever_aba_gsheets("Turmas", dt.fillna("")):
-                return
-            time.sleep(0.5)  # Delay entre requisições
-            
-            status.write("📝 Salvando Currículo...")
-            if not escrever_aba_gsheets("Curriculo", dc.fillna("")):
-                return
-            time.sleep(0.5)
-            
-            # Separar professores por vínculo e salvar nas abas corretas
-            if not dp.empty:
-                # Garantir que a coluna VÍNCULO existe e está padronizada
-                if 'VÍNCULO' in dp.columns:
-                    dp['VÍNCULO'] = dp['VÍNCULO'].astype(str).apply(padronizar)
-                    # Separar por vínculo
-                    dp_ef = dp[dp['VÍNCULO'].str.contains('EFETIVO', case=False, na=False)].copy()
-                    dp_dt = dp[~dp['VÍNCULO'].str.contains('EFETIVO', case=False, na=False)].copy()
-                    
-                    # Salvar nas abas separadas
-                    status.write("📝 Salvando ProfessoresEF...")
-                    if not escrever_aba_gsheets("ProfessoresEF", dp_ef.fillna("")):
-                        return
-                    time.sleep(0.5)
-                    
-                    status.write("📝 Salvando ProfessoresDT...")
-                    if not escrever_aba_gsheets("ProfessoresDT", dp_dt.fillna("")):
-                        return
-                    time.sleep(0.5)
-                else:
-                    # Se não tiver coluna VÍNCULO, salvar tudo em ProfessoresDT (compatibilidade)
-                    status.write("📝 Salvando ProfessoresDT...")
-                    if not escrever_aba_gsheets("ProfessoresDT", dp.fillna("")):
-                        return
-                    time.sleep(0.5)
-            else:
-                # Se estiver vazio, criar abas vazias
-                status.write("📝 Criando abas vazias de professores...")
-                escrever_aba_gsheets("ProfessoresEF", pd.DataFrame(columns=COLS_PADRAO["Professores"]).fillna(""))
-                time.sleep(0.5)
-                escrever_aba_gsheets("ProfessoresDT", pd.DataFrame(columns=COLS_PADRAO["Professores"]).fillna(""))
-                time.sleep(0.5)
-            
-            status.write("📝 Salvando ConfigDias...")
-            if not escrever_aba_gsheets("ConfigDias", dd.fillna("")):
-                return
-            time.sleep(0.5)
-            
-            status.write("📝 Salvando Agrupamentos...")
-            if not escrever_aba_gsheets("Agrupamentos", da.fillna("")):
-                return
-            time.sleep(0.5)
-            
-            if dh is not None:
-                status.write("📝 Salvando Horário...")
-                if not escrever_aba_gsheets("Horario", dh.fillna("")):
-                    return
-                time.sleep(0.5)
-
-            # NOVO BLOCO PARA O PL
-            if dpl is not None:
-                status.write("📝 Salvando Horário PL...")
-                # Garante que dpl não é None antes de salvar
-                if not escrever_aba_gsheets("HorarioPL", dpl.fillna("")):
-                    st.error("Erro ao escrever na aba HorarioPL")
-                    return
-                time.sleep(0.5)
-            
-            # CRUCIAL: Limpar o cache para o sistema baixar os dados novos na próxima vez
-            st.cache_data.clear()
-            status.update(label="✅ Salvo com Sucesso!", state="complete", expanded=False)
-            
-        time.sleep(1)
+        impressoes = obter_impressoes_abas()
+        fila = obter_fila_gravacao(armazenamento)
+        alteradas = []
+        
+        for aba, df in montar_abas_para_salvar(dt, dc, dp, dd, da, dh, dpl, dtv):
+            impressao = impressao_digital(valores_para_planilha(df))
+            if impressoes.get(aba) == impressao:
+                continue  # Aba sem alterações: nenhuma chamada à API
+            alteradas.append((aba, df))
+            impressoes[aba] = impressao
+        
+        fila.enfileirar_lote(alteradas)  # Um lote por salvamento: "N abas / M células"
+        enfileiradas = [aba for aba, _ in alteradas]
+        
+        st.session_state['ultimo_salvamento'] = {
+            'abas': enfileiradas,
+            'hora': datetime.now().strftime("%H:%M:%S"),
+        }
+        
+        if not enfileiradas:
+            st.toast("✅ Nenhuma alteração para salvar")
+            return
+        
+        # CRUCIAL: Limpar o cache; a próxima leitura já enxerga a fila de gravação
+        st.cache_data.clear()
+        st.toast(f"💾 Salvando em segundo plano: {', '.join(enfileiradas)}")
         st.rerun()
     except Exception as e: 
         st.error(f"Erro ao salvar: {e}")
-        if '429' in str(e) or 'Quota exceeded' in str(e):
-            st.info("💡 **Quota da API excedida.** Aguarde alguns minutos antes de tentar salvar novamente.")
-        
-    except Exception as e:
-        st.error(f"Erro ao salvar: {e}")
 
 def botao_salvar(label, key):
     """Botão de salvar com verificação"""
-    if sistema_seguro and PLANILHA_ID:
+    if sistema_seguro:
         if st.button(label, key=key, type="primary", use_container_width=True):
             salvar_seguro(dt, dc, dp, dd, da)
     else:
@@ -1424,19 +1414,18 @@ def gerar_professores_v52(
     dp_existente: pd.DataFrame,
     carga_minima: int = CARGA_MINIMA_PADRAO,
     carga_maxima: int = CARGA_MAXIMA_PADRAO,
-    media_alvo: int = MEDIA_ALVO_PADRAO
+    media_alvo: int = MEDIA_ALVO_PADRAO,
+    indice_demanda: Optional[Dict] = None
 ) -> Tuple[pd.DataFrame, List]:
     """Versão corrigida: calcula demanda corretamente"""
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(dt, dc)
     
     # 1. Calcular demanda TOTAL por região e matéria
     demanda_total = {}
-    for _, turma in dt.iterrows():
-        reg = padronizar(turma['REGIÃO'])
-        serie = turma['SÉRIE/ANO']
-        curr = dc[dc['SÉRIE/ANO'] == serie]
-        for _, item in curr.iterrows():
-            mat = padronizar_materia_interna(item['COMPONENTE'])
-            qtd = int(item['QTD_AULAS'])
+    for reg, serie in zip(dt['REGIÃO'], dt['SÉRIE/ANO']):
+        reg = padronizar(reg)
+        for mat, qtd in indice_demanda['curriculo'].get(serie, []):
             chave = (reg, mat)
             demanda_total[chave] = demanda_total.get(chave, 0) + qtd
     
@@ -1603,212 +1592,89 @@ def gerar_professores_v52(
 # ==========================================
 # 12 CÉREBRO: GERAÇÃO E ALOCAÇÃO INTELIGENTE
 # ==========================================
-def carregar_objs(df):
-    professores = {}
-    for _, r in df.iterrows():
-        cod = str(r['CÓDIGO'])
-        mats = [padronizar_materia_interna(m) for m in str(r['COMPONENTES']).split(',') if m]
-        vinc = str(r['VÍNCULO']).strip().upper()
-        professores[cod] = {
-            'id': cod, 'nome': r['NOME'], 'mats': set(mats), 'reg': padronizar(r['REGIÃO']),
-            'vin': vinc, 'tf': padronizar(r['TURNO_FIXO']),
-            'escolas_base': set([padronizar(x) for x in str(r['ESCOLAS_ALOCADAS']).split(',') if padronizar(x)]),
-            'max': int(r['CARGA_HORÁRIA']), 'atrib': 0, 'ocup': {}, 'escolas_reais': set(), 'regs_alocadas_historico': set()
-        }
-    return list(professores.values())
-
-def carregar_rotas(df):
-    m = {}
-    for _, row in df.iterrows():
-        escs = [padronizar(x) for x in str(row['LISTA_ESCOLAS']).split(',') if padronizar(x)]
-        for e in escs: m[e] = set(escs)
-    return m
-
-def resolver_grade_inteligente(
-    turmas: List,
-    curriculo: pd.DataFrame,
-    profs: List,
-    rotas: Dict,
-    turno_atual: str,
-    mapa_escola_regiao: Dict,
-    max_tentativas: int = MAX_TENTATIVAS_ALOCACAO
-) -> Tuple[bool, Dict, str, List]:
-    """Versão corrigida: não cria professores em excesso"""
-    turno_atual = padronizar(turno_atual)
-    
-    # Preparar demandas REAIS
-    demandas = []
-    for turma in turmas:
-        curr = curriculo[curriculo['SÉRIE/ANO'] == turma['ano']]
-        aulas = []
-        for _, r in curr.iterrows():
-            mat = padronizar_materia_interna(r['COMPONENTE'])
-            if mat in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                aulas.extend([mat] * int(r['QTD_AULAS']))
-        
-        while len(aulas) < SLOTS_AULA:
-            aulas.append("---")
-        
-        for slot, mat in enumerate(aulas[:SLOTS_AULA]):
-            if mat != "---":
-                demandas.append({
-                    'turma': turma,
-                    'mat': mat,
-                    'slot': slot,
-                    'prioridade': 1
-                })
-    
-    # Se não há demandas, retornar grade vazia
-    if not demandas:
-        grade_vazia = {t['nome_turma']: ["---"] * SLOTS_AULA for t in turmas}
-        return True, grade_vazia, "Nenhuma demanda de especialistas", profs
-    
-    # NÃO criar professores durante alocação - será consolidado depois
-    for tentativa in range(max_tentativas):
-        grade = {t['nome_turma']: [None] * SLOTS_AULA for t in turmas}
-        profs_temp = copy.deepcopy(profs)
-        random.shuffle(demandas)
-        
-        sucesso = True
-        
-        for item in demandas:
-            turma, mat, slot = item['turma'], item['mat'], item['slot']
-            esc, reg = padronizar(turma['escola_real']), padronizar(turma['regiao_real'])
-            
-            # Encontrar candidatos
-            candidatos = []
-            
-            for p in profs_temp:
-                # REGRA: Verificar se o professor leciona a matéria
-                if mat not in p['mats']:
-                    continue
-                
-                # REGRA: Verificar turno fixo (se aplicável)
-                if p['tf'] and p['tf'] not in ["AMBOS", "", turno_atual]:
-                    continue
-                
-                # REGRA: Verificar compatibilidade de região (com matéria para regras especiais)
-                pode_dar_aula, prioridade_regiao = verificar_compatibilidade_regiao(p['reg'], reg, mat)
-                if not pode_dar_aula:
-                    continue  # Região incompatível
-                
-                # REGRA: Verificar limite de carga horária
-                if p['atrib'] >= min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"]):
-                    continue
-                
-                # REGRA 1: Verificar conflito de horário (mesmo slot = impossível)
-                if slot in p['ocup']:
-                    continue  # Professor já está ocupado neste horário
-                
-                # REGRA 4: Verificar janelas/buracos entre aulas (apenas na mesma escola)
-                # Janelas são permitidas entre escolas diferentes (professor pode se deslocar)
-                tem_janela = False
-                if p['ocup']:  # Só verifica se já tem aulas alocadas
-                    # Verificar se há aulas na mesma escola
-                    tem_aula_mesma_escola = any(e_occ == esc for e_occ in p['ocup'].values())
-                    
-                    if tem_aula_mesma_escola:
-                        # Só verifica janela se há aulas na mesma escola
-                        tem_janela = verificar_janelas(p['ocup'], slot, esc, rotas)
-                        if tem_janela:
-                            continue  # Criaria janela/buraco na mesma escola
-                
-                # Verificar conflitos de deslocamento (escolas diferentes, sem rota)
-                # Tornar mais flexível: permitir deslocamento se houver tempo suficiente
-                conflito_deslocamento = False
-                for s_occ, e_occ in p['ocup'].items():
-                    if e_occ != esc:
-                        # Verificar se estão na mesma rota
-                        mesma_rota = esc in rotas.get(e_occ, set()) or e_occ in rotas.get(esc, set())
-                        if not mesma_rota:
-                            # Escolas diferentes sem rota: verificar se slots são muito próximos
-                            dist = abs(s_occ - slot)
-                            # Permitir deslocamento se houver pelo menos 1 slot de diferença (dist >= 1)
-                            # Isso permite: 1ª aula escola A, 3ª aula escola B (tempo para deslocar)
-                            if dist < 1:  # Apenas bloquear se for exatamente o mesmo slot
-                                conflito_deslocamento = True
-                                break
-                
-                if conflito_deslocamento:
-                    continue
-                
-                # Score de prioridade (quanto maior, melhor)
-                score = 0
-                
-                # Máxima prioridade: Professor efetivo na escola base
-                if p['vin'] == "EFETIVO" and esc in p['escolas_base']:
-                    score += 100000
-                
-                # Alta prioridade: Mesma região ou compatibilidade Fundão ↔ Timbuí
-                # REGRA GERAL: Fundão e Timbuí são compatíveis para TODAS as matérias
-                if ((p['reg'] == "FUNDÃO" and reg == "TIMBUÍ") or \
-                    (p['reg'] == "TIMBUÍ" and reg == "FUNDÃO")):
-                    score += prioridade_regiao * 1500  # Bonus para facilitar alocação entre Fundão e Timbuí
-                else:
-                    score += prioridade_regiao * 1000
-                
-                # Prioridade: Escola base do professor
-                if esc in p['escolas_base']:
-                    score += 2000
-                
-                # Prioridade: Escola já visitada pelo professor
-                if esc in p['escolas_reais']:
-                    score += 1000
-                
-                # Prioridade: Carga disponível (preferir professores com mais espaço)
-                score += (REGRA_CARGA_HORARIA["maximo_aulas"] - p['atrib']) * 10
-                
-                # Prioridade: Aulas consecutivas na mesma escola
-                if esc in [e for s, e in p['ocup'].items()]:
-                    score += 500
-                
-                candidatos.append((score, p))
-            
-            if candidatos:
-                # Escolhe o melhor
-                candidatos.sort(key=lambda x: -x[0])
-                escolhido = candidatos[0][1]
-                grade[turma['nome_turma']][slot] = escolhido['id']
-                escolhido['ocup'][slot] = esc
-                escolhido['atrib'] += 1
-                escolhido['escolas_reais'].add(esc)
-            else:
-                # NÃO criar professores durante alocação - será consolidado depois
-                # Marcar como não alocado para consolidação posterior
-                sucesso = False
-                grade[turma['nome_turma']][slot] = "---"
-                
-                # Debug: verificar por que não encontrou candidatos
-                if tentativa == 0:  # Só na primeira tentativa para não poluir logs
-                    profs_disponiveis = [p for p in profs_temp if mat in p['mats']]
-                    if profs_disponiveis:
-                        # Há professores da matéria, mas foram bloqueados pelas regras
-                        pass  # Será tratado na consolidação
-        
-        # Verifica se todas as aulas foram alocadas
-        todas_alocadas = all(all(v is not None for v in linha) for linha in grade.values())
-        
-        if todas_alocadas and sucesso:
-            # Preenche qualquer slot None com "---"
-            for t_nome, aulas in grade.items():
-                for i in range(SLOTS_AULA):
-                    if aulas[i] is None:
-                        grade[t_nome][i] = "---"
-            
-            # Atualiza a lista original de professores
-            for p_novo in profs_temp:
-                if p_novo['id'] not in [p['id'] for p in profs]:
-                    profs.append(p_novo)
-            
-            return True, grade, f"Sucesso na tentativa {tentativa+1}", profs
+# A alocação (carregar_objs, carregar_rotas, resolver_grade_inteligente) fica em alocador.py
+
+@st.cache_resource
+def obter_tarefa_geracao() -> TarefaGeracao:
+    """
+    Geração da grade em segundo plano (uma por processo). O resultado fica
+    guardado até ser salvo ou descartado na aba do gerador.
+    """
+    return TarefaGeracao()
+
+def desenhar_andamento_geracao():
+    """Progresso, cancelamento e resultado da geração em segundo plano (aba 7)."""
+    tarefa = obter_tarefa_geracao()
+    estado = tarefa.estado()
+    situacao = estado['situacao']
+    if situacao == "ociosa":
+        return
     
-    # Se não conseguiu, retorna o que tem
-    for t_nome, aulas in grade.items():
-        for i in range(SLOTS_AULA):
-            if aulas[i] is None:
-                grade[t_nome][i] = "---"
+    rotulos = {
+        "executando": ("⏳ Gerando grade..." if not estado['cancelando'] else "⏳ Cancelando...", "running"),
+        "concluida": ("✅ Grade gerada — aguardando salvamento", "complete"),
+        "cancelada": ("🛑 Geração cancelada", "error"),
+        "erro": ("❌ Erro na geração", "error"),
+    }
+    rotulo, estado_status = rotulos[situacao]
+    with st.status(f"{rotulo} (início {estado['inicio']})", state=estado_status,
+                   expanded=situacao == "executando"):
+        for mensagem in estado['mensagens']:
+            st.write(mensagem)
     
-    return False, grade, "Não foi possível alocar todas as aulas", profs
+    if situacao == "executando":
+        if st.button("🛑 Cancelar geração", disabled=estado['cancelando']):
+            tarefa.cancelar()
+    elif situacao == "concluida":
+        resultado = estado['resultado']
+        st.success(f"Processamento concluído às {estado['fim']}! {resultado['escolas']} escolas processadas.")
+        if resultado['blocos_refeitos'] is not None:
+            st.caption(f"♻️ Incremental: {resultado['blocos_refeitos']} bloco(s) escola/dia/turno refeitos.")
+        if resultado['diagnostico'] is not None:
+            regras, tempos = resultado['diagnostico']['regras'], resultado['diagnostico']['tempos']
+            with st.expander(f"🔬 Diagnóstico por regra ({int(regras['SEM_PROFESSOR'].sum())} aulas sem professor)"):
+                st.caption(" • ".join(f"{fase}: {seg:.2f}s" for fase, seg in tempos.items()))
+                st.dataframe(regras, use_container_width=True, hide_index=True)
+                st.download_button("📥 Baixar diagnóstico (JSON)", file_name="diagnostico_geracao.json",
+                                   mime="application/json",
+                                   data=json.dumps({'tempos': tempos,
+                                                    'regras': json.loads(regras.to_json(orient="records"))},
+                                                   ensure_ascii=False, indent=1))
+        c1, c2 = st.columns(2)
+        if c1.button("💾 Salvar grade gerada", type="primary", use_container_width=True):
+            tarefa.descartar()
+            # Base da próxima geração incremental: as entradas da grade que está sendo salva
+            try:
+                gravar_impressoes_geracao(ARQUIVO_IMPRESSOES_GERACAO, impressoes_blocos(
+                    dt, dc, resultado['professores'], dd, indice_demanda
+                ))
+            except OSError:
+                pass  # Sem o arquivo, a próxima geração só não poderá ser incremental
+            salvar_seguro(dt, dc, resultado['professores'], dd, da, resultado['horario'])
+        if c2.button("🗑️ Descartar resultado", use_container_width=True):
+            tarefa.descartar()
+            st.rerun()
+    else:
+        if estado['erro']:
+            st.error(estado['erro'])
+        if st.button("OK", key="fechar_geracao"):
+            tarefa.descartar()
+            st.rerun()
+
+# Atualiza o progresso sozinho enquanto a geração roda (versões com st.fragment)
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=2)
+    def _andamento_geracao_ao_vivo():
+        desenhar_andamento_geracao()
+        if not obter_tarefa_geracao().executando():
+            st.rerun()  # Terminou: a página volta a desenhar sem atualização periódica
+
+def mostrar_andamento_geracao():
+    """Andamento da geração; só consulta a tarefa a cada 2s enquanto ela roda."""
+    if hasattr(st, "fragment") and obter_tarefa_geracao().executando():
+        _andamento_geracao_ao_vivo()
+    else:
+        desenhar_andamento_geracao()
 
 def desenhar_xls(writer, escola, dados):
     wb = writer.book
@@ -1830,6 +1696,42 @@ def desenhar_xls(writer, escola, dados):
             r+=1
         r+=1
 
+def desenhar_status_gravacao():
+    """Andamento da fila de gravação em segundo plano (barra lateral)."""
+    fila = obter_fila_gravacao(armazenamento)
+    estado = fila.estado()
+    
+    if estado['em_gravacao'] or estado['pendentes']:
+        abas = ([estado['em_gravacao']] if estado['em_gravacao'] else []) + estado['pendentes']
+        st.info(f"⏳ Gravando {len(abas)} aba(s): {', '.join(abas)}")
+    
+    # Totais por salvamento, mais recentes primeiro (lotes fundidos em outro não aparecem)
+    concluidos = [s for s in estado['salvamentos'] if s['concluido'] and (s['abas'] or s['falhas'])]
+    for salvamento in concluidos[-3:][::-1]:
+        falhas = f", {salvamento['falhas']} com falha" if salvamento['falhas'] else ""
+        st.caption(f"{'⚠️' if falhas else '✅'} Salvamento das {salvamento['hora']}: "
+                   f"{salvamento['abas']} abas / {salvamento['celulas']} células{falhas}")
+    
+    for aba, mensagem in estado['falhas'].items():
+        st.error(f"❌ Falha ao gravar '{aba}': {mensagem}")
+    if estado['falhas'] and st.button("🔁 Tentar gravar novamente", use_container_width=True):
+        fila.reenviar_falhas()
+
+# Atualiza o status sozinho enquanto a fila trabalha (versões com st.fragment)
+if hasattr(st, "fragment"):
+    @st.fragment(run_every=2)
+    def _status_gravacao_ao_vivo():
+        desenhar_status_gravacao()
+        if not obter_fila_gravacao(armazenamento).ocupada():
+            st.rerun()  # Fila vazia: a barra lateral volta a ser desenhada sem atualização periódica
+
+def mostrar_status_gravacao():
+    """Status da gravação; só consulta a fila a cada 2s enquanto há abas a gravar."""
+    if hasattr(st, "fragment") and obter_fila_gravacao(armazenamento).ocupada():
+        _status_gravacao_ao_vivo()
+    else:
+        desenhar_status_gravacao()
+
 # ==========================================
 # 13 INTERFACE PRINCIPAL
 # ==========================================
@@ -1838,17 +1740,13 @@ with st.sidebar:
     st.title("Gestor Escolar")
     
     # Status da conexão
-    if gs_client is None:
+    if USA_GSHEETS and gs_client is None:
         st.error("⚠️ Erro na conexão com Google Sheets")
-    elif not PLANILHA_ID:
+    elif USA_GSHEETS and not PLANILHA_ID:
         st.error("⚠️ ID da planilha não encontrado")
     elif sistema_seguro:
         st.success("✅ Sistema Carregado")
-        try:
-            spreadsheet = gs_client.open_by_key(PLANILHA_ID)
-            st.caption(f"📋 {spreadsheet.title}")
-        except:
-            pass
+        st.caption(f"📋 {armazenamento.descricao()}")
     else:
         st.warning("⚠️ Dados incompletos")
     
@@ -1858,9 +1756,29 @@ with st.sidebar:
     
     st.markdown("---")
     st.caption(f"Última atualização: {st.session_state['hora_db']}")
+    
+    salvamento = st.session_state.get('ultimo_salvamento')
+    if salvamento:
+        if salvamento['abas']:
+            st.caption(f"💾 Último salvamento ({salvamento['hora']}): {', '.join(salvamento['abas'])}")
+        else:
+            st.caption(f"💾 Último salvamento ({salvamento['hora']}): nenhuma alteração")
+    
+    if sistema_seguro:
+        mostrar_status_gravacao()
+    
+    if USA_GSHEETS:
+        with st.expander("📈 Cota da API"):
+            for tipo, m in obter_limitador_taxa().metricas().items():
+                st.caption(
+                    f"**{tipo.capitalize()}**: {m['chamadas']} chamadas, "
+                    f"{m['disponiveis']} disponíveis agora, "
+                    f"{m['esperas']} esperas ({m['segundos_espera']:.1f}s), "
+                    f"{m['cotas_excedidas']} erros 429"
+                )
 
 # Verificar conexão antes de mostrar abas
-if gs_client is None or not PLANILHA_ID:
+if not sistema_seguro:
     st.stop()
 
 # Criar abas
@@ -1919,16 +1837,11 @@ with t1:
             turma_nome = row['TURMA']
             escola_nome = row['ESCOLA']
             
-            curr = dc[dc['SÉRIE/ANO'] == serie]
-            
-            for _, item in curr.iterrows():
-                mat_nome = padronizar_materia_interna(item['COMPONENTE'])
-                if mat_nome in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                    if filtro_materia == "Todas" or padronizar_materia_interna(filtro_materia) == mat_nome:
-                        qtd = int(item['QTD_AULAS'])
-                        demanda_por_materia[mat_nome] = demanda_por_materia.get(mat_nome, 0) + qtd
-                        total_aulas_demanda += qtd
-                        auditoria_demanda.append(f"📌 {escola_nome} - {turma_nome}: +{qtd} {mat_nome}")
+            for mat_nome, qtd in indice_demanda['especialistas'].get(serie, []):
+                if filtro_materia == "Todas" or padronizar_materia_interna(filtro_materia) == mat_nome:
+                    demanda_por_materia[mat_nome] = demanda_por_materia.get(mat_nome, 0) + qtd
+                    total_aulas_demanda += qtd
+                    auditoria_demanda.append(f"📌 {escola_nome} - {turma_nome}: +{qtd} {mat_nome}")
 
        
         # 3. CÁLCULO DE OFERTA (PROFESSORES)
@@ -1965,7 +1878,7 @@ with t1:
             carga_aulas = int(row['CARGA_HORÁRIA'])
             
             # Filtra apenas especialistas
-            mats_validas = [c for c in comps if c in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]]
+            mats_validas = [c for c in comps if c in MATERIAS_ESPECIALISTAS_INTERNAS]
             
             if mats_validas:
                 # Se der mais de uma matéria, divide. Se der só uma, pega tudo.
@@ -2574,7 +2487,7 @@ with t6:
                 with st.spinner("Cruzando horários, rotas e regiões..."):
                     # IMPORTANTE: Chama a função do seu arquivo inteligencia.py
                     from inteligencia import analisar_demanda_inteligente
-                    df_sugestao = analisar_demanda_inteligente(dt, dc, dd, da)
+                    df_sugestao = analisar_demanda_inteligente(dt, dc, dd, da, indice_demanda)
                     
                 if not df_sugestao.empty:
                     st.success("✅ Análise concluída! Veja abaixo as sugestões baseadas na logística real.")
@@ -2629,19 +2542,15 @@ with t7:
         detalhes_demanda = []
         
         for _, turma in dt.iterrows():
-            curr = dc[dc['SÉRIE/ANO'] == turma['SÉRIE/ANO']]
-            for _, item in curr.iterrows():
-                mat = padronizar_materia_interna(item['COMPONENTE'])
-                if mat in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                    qtd = int(item['QTD_AULAS'])
-                    total_aulas_especialistas += qtd
-                    detalhes_demanda.append({
-                        'Escola': turma['ESCOLA'],
-                        'Turma': turma['TURMA'],
-                        'Matéria': mat,
-                        'Aulas': qtd,
-                        'Série': turma['SÉRIE/ANO']
-                    })
+            for mat, qtd in indice_demanda['especialistas'].get(turma['SÉRIE/ANO'], []):
+                total_aulas_especialistas += qtd
+                detalhes_demanda.append({
+                    'Escola': turma['ESCOLA'],
+                    'Turma': turma['TURMA'],
+                    'Matéria': mat,
+                    'Aulas': qtd,
+                    'Série': turma['SÉRIE/ANO']
+                })
         
         st.write(f"**Total de aulas de especialistas (semanal):** {total_aulas_especialistas}")
         st.write(f"**Total de professores existentes:** {len(dp)}")
@@ -2651,373 +2560,74 @@ with t7:
         
         st.markdown("---")
         
-        if st.button("🚀 Gerar e Salvar Grade (COM CONTROLE)"):
-            with st.status("Processando Rede...", expanded=True) as status:
-                # Verificar se há dados suficientes
-                if dt.empty:
-                    st.error("❌ Não há turmas cadastradas!")
-                    st.stop()
-                if dc.empty:
-                    st.error("❌ Não há currículo configurado!")
-                    st.stop()
-                if dp.empty:
-                    st.warning("⚠️ Não há professores cadastrados! O sistema criará professores automaticamente.")
-                
-                profs_obj = carregar_objs(dp)
-                rotas_obj = carregar_rotas(da)
-                map_esc_reg = dict(zip(dt['ESCOLA'], dt['REGIÃO']))
-                
-                status.write(f"📊 Dados carregados:")
-                status.write(f"  • {len(dt)} turmas")
-                status.write(f"  • {len(profs_obj)} professores")
-                status.write(f"  • {len(rotas_obj)} rotas configuradas")
-                
-                merged = pd.merge(dt, dd, on="SÉRIE/ANO", how="left").fillna({'DIA_PLANEJAMENTO': 'NÃO CONFIGURADO'})
-                escolas = merged['ESCOLA'].unique()
-                
-                # Resetar estado INICIAL dos professores
-                for p in profs_obj:
-                    p['ocup'] = {}
-                    p['atrib'] = 0
-                    p['escolas_reais'] = set()
-                    p['regs_alocadas_historico'] = set()
-                
-                status.write(f"🏫 Processando {len(escolas)} escolas...")
-                novos_horarios = []
-                escolas_processadas = 0
-                
-                for esc in escolas:
-                    status.write(f"  • Processando escola: {esc}")
-                    df_e = merged[merged['ESCOLA'] == esc]
-                    
-                    # Processar TODAS as combinações de dia/turno, mesmo sem DIA_PLANEJAMENTO configurado
-                    combinacoes = df_e[['DIA_PLANEJAMENTO', 'TURNO']].drop_duplicates()
-                    
-                    # Se não houver DIA_PLANEJAMENTO configurado, processar por turno apenas
-                    if combinacoes.empty or combinacoes['DIA_PLANEJAMENTO'].isna().all():
-                        turnos = df_e['TURNO'].unique()
-                        for turno in turnos:
-                            turmas_f = df_e[df_e['TURNO'] == turno]
-                            dia = 'NÃO CONFIGURADO'
-                            
-                            lt = [{
-                                'nome_turma': r['TURMA'], 
-                                'ano': r['SÉRIE/ANO'], 
-                                'escola_real': esc, 
-                                'regiao_real': r['REGIÃO']
-                            } for _, r in turmas_f.iterrows()]
-                            
-                            if not lt:  # Pular se não houver turmas
-                                continue
-                            
-                            # Resetar ocup antes de cada dia/turno (cada dia/turno é independente)
-                            for p in profs_obj:
-                                p['ocup'] = {}
-                            
-                            # Resolve a grade (NÃO cria professores - apenas marca "---" se não encontrar)
-                            sucesso, res, mensagem, profs_obj = resolver_grade_inteligente(
-                                lt, dc, profs_obj, rotas_obj, turno, map_esc_reg
-                            )
-                            
-                            # Contar quantas aulas foram alocadas corretamente
-                            total_alocadas = sum(sum(1 for a in aulas if a and a != "---" and a is not None) for aulas in res.values()) if res else 0
-                            
-                            # Contar aulas esperadas baseado no currículo
-                            total_esperadas = 0
-                            for turma in lt:
-                                curr_turma = dc[dc['SÉRIE/ANO'] == turma['ano']]
-                                for _, item_curr in curr_turma.iterrows():
-                                    mat_curr = padronizar_materia_interna(item_curr['COMPONENTE'])
-                                    if mat_curr in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                                        total_esperadas += int(item_curr['QTD_AULAS'])
-                            
-                            status.write(f"    • {dia} - {turno}: {mensagem} ({len(lt)} turmas, {total_alocadas}/{total_esperadas} aulas alocadas)")
-                            
-                            # Diagnóstico detalhado se não alocou nada
-                            if total_alocadas == 0 and total_esperadas > 0:
-                                status.write(f"      ⚠️ NENHUMA aula alocada! Verificando professores disponíveis...")
-                                materias_necessarias = set()
-                                for turma in lt:
-                                    curr_turma = dc[dc['SÉRIE/ANO'] == turma['ano']]
-                                    for _, item_curr in curr_turma.iterrows():
-                                        mat_curr = padronizar_materia_interna(item_curr['COMPONENTE'])
-                                        if mat_curr in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                                            materias_necessarias.add(mat_curr)
-                                
-                                for mat_nec in materias_necessarias:
-                                    reg_nec = padronizar(lt[0]['regiao_real']) if lt else ""
-                                    profs_disponiveis = sum(1 for p in profs_obj if mat_nec in p['mats'] and 
-                                                           p['atrib'] < min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"]))
-                                    pode_regiao = sum(1 for p in profs_obj if mat_nec in p['mats'] and 
-                                                     verificar_compatibilidade_regiao(p['reg'], reg_nec, mat_nec)[0])
-                                    status.write(f"        • {mat_nec}: {profs_disponiveis} profs disponíveis, {pode_regiao} compatíveis com região {reg_nec}")
-                            
-                            for t_nome, aulas in res.items():
-                                novos_horarios.append([esc, t_nome, turno, dia] + aulas)
-                    else:
-                        # Processar normalmente com DIA_PLANEJAMENTO configurado
-                        for _, b in combinacoes.iterrows():
-                            dia, turno = b['DIA_PLANEJAMENTO'], b['TURNO']
-                            turmas_f = df_e[(df_e['DIA_PLANEJAMENTO']==dia) & (df_e['TURNO']==turno)]
-                            
-                            lt = [{
-                                'nome_turma': r['TURMA'], 
-                                'ano': r['SÉRIE/ANO'], 
-                                'escola_real': esc, 
-                                'regiao_real': r['REGIÃO']
-                            } for _, r in turmas_f.iterrows()]
-                            
-                            if not lt:  # Pular se não houver turmas
-                                continue
-                            
-                            # Resetar ocup antes de cada dia/turno (cada dia/turno é independente)
-                            for p in profs_obj:
-                                p['ocup'] = {}
-                            
-                            # Resolve a grade (NÃO cria professores - apenas marca "---" se não encontrar)
-                            sucesso, res, mensagem, profs_obj = resolver_grade_inteligente(
-                                lt, dc, profs_obj, rotas_obj, turno, map_esc_reg
-                            )
-                            
-                            # Contar quantas aulas foram alocadas corretamente
-                            total_alocadas = sum(sum(1 for a in aulas if a and a != "---" and a is not None) for aulas in res.values()) if res else 0
-                            
-                            # Contar aulas esperadas baseado no currículo
-                            total_esperadas = 0
-                            for turma in lt:
-                                curr_turma = dc[dc['SÉRIE/ANO'] == turma['ano']]
-                                for _, item_curr in curr_turma.iterrows():
-                                    mat_curr = padronizar_materia_interna(item_curr['COMPONENTE'])
-                                    if mat_curr in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                                        total_esperadas += int(item_curr['QTD_AULAS'])
-                            
-                            status.write(f"    • {dia} - {turno}: {mensagem} ({len(lt)} turmas, {total_alocadas}/{total_esperadas} aulas alocadas)")
-                            
-                            # Diagnóstico detalhado se não alocou nada
-                            if total_alocadas == 0 and total_esperadas > 0:
-                                status.write(f"      ⚠️ NENHUMA aula alocada! Verificando professores disponíveis...")
-                                materias_necessarias = set()
-                                for turma in lt:
-                                    curr_turma = dc[dc['SÉRIE/ANO'] == turma['ano']]
-                                    for _, item_curr in curr_turma.iterrows():
-                                        mat_curr = padronizar_materia_interna(item_curr['COMPONENTE'])
-                                        if mat_curr in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                                            materias_necessarias.add(mat_curr)
-                                
-                                for mat_nec in materias_necessarias:
-                                    reg_nec = padronizar(lt[0]['regiao_real']) if lt else ""
-                                    profs_disponiveis = sum(1 for p in profs_obj if mat_nec in p['mats'] and 
-                                                           p['atrib'] < min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"]))
-                                    pode_regiao = sum(1 for p in profs_obj if mat_nec in p['mats'] and 
-                                                     verificar_compatibilidade_regiao(p['reg'], reg_nec, mat_nec)[0])
-                                    status.write(f"        • {mat_nec}: {profs_disponiveis} profs disponíveis, {pode_regiao} compatíveis com região {reg_nec}")
-                            
-                            for t_nome, aulas in res.items():
-                                novos_horarios.append([esc, t_nome, turno, dia] + aulas)
-                    
-                    escolas_processadas += 1
-                
-                # NÃO converter professores criados durante alocação
-                # Tudo será consolidado na FASE 2 abaixo
-                
-                # Atualizar cargas horárias dos professores existentes baseado nas alocações
-                status.write("📊 Atualizando cargas horárias e PL dos professores...")
-                for p_obj in profs_obj:
-                    # Encontrar professor no DataFrame
-                    idx = dp[dp['CÓDIGO'] == p_obj['id']].index
-                    if len(idx) > 0:
-                        # Atualizar carga horária com base nas atribuições reais
-                        carga_atual = p_obj['atrib']
-                        if carga_atual > 0:
-                            dp.loc[idx[0], 'CARGA_HORÁRIA'] = max(carga_atual, dp.loc[idx[0], 'CARGA_HORÁRIA'])
-                            
-                            # REGRA 5: Atualizar PL baseado na LDB
-                            pl_ldb = calcular_pl_ldb(dp.loc[idx[0], 'CARGA_HORÁRIA'])
-                            dp.loc[idx[0], 'QTD_PL'] = pl_ldb
-                            
-                            # Atualizar escolas alocadas
-                            escolas_reais = ','.join(p_obj['escolas_reais']) if p_obj['escolas_reais'] else dp.loc[idx[0], 'ESCOLAS_ALOCADAS']
-                            if escolas_reais:
-                                dp.loc[idx[0], 'ESCOLAS_ALOCADAS'] = escolas_reais
-                
-                # ===== FASE 2: CONSOLIDAR VAGAS NÃO PREENCHIDAS =====
-                status.write("📊 Analisando demanda não atendida e consolidando...")
-                
-                # Contar demanda não preenchida por região/matéria
-                # Método melhorado: contar slots "---" e identificar matéria pela posição no currículo
-                demanda_nao_preenchida = {}
-                
-                # Criar DataFrame de horários para análise
-                df_horarios_temp = pd.DataFrame(novos_horarios, columns=COLS_PADRAO["Horario"])
-                
-                # Agrupar por escola/turma para processar uma vez cada
-                turmas_processadas = set()
-                
-                for _, row in df_horarios_temp.iterrows():
-                    esc = row['ESCOLA']
-                    turma_nome = row['TURMA']
-                    chave_turma = (esc, turma_nome)
-                    
-                    if chave_turma in turmas_processadas:
-                        continue
-                    turmas_processadas.add(chave_turma)
-                    
-                    # Encontrar informações da turma
-                    df_turma = dt[(dt['ESCOLA'] == esc) & (dt['TURMA'] == turma_nome)]
-                    if df_turma.empty:
-                        continue
-                    
-                    serie = df_turma.iloc[0]['SÉRIE/ANO']
-                    regiao = padronizar(df_turma.iloc[0]['REGIÃO'])
-                    
-                    # Buscar currículo da série e criar lista de aulas esperadas
-                    curr = dc[dc['SÉRIE/ANO'] == serie]
-                    aulas_esperadas = []
-                    for _, item in curr.iterrows():
-                        mat = padronizar_materia_interna(item['COMPONENTE'])
-                        if mat in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                            qtd = int(item['QTD_AULAS'])
-                            aulas_esperadas.extend([mat] * qtd)
-                    
-                    # Buscar todas as linhas dessa turma no horário
-                    linhas_turma = df_horarios_temp[(df_horarios_temp['ESCOLA'] == esc) & 
-                                                    (df_horarios_temp['TURMA'] == turma_nome)]
-                    
-                    # Contar quantas aulas de cada matéria foram alocadas
-                    materias_alocadas = {}
-                    for _, linha in linhas_turma.iterrows():
-                        for col in ['1ª', '2ª', '3ª', '4ª', '5ª']:
-                            prof_id = linha[col]
-                            if prof_id != '---' and prof_id:
-                                # Encontrar matéria do professor
-                                prof_df = dp[dp['CÓDIGO'] == prof_id]
-                                if not prof_df.empty:
-                                    comps = str(prof_df.iloc[0]['COMPONENTES'])
-                                    mats_prof = [padronizar_materia_interna(m.strip()) for m in comps.split(',') if m.strip()]
-                                    for mat_prof in mats_prof:
-                                        if mat_prof in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                                            materias_alocadas[mat_prof] = materias_alocadas.get(mat_prof, 0) + 1
-                    
-                    # Contar quantas aulas de cada matéria faltam
-                    materias_esperadas_dict = {}
-                    for mat in aulas_esperadas:
-                        materias_esperadas_dict[mat] = materias_esperadas_dict.get(mat, 0) + 1
-                    
-                    # Calcular déficit
-                    for mat, qtd_esperada in materias_esperadas_dict.items():
-                        qtd_alocada = materias_alocadas.get(mat, 0)
-                        deficit = qtd_esperada - qtd_alocada
-                        if deficit > 0:
-                            chave = (regiao, mat)
-                            demanda_nao_preenchida[chave] = demanda_nao_preenchida.get(chave, 0) + deficit
-                
-                total_aulas_faltando = sum(demanda_nao_preenchida.values())
-                status.write(f"📊 Total de aulas não preenchidas: {total_aulas_faltando} em {len(demanda_nao_preenchida)} combinações região/matéria")
-                
-                # Mostrar detalhes
-                if demanda_nao_preenchida:
-                    status.write("📋 Detalhes por região/matéria:")
-                    for (reg, mat), qtd in sorted(demanda_nao_preenchida.items()):
-                        status.write(f"  • {mat} - {reg}: {qtd} aulas faltando")
-                
-                # ===== CRIAR NOVOS PROFESSORES CONSOLIDADOS =====
-                if demanda_nao_preenchida:
-                    status.write("🔄 Criando novos professores consolidados para vagas não preenchidas...")
-                    
-                    novos_profs = []
-                    numeros_existentes = []
-                    
-                    # Coletar números existentes de todos os professores (incluindo os criados durante alocação)
-                    for _, p_row in dp.iterrows():
-                        match = re.search(r'P(\d+)', str(p_row['CÓDIGO']))
-                        if match:
-                            numeros_existentes.append(int(match.group(1)))
-                    
-                    proximo_numero = max(numeros_existentes) + 1 if numeros_existentes else 1
-                    
-                    for (reg, mat), qtd_aulas in sorted(demanda_nao_preenchida.items()):
-                        if qtd_aulas <= 0:
-                            continue
-                        
-                        # REGRA 7: Distribuir carga de forma inteligente
-                        cargas = distribuir_carga_inteligente(qtd_aulas)
-                        
-                        # Validar cada carga
-                        cargas_validas = []
-                        for carga in cargas:
-                            valido, msg = verificar_limites_carga(carga, qtd_aulas)
-                            if valido:
-                                cargas_validas.append(carga)
-                            else:
-                                # Ajustar para o mínimo se necessário
-                                if REGRA_CARGA_HORARIA["permitir_menor_se_necessario"]:
-                                    carga_ajustada = max(1, min(carga, qtd_aulas))
-                                    cargas_validas.append(carga_ajustada)
-                        
-                        # Se não gerou cargas válidas, usar distribuição simples respeitando limites
-                        if not cargas_validas:
-                            carga_max = REGRA_CARGA_HORARIA["maximo_aulas"]
-                            carga_min = REGRA_CARGA_HORARIA["minimo_aulas"]
-                            if qtd_aulas <= carga_max:
-                                cargas_validas = [qtd_aulas]
-                            else:
-                                # Dividir respeitando limites
-                                num_profs = math.ceil(qtd_aulas / carga_max)
-                                carga_por_prof = qtd_aulas / num_profs
-                                cargas_validas = []
-                                restante = qtd_aulas
-                                for i in range(num_profs):
-                                    if i == num_profs - 1:
-                                        carga = restante
-                                    else:
-                                        carga = min(carga_max, max(carga_min, round(carga_por_prof)))
-                                        restante -= carga
-                                    cargas_validas.append(max(1, carga))
-                        
-                        cargas = cargas_validas
-                        
-                        # Criar os professores
-                        escolas_regiao = list(set(dt[dt['REGIÃO'] == reg]['ESCOLA'].unique()))
-                        
-                        for i, carga in enumerate(cargas):
-                            if carga > 0:
-                                cod = gerar_codigo_padrao(proximo_numero, "DT", reg, mat)
-                                proximo_numero += 1
-                                
-                                # REGRA 5: Calcular PL baseado na LDB (1/3)
-                                pl_ldb = calcular_pl_ldb(carga)
-                                
-                                novos_profs.append({
-                                    "CÓDIGO": cod,
-                                    "NOME": f"VAGA {mat} {reg}",
-                                    "COMPONENTES": mat,
-                                    "CARGA_HORÁRIA": carga,
-                                    "REGIÃO": reg,
-                                    "VÍNCULO": "DT",
-                                    "TURNO_FIXO": "",
-                                    "ESCOLAS_ALOCADAS": ",".join(escolas_regiao[:2]),
-                                    "QTD_PL": pl_ldb  # PL calculado pela LDB
-                                })
-                                
-                                status.write(f"  ✅ {cod}: {carga}h ({mat} - {reg})")
-                    
-                    # Adicionar novos professores ao dataframe
-                    if novos_profs:
-                        dp_com_novos = pd.concat([dp, pd.DataFrame(novos_profs)], ignore_index=True)
-                        status.write(f"✅ {len(novos_profs)} novos professores consolidados criados")
-                    else:
-                        dp_com_novos = dp
-                else:
-                    dp_com_novos = dp
-                    status.write("✅ Todas as vagas foram preenchidas!")
-                
-                df_horario = pd.DataFrame(novos_horarios, columns=COLS_PADRAO["Horario"])
-                
-                status.write("💾 Salvando no banco de dados...")
-                salvar_seguro(dt, dc, dp_com_novos, dd, da, df_horario)
-                
-                status.update(label="✅ Grade Gerada com Sucesso!", state="complete", expanded=False)
-                st.success(f"Processamento concluído! {escolas_processadas} escolas processadas.")
+        # Motor de alocação: heurístico (padrão) ou exato (CP-SAT, requer ortools)
+        motores = ["⚡ Heurístico (rápido)", "🎯 Exato (CP-SAT)"]
+        motor = st.radio("Motor de alocação", motores, horizontal=True,
+                         help="O modo exato resolve com o OR-Tools cada bloco dia/turno da rede (todas as "
+                              "escolas com o mesmo dia de planejamento e turno juntas), com até "
+                              f"{TEMPO_LIMITE_SOLVER_EXATO}s por bloco, e devolve a melhor solução encontrada.")
+        modo_exato = motor == motores[1]
+        if modo_exato and not solver_exato_disponivel():
+            st.warning("⚠️ O modo exato requer o pacote `ortools` (pip install ortools). Usando o modo heurístico.")
+            modo_exato = False
+        resolver_bloco = resolver_grade_exata if modo_exato else resolver_grade_inteligente
+        
+        # Blocos dia/turno são independentes: podem ser resolvidos em vários núcleos
+        em_paralelo = st.checkbox(f"⚙️ Gerar em paralelo ({PROCESSOS_GERACAO} processos)",
+                                  value=False, disabled=PROCESSOS_GERACAO <= 1,
+                                  help="Resolve cada bloco dia/turno em um processo e depois funde as cargas dos "
+                                       "professores. Iniciar os processos leva alguns segundos: só compensa em "
+                                       "redes com muitos blocos demorados.")
+        
+        semente_geracao = st.number_input("🎲 Semente (0 = aleatória)", min_value=0, value=0, step=1,
+                                          help="Com a mesma semente e os mesmos dados, a grade gerada é sempre a mesma.")
+        
+        # Incremental: só os blocos escola/dia/turno cujas entradas mudaram desde a última grade salva
+        impressoes_anteriores = ler_impressoes_geracao(ARQUIVO_IMPRESSOES_GERACAO)
+        pode_incremental = impressoes_anteriores is not None and not dh.empty
+        incremental = st.checkbox("♻️ Refazer só o que mudou (incremental)", value=pode_incremental,
+                                  disabled=not pode_incremental,
+                                  help="Mantém as linhas do horário (inclusive edições manuais) dos blocos "
+                                       "escola/dia/turno cujas turmas, currículo e professores elegíveis "
+                                       "não mudaram desde a última grade salva.")
+        
+        # Travas do editor manual (aba 9): essas células não são realocadas
+        respeitar_travas = st.checkbox(f"🔒 Respeitar células travadas ({len(dtv)})", value=not dtv.empty,
+                                       disabled=dtv.empty or dh.empty,
+                                       help="Mantém o professor das células travadas no Editor Manual e "
+                                            "aloca as demais aulas em volta delas.")
+        
+        diagnostico_geracao = st.checkbox("🔬 Diagnóstico por regra", value=False,
+                                          help="Conta, por escola/dia/turno/componente, os candidatos descartados "
+                                               "por cada regra (matéria, turno fixo, região, carga, conflito, "
+                                               "janela) e mede o tempo de cada fase. Só no motor heurístico.")
+        
+        tarefa = obter_tarefa_geracao()
+        if st.button("🚀 Gerar Grade (COM CONTROLE)", disabled=tarefa.executando()):
+            # Verificar se há dados suficientes
+            if dt.empty:
+                st.error("❌ Não há turmas cadastradas!")
+                st.stop()
+            if dc.empty:
+                st.error("❌ Não há currículo configurado!")
+                st.stop()
+            if dp.empty:
+                st.warning("⚠️ Não há professores cadastrados! O sistema criará professores automaticamente.")
+            
+            # Roda fora da thread do script: sobrevive a recargas da página
+            processos = PROCESSOS_GERACAO if em_paralelo else 1
+            tarefa.iniciar(lambda relatar, cancelado: gerar_grade_rede(
+                dt, dc, dp, dd, da, indice_demanda,
+                resolver=resolver_bloco, processos=processos,
+                relatar=relatar, cancelado=cancelado,
+                semente=int(semente_geracao) or None,
+                horario_atual=dh,
+                impressoes_anteriores=impressoes_anteriores if incremental else None,
+                travas=dtv if respeitar_travas else None,
+                diagnostico=diagnostico_geracao
+            ))
+        
+        mostrar_andamento_geracao()
     else:
         st.warning("⚠️ Configure a conexão com Google Sheets primeiro.")
 
@@ -3041,10 +2651,11 @@ with t8:
             ]
             modo_vis = st.radio("Exibir:", opcoes_vis, horizontal=True)
             
-            def formatar_celula(codigo):
+            def formatar_celula(codigo, mat_slot=None):
                 if not codigo or codigo == "---": return "---"
                 nome = map_nome.get(codigo, codigo)
-                mat = map_comp.get(codigo, "?")
+                # Matéria da aula pela grade do alocador; sem ela, as matérias do professor
+                mat = mat_slot if mat_slot and mat_slot != "---" else map_comp.get(codigo, "?")
                 if modo_vis == "Apenas Código": return codigo
                 if modo_vis == "Nome do Professor": return nome.split()[0] + " " + nome.split()[-1] if len(nome.split()) > 1 else nome
                 if modo_vis == "Matéria/Componente": return mat
@@ -3109,9 +2720,9 @@ with t8:
                 d_t = dt[dt['TURMA'] == t]
                 if not d_t.empty:
                     serie = d_t.iloc[0]['SÉRIE/ANO']
-                    cfg = dd[dd['SÉRIE/ANO'] == serie]
-                    if not cfg.empty:
-                        if dia_norm in [padronizar(d) for d in cfg['DIA_PLANEJAMENTO'].unique()]:
+                    dias_cfg = indice_demanda['dias'].get(serie)
+                    if dias_cfg:
+                        if dia_norm in [padronizar(d) for d in dias_cfg]:
                             turmas_v.append(t)
                     else: turmas_v.append(t)
                 else: turmas_v.append(t)
@@ -3132,11 +2743,12 @@ with t8:
                     with cols[i % 3]:
                         # Início do Card
                         html = f'<div class="turma-card-moldura"><div class="turma-titulo">👥 {t_nome}</div>'
+                        materias_linha = ler_materias_slots(linha.get('COMPONENTE')) or [None] * 5
                         
-                        for slot in ["1ª", "2ª", "3ª", "4ª", "5ª"]:
+                        for i_slot, slot in enumerate(["1ª", "2ª", "3ª", "4ª", "5ª"]):
                             cod = linha.get(slot, "---")
                             est = gerar_estilo_professor_dinamico(cod)
-                            txt_exib = formatar_celula(cod)
+                            txt_exib = formatar_celula(cod, materias_linha[i_slot])
                             
                             html += f'''
                             <div class="slot-aula-container" style="background-color: {est['bg']}; color: {est['text']}; border: 1px solid {est['border']};">
@@ -3201,9 +2813,9 @@ with t9:
             
             for _, r_t in df_base_t.iterrows():
                 serie_t = r_t['SÉRIE/ANO']
-                config = dd[dd['SÉRIE/ANO'] == serie_t]
-                if not config.empty:
-                    dias_ok = [padronizar(d) for d in config['DIA_PLANEJAMENTO'].unique()]
+                dias_cfg = indice_demanda['dias'].get(serie_t)
+                if dias_cfg:
+                    dias_ok = [padronizar(d) for d in dias_cfg]
                     if dia_norm_man in dias_ok: 
                         turmas_alvo_info.append({'nome': r_t['TURMA'], 'serie': serie_t})
                 else: 
@@ -3216,12 +2828,14 @@ with t9:
             else:
                 # --- 4. PREPARAÇÃO DE DADOS (HORÁRIOS) ---
                 horario_atual = {}
+                componentes_atuais = {}  # Grade de matérias por slot (coluna COMPONENTE)
                 if not dh.empty:
                     mask_tela = (dh['ESCOLA'] == esc_man) & \
                                 (dh['DIA'].apply(padronizar) == dia_norm_man) & \
                                 (dh['TURNO'] == turno_man)
                     for _, row in dh[mask_tela].iterrows():
                         horario_atual[row['TURMA']] = {s: row[s] for s in ["1ª", "2ª", "3ª", "4ª", "5ª"]}
+                        componentes_atuais[row['TURMA']] = row.get('COMPONENTE', "")
 
                 # Histórico (para validação)
                 aulas_semanais_db = {}
@@ -3261,7 +2875,15 @@ with t9:
                     if not dpl_conflito.empty:
                         dh_conflito = pd.concat([dh_conflito, dpl_conflito])
 
+                # Células travadas (respeitadas pelo gerador da aba 7)
+                travas_tela = set()
+                if not dtv.empty:
+                    mask_travas = (dtv['ESCOLA'] == esc_man) & \
+                                  (dtv['DIA'].apply(padronizar) == dia_norm_man)
+                    travas_tela = {(r['TURMA'], padronizar(r['SLOT'])) for _, r in dtv[mask_travas].iterrows()}
+
                 escolhas_t9 = {}
+                travas_t9 = {}
                 
                 # --- 5. RENDERIZAR GRID ---
                 grid = st.columns(3)
@@ -3285,7 +2907,7 @@ with t9:
                                 # Ordena novamente para ficar bonito, mantendo "---" no início
                                 opcoes_locais = ["---"] + sorted([x for x in opcoes_locais if x != "---"])
                             
-                            c_lbl, c_sel = st.columns([1, 4])
+                            c_lbl, c_sel, c_trava = st.columns([1, 4, 1])
                             with c_lbl: 
                                 st.markdown(f"<div style='padding-top:10px; font-weight:bold; font-size:11px;'>{slot}</div>", unsafe_allow_html=True)
                             with c_sel:
@@ -3311,6 +2933,11 @@ with t9:
                                         st.markdown(f'<div style="background:{est["bg"]}; color:{est["text"]}; font-size:10px; text-align:center; border-radius:3px; margin-top:-10px; margin-bottom:5px;">{res_prof}</div>', unsafe_allow_html=True)
                                 
                                 escolhas_t9[(turma, slot)] = res_prof
+                            with c_trava:
+                                travas_t9[(turma, slot)] = st.checkbox(
+                                    "🔒", value=(turma, padronizar(slot)) in travas_tela,
+                                    key=f"ed_trava_{turma}_{slot}_{dia_man}",
+                                    help="Travar: o gerador mantém esta célula como está")
                             
                             if slot == "3ª": 
                                 st.markdown("<div style='text-align:center; font-size:9px; color:#ccc; margin:2px 0;'>— RECREIO —</div>", unsafe_allow_html=True)
@@ -3328,7 +2955,6 @@ with t9:
                     # Validação 1: Matriz
                     for t_info in turmas_alvo_info:
                         tn, ts = t_info['nome'], t_info['serie']
-                        curr = dc[dc['SÉRIE/ANO'] == ts]
                         p_edit = [escolhas_t9[(tn, s)] for s in ["1ª", "2ª", "3ª", "4ª", "5ª"] if escolhas_t9[(tn, s)] != "---"]
                         tot = aulas_semanais_db.get(tn, []) + p_edit
                         
@@ -3341,14 +2967,11 @@ with t9:
                             if not d.empty:
                                 cs = [padronizar_materia_interna(x.strip()) for x in str(d.iloc[0]['COMPONENTES']).split(',')]
                                 for c in cs:
-                                    if c in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]: cnt[c] = cnt.get(c, 0) + 1
+                                    if c in MATERIAS_ESPECIALISTAS_INTERNAS: cnt[c] = cnt.get(c, 0) + 1
                         
-                        for _, i in curr.iterrows():
-                            m = padronizar_materia_interna(i['COMPONENTE'])
-                            mt = int(i['QTD_AULAS'])
-                            if m in [padronizar_materia_interna(x) for x in MATERIAS_ESPECIALISTAS]:
-                                if cnt.get(m, 0) > mt:
-                                    erros.append(f"⛔ **Excesso ({tn}):** {m} ({cnt.get(m,0)}/{mt})")
+                        for m, mt in indice_demanda['especialistas'].get(ts, []):
+                            if cnt.get(m, 0) > mt:
+                                erros.append(f"⛔ **Excesso ({tn}):** {m} ({cnt.get(m,0)}/{mt})")
 
                     # Validação 2: Conflitos
                     for slot_v in ["1ª", "2ª", "3ª", "4ª", "5ª"]:
@@ -3390,7 +3013,9 @@ with t9:
                         with st.spinner("Salvando..."):
                             novas = []
                             for t in turmas_alvo_info:
-                                ln = {"ESCOLA": esc_man, "TURMA": t['nome'], "TURNO": turno_man, "DIA": dia_man}
+                                # Mantém a grade de matérias: as células travadas seguem com a matéria alocada
+                                ln = {"ESCOLA": esc_man, "COMPONENTE": componentes_atuais.get(t['nome'], ""),
+                                      "TURMA": t['nome'], "TURNO": turno_man, "DIA": dia_man}
                                 for s in ["1ª", "2ª", "3ª", "4ª", "5ª"]: ln[s] = escolhas_t9[(t['nome'], s)]
                                 novas.append(ln)
                             
@@ -3403,8 +3028,19 @@ with t9:
                             
                             dh = pd.concat([dh, pd.DataFrame(novas)], ignore_index=True)
                             
+                            # Travas das turmas da tela: substitui as anteriores
+                            if not dtv.empty:
+                                mask_rm_trava = (dtv['ESCOLA'] == esc_man) & \
+                                                (dtv['DIA'].apply(padronizar) == dia_norm_man) & \
+                                                dtv['TURMA'].isin([t['nome'] for t in turmas_alvo_info])
+                                dtv = dtv[~mask_rm_trava]
+                            novas_travas = [{"ESCOLA": esc_man, "TURMA": tn, "DIA": dia_man, "SLOT": s}
+                                            for (tn, s), travada in travas_t9.items() if travada]
+                            dtv = pd.concat([dtv, pd.DataFrame(novas_travas, columns=COLS_PADRAO["Travas"])],
+                                            ignore_index=True)
+                            
                             # Salva passando dpl para não perder os PLs
-                            salvar_seguro(dt, dc, dp, dd, da, dh, dpl)
+                            salvar_seguro(dt, dc, dp, dd, da, dh, dpl, dtv)
                             st.success("✅ Horário salvo com sucesso!")
                             time.sleep(1)
                             st.rerun()
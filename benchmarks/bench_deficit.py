@@ -0,0 +1,167 @@
+"""
+Prova e benchmark do cálculo da demanda não preenchida (FASE 2 do gerador).
+
+Aloca uma rede sintética (bench_gerador) e, em horários com e sem
+perturbações (células vazias, códigos desconhecidos, professores com
+várias matérias e códigos repetidos em Professores), confere
+calcular_demanda_nao_preenchida:
+
+* sem a grade de matérias (coluna COMPONENTE vazia), contra a cópia da
+  implementação original (laço iterrows com filtros de dt, do horário e
+  de dp a cada turma e slot, que infere a matéria pelo professor);
+* com a grade de matérias do alocador, contra a contagem direta dos slots
+  de especialista sem professor (exata mesmo com professores de várias
+  matérias, que a inferência conta em dobro).
+
+Sai com código 1 se algum resultado divergir.
+
+Uso:
+    python benchmarks/bench_deficit.py [--escolas 60] [--turmas 2] [--profs 3] [--semente 42]
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+from config import COLS_PADRAO, MATERIAS_ESPECIALISTAS  # noqa: E402
+from utils import padronizar, padronizar_materia_interna, MATERIAS_ESPECIALISTAS_INTERNAS  # noqa: E402
+from inteligencia import construir_indice_demanda  # noqa: E402
+from alocador import ler_materias_slots, resolver_grade_inteligente  # noqa: E402
+from gerador import calcular_demanda_nao_preenchida  # noqa: E402
+from bench_gerador import alocar, gerar_rede  # noqa: E402
+
+
+# ==========================================
+# IMPLEMENTAÇÃO ORIGINAL (ITERROWS)
+# ==========================================
+def demanda_original(novos_horarios, dt, dp, indice_demanda):
+    demanda_nao_preenchida = {}
+    df_horarios_temp = pd.DataFrame(novos_horarios, columns=COLS_PADRAO["Horario"])
+    turmas_processadas = set()
+    for _, row in df_horarios_temp.iterrows():
+        esc = row['ESCOLA']
+        turma_nome = row['TURMA']
+        chave_turma = (esc, turma_nome)
+        if chave_turma in turmas_processadas:
+            continue
+        turmas_processadas.add(chave_turma)
+        df_turma = dt[(dt['ESCOLA'] == esc) & (dt['TURMA'] == turma_nome)]
+        if df_turma.empty:
+            continue
+        serie = df_turma.iloc[0]['SÉRIE/ANO']
+        regiao = padronizar(df_turma.iloc[0]['REGIÃO'])
+        aulas_esperadas = indice_demanda['aulas'].get(serie, [])
+        linhas_turma = df_horarios_temp[(df_horarios_temp['ESCOLA'] == esc) &
+                                        (df_horarios_temp['TURMA'] == turma_nome)]
+        materias_alocadas = {}
+        for _, linha in linhas_turma.iterrows():
+            for col in ['1ª', '2ª', '3ª', '4ª', '5ª']:
+                prof_id = linha[col]
+                if prof_id != '---' and prof_id:
+                    prof_df = dp[dp['CÓDIGO'] == prof_id]
+                    if not prof_df.empty:
+                        comps = str(prof_df.iloc[0]['COMPONENTES'])
+                        mats_prof = [padronizar_materia_interna(m.strip()) for m in comps.split(',') if m.strip()]
+                        for mat_prof in mats_prof:
+                            if mat_prof in MATERIAS_ESPECIALISTAS_INTERNAS:
+                                materias_alocadas[mat_prof] = materias_alocadas.get(mat_prof, 0) + 1
+        materias_esperadas_dict = {}
+        for mat in aulas_esperadas:
+            materias_esperadas_dict[mat] = materias_esperadas_dict.get(mat, 0) + 1
+        for mat, qtd_esperada in materias_esperadas_dict.items():
+            qtd_alocada = materias_alocadas.get(mat, 0)
+            deficit = qtd_esperada - qtd_alocada
+            if deficit > 0:
+                chave = (regiao, mat)
+                demanda_nao_preenchida[chave] = demanda_nao_preenchida.get(chave, 0) + deficit
+    return demanda_nao_preenchida
+
+
+def demanda_exata(novos_horarios, dt):
+    """Slots de especialista sem professor, pela grade de matérias de cada linha."""
+    regiao = {(e, t): padronizar(r) for e, t, r in zip(dt['ESCOLA'], dt['TURMA'], dt['REGIÃO'])}
+    demanda = {}
+    for linha in novos_horarios:
+        for mat, prof in zip(ler_materias_slots(linha[1]), linha[6:]):
+            if mat != "---" and (prof is None or prof in ("---", "")):
+                chave = (regiao[(linha[0], linha[3])], mat)
+                demanda[chave] = demanda.get(chave, 0) + 1
+    return demanda
+
+
+def perturbar(linhas, dp, rnd):
+    """Horário e professores com os casos de borda da planilha real."""
+    linhas = [list(linha) for linha in linhas]
+    for linha in linhas:
+        for i in range(6, 11):
+            sorte = rnd.random()
+            if sorte < 0.05:
+                linha[i] = ""
+            elif sorte < 0.08:
+                linha[i] = "P_INEXISTENTE"
+            elif sorte < 0.10:
+                linha[i] = None
+    dp = dp.copy()
+    multi = dp.sample(frac=0.3, random_state=rnd.randrange(10**6)).index
+    dp.loc[multi, 'COMPONENTES'] = dp.loc[multi, 'COMPONENTES'] + ", " + \
+        pd.Series([rnd.choice(MATERIAS_ESPECIALISTAS) for _ in multi], index=multi) + ", PORTUGUÊS,"
+    dp = pd.concat([dp, dp.head(3).assign(COMPONENTES="ARTE")], ignore_index=True)  # Códigos repetidos
+    return linhas, dp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escolas", type=int, default=60)
+    parser.add_argument("--turmas", type=int, default=2, help="Turmas por série em cada escola")
+    parser.add_argument("--profs", type=int, default=3, help="Professores por matéria em cada região")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    rede = gerar_rede(args.escolas, args.turmas, args.profs, 3, args.semente)
+    dt, dc, dp, dd, _ = rede
+    indice_demanda = construir_indice_demanda(dt, dc, dd)
+    linhas, _, _ = alocar(rede, functools.partial(resolver_grade_inteligente, tempo_busca_local=0),
+                          args.semente, 1)
+    print(f"Rede sintética: {len(dt)} turmas, {len(dp)} professores, {len(linhas)} linhas no horário")
+
+    rnd = random.Random(args.semente)
+    divergencias = 0
+    for nome, (h, profs) in [("gerado", (linhas, dp)), ("perturbado", perturbar(linhas, dp, rnd))]:
+        sem_grade = [linha[:1] + [""] + linha[2:] for linha in h]
+        inicio = time.perf_counter()
+        esperado = demanda_original(sem_grade, dt, profs, indice_demanda)
+        t_original = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        obtido = calcular_demanda_nao_preenchida(pd.DataFrame(sem_grade, columns=COLS_PADRAO["Horario"]),
+                                                 dt, profs, indice_demanda)
+        t_novo = time.perf_counter() - inicio
+        igual = obtido == esperado
+        divergencias += not igual
+        print(f"{nome:<11} pelo professor: {sum(esperado.values()):>6} aulas faltando | "
+              f"original {t_original * 1000:6.0f}ms, merge/groupby {t_novo * 1000:4.0f}ms "
+              f"({t_original / t_novo:.0f}x) | {'IGUAL' if igual else 'DIVERGE'}")
+
+        exato = demanda_exata(h, dt)
+        inicio = time.perf_counter()
+        obtido = calcular_demanda_nao_preenchida(pd.DataFrame(h, columns=COLS_PADRAO["Horario"]),
+                                                 dt, profs, indice_demanda)
+        t_grade = time.perf_counter() - inicio
+        igual = obtido == exato
+        divergencias += not igual
+        print(f"{nome:<11} pela grade:     {sum(exato.values()):>6} aulas faltando | "
+              f"merge/groupby {t_grade * 1000:4.0f}ms | {'EXATO' if igual else 'DIVERGE'}")
+
+    if divergencias:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
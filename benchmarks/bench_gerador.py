@@ -0,0 +1,188 @@
+"""
+Benchmark do gerador de horários em redes sintéticas.
+
+Monta uma rede fictícia (escolas por região de REGIOES, turmas por série de
+ORDEM_SERIES, professores por matéria de MATERIAS_ESPECIALISTAS e rotas como
+na aba Agrupamentos), sem Streamlit nem Google Sheets, e roda a alocação da
+rede com cada motor, sempre com a mesma semente. Para cada motor informa o
+tempo, as tentativas usadas, a taxa de preenchimento e as aulas sem
+professor, e confere que duas execuções com a mesma semente são idênticas.
+
+Confere também a fusão de carga do motor paralelo em uma rede com pouca
+carga (um professor por matéria e região, 6 aulas cada), em que blocos do
+meio perdem aulas e são refeitos: a carga final de cada professor tem de
+bater com as aulas do horário (o preenchimento do motor sequencial é
+mostrado para comparação).
+
+Uso:
+    python benchmarks/bench_gerador.py [--escolas 30] [--turmas 2] [--profs 4]
+                                       [--rota 3] [--semente 42] [--processos 4]
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from config import (  # noqa: E402
+    COLS_PADRAO, DIAS_SEMANA, MATERIAS_ESPECIALISTAS, ORDEM_SERIES, REGIOES, TURNOS
+)
+from inteligencia import construir_indice_demanda  # noqa: E402
+from alocador import (  # noqa: E402
+    carregar_objs, carregar_rotas, montar_particoes_rede,
+    resolver_grade_inteligente, resolver_rede_paralela
+)
+from regras_alocacao import REGRA_CARGA_HORARIA  # noqa: E402
+from alocador_exato import resolver_grade_exata, solver_exato_disponivel  # noqa: E402
+
+
+def gerar_rede(n_escolas: int, turmas_por_serie: int, profs_por_materia: int,
+               escolas_por_rota: int, semente: int = 42):
+    """
+    Gera as abas de uma rede sintética.
+
+    Returns:
+        (dt, dc, dp, dd, da) — Turmas, Currículo, Professores, ConfigDias e Agrupamentos
+    """
+    rnd = random.Random(semente)
+    series = ORDEM_SERIES[-5:]  # Anos iniciais: onde estão as aulas de especialistas
+    turnos = [t for t in TURNOS if t != "AMBOS"]
+
+    escolas = [(f"EMEF SINTÉTICA {e:03d}", REGIOES[e % len(REGIOES)]) for e in range(n_escolas)]
+    dt = pd.DataFrame([
+        [esc, "FUNDAMENTAL", f"{serie} {chr(65 + k)}", turnos[k % len(turnos)], serie, reg]
+        for esc, reg in escolas for serie in series for k in range(turmas_por_serie)
+    ], columns=COLS_PADRAO["Turmas"])
+
+    # Uma aula por especialidade e série (5 especialidades = 5 slots)
+    dc = pd.DataFrame([[serie, mat, 1] for serie in series for mat in MATERIAS_ESPECIALISTAS],
+                      columns=COLS_PADRAO["Curriculo"])
+
+    linhas = []
+    for reg in REGIOES:
+        escolas_reg = [esc for esc, r in escolas if r == reg]
+        for mat in MATERIAS_ESPECIALISTAS:
+            for k in range(profs_por_materia):
+                linhas.append([
+                    f"P{len(linhas) + 1}", f"PROF {mat} {reg} {k}", mat, rnd.choice([20, 25, 30]),
+                    reg, rnd.choice(["EFETIVO", "DT"]), rnd.choice(["", "", "AMBOS"] + turnos),
+                    rnd.choice(escolas_reg) if escolas_reg else "", 0
+                ])
+    dp = pd.DataFrame(linhas, columns=COLS_PADRAO["Professores"])
+
+    dd = pd.DataFrame([[serie, DIAS_SEMANA[i % len(DIAS_SEMANA)]] for i, serie in enumerate(series)],
+                      columns=COLS_PADRAO["ConfigDias"])
+
+    nomes = [esc for esc, _ in escolas]
+    da = pd.DataFrame([
+        [f"ROTA {i // escolas_por_rota + 1}", ",".join(nomes[i:i + escolas_por_rota])]
+        for i in range(0, len(nomes), max(1, escolas_por_rota))
+    ], columns=COLS_PADRAO["Agrupamentos"])
+    return dt, dc, dp, dd, da
+
+
+def alocar(rede, resolver, semente: int, processos: int):
+    """Roda a alocação da rede (FASE 1) e devolve (linhas, estatísticas, segundos)."""
+    dt, dc, dp, dd, da = rede
+    indice_demanda = construir_indice_demanda(dt, dc, dd)
+    profs = carregar_objs(dp)
+    rotas = carregar_rotas(da)
+    merged = pd.merge(dt, dd, on="SÉRIE/ANO", how="left").fillna({'DIA_PLANEJAMENTO': 'NÃO CONFIGURADO'})
+
+    estatisticas = {}
+    inicio = time.perf_counter()
+    linhas = resolver_rede_paralela(
+        montar_particoes_rede(merged), dc, profs, rotas, dict(zip(dt['ESCOLA'], dt['REGIÃO'])),
+        resolver=resolver, indice_demanda=indice_demanda,
+        processos=processos, semente=semente, estatisticas=estatisticas
+    )
+    return linhas, estatisticas, time.perf_counter() - inicio
+
+
+def conferir_fusao_carga(semente: int, processos: int) -> bool:
+    """
+    Rede em que a carga acaba no meio dos blocos: o motor paralelo precisa
+    refazer blocos que não são o último. Confere que a carga de cada
+    professor é a do horário, sem passar do limite.
+    """
+    dt, dc, dp, dd, da = gerar_rede(12, 2, 1, 3, semente)
+    dp = dp.assign(**{'CARGA_HORÁRIA': 6})
+    indice_demanda = construir_indice_demanda(dt, dc, dd)
+    merged = pd.merge(dt, dd, on="SÉRIE/ANO", how="left").fillna({'DIA_PLANEJAMENTO': 'NÃO CONFIGURADO'})
+    particoes = montar_particoes_rede(merged)
+    resolver = functools.partial(resolver_grade_inteligente, tempo_busca_local=0)
+
+    preenchidas, refeitos, carga_ok = [], [], True
+    for n in (1, processos):
+        profs = carregar_objs(dp)
+        mensagens = []
+        linhas = resolver_rede_paralela(
+            particoes, dc, profs, carregar_rotas(da), dict(zip(dt['ESCOLA'], dt['REGIÃO'])),
+            resolver=resolver, indice_demanda=indice_demanda, processos=n, semente=semente,
+            ao_resolver=lambda dia, turno, turmas, sucesso, grade, mensagem: mensagens.append(mensagem)
+        )
+        aulas = {}
+        for linha in linhas:
+            for pid in linha[6:]:
+                if pid != "---":
+                    aulas[pid] = aulas.get(pid, 0) + 1
+        carga_ok &= all(p['atrib'] == aulas.get(p['id'], 0) <= min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"])
+                        for p in profs)
+        preenchidas.append(sum(aulas.values()))
+        refeitos = [i for i, m in enumerate(mensagens) if "refeito" in m]
+
+    do_meio = any(i < len(particoes) - 1 for i in refeitos)
+    ok = carga_ok and do_meio
+    print(f"Fusão de carga ({processos} proc.): {len(refeitos)} bloco(s) refeito(s) "
+          f"({'inclui blocos do meio' if do_meio else 'nenhum do meio'}), "
+          f"{preenchidas[1]} aulas (sequencial {preenchidas[0]}), carga {'OK' if carga_ok else 'DIVERGE'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escolas", type=int, default=30)
+    parser.add_argument("--turmas", type=int, default=2, help="Turmas por série em cada escola")
+    parser.add_argument("--profs", type=int, default=4, help="Professores por matéria em cada região")
+    parser.add_argument("--rota", type=int, default=3, help="Escolas por rota (Agrupamentos)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--processos", type=int, default=4, help="Processos do motor paralelo")
+    args = parser.parse_args()
+
+    rede = gerar_rede(args.escolas, args.turmas, args.profs, args.rota, args.semente)
+    dt, _, dp, _, _ = rede
+    print(f"Rede sintética: {args.escolas} escolas, {len(dt)} turmas, {len(dp)} professores")
+
+    motores = [("Heurístico s/ busca", functools.partial(resolver_grade_inteligente, tempo_busca_local=0), 1),
+               ("Heurístico", resolver_grade_inteligente, 1),
+               (f"Heurístico ({args.processos} proc.)", resolver_grade_inteligente, args.processos)]
+    if solver_exato_disponivel():
+        motores.append(("Exato (CP-SAT)", resolver_grade_exata, 1))
+    else:
+        print("(ortools não instalado: motor exato ignorado)")
+
+    print(f"{'Motor':<24} {'Tempo':>9} {'Tentativas':>11} {'Preench.':>9} {'Sem prof.':>10} {'Reprod.':>8}")
+    todos_reproduziveis = True
+    for nome, resolver, processos in motores:
+        linhas, est, segundos = alocar(rede, resolver, args.semente, processos)
+        repetidas, _, _ = alocar(rede, resolver, args.semente, processos)
+        reproduzivel = linhas == repetidas
+        todos_reproduziveis &= reproduzivel
+        aulas = est.get('aulas', 0)
+        taxa = (aulas - est.get('faltas', 0)) / aulas if aulas else 1.0
+        print(f"{nome:<24} {segundos * 1000:7.0f}ms {est.get('tentativas', 0):>11} "
+              f"{taxa:>8.1%} {est.get('faltas', 0):>10} {'SIM' if reproduzivel else 'NÃO':>8}")
+
+    fusao_ok = conferir_fusao_carga(args.semente, max(2, args.processos))
+    if not todos_reproduziveis or not fusao_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Prova e benchmark da geração incremental (impressões digitais dos blocos).
+
+Gera a grade de uma rede sintética (bench_gerador), grava as impressões
+como a aba 7 faz ao salvar e simula a recarga: os professores passam pela
+cópia do recálculo de carregar_banco (CARGA_HORÁRIA, QTD_PL e
+ESCOLAS_ALOCADAS a partir do Horario). Sem nenhuma edição, nenhum bloco
+pode aparecer como alterado, e a geração incremental tem de manter todas
+as linhas. Depois, uma série do currículo é alterada e só os blocos dela
+podem ser refeitos.
+
+Sai com código 1 se algum resultado divergir.
+
+Uso:
+    python benchmarks/bench_incremental.py [--escolas 30] [--semente 42]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from inteligencia import construir_indice_demanda  # noqa: E402
+from gerador import chave_bloco, gerar_grade_rede, impressoes_blocos  # noqa: E402
+from bench_gerador import gerar_rede  # noqa: E402
+
+
+# ==========================================
+# RECÁLCULO DE carregar_banco (CÓPIA DA APLICAÇÃO)
+# ==========================================
+def recalcular_professores(p, h):
+    p = p.copy()
+    carga_dict, escolas_dict = {}, {}
+    for _, row in h.iterrows():
+        for slot in ["1ª", "2ª", "3ª", "4ª", "5ª"]:
+            prof = row[slot]
+            if prof and prof != "---" and not str(prof).startswith("PL-"):
+                carga_dict[prof] = carga_dict.get(prof, 0) + 1
+                escolas_dict.setdefault(prof, set()).add(row['ESCOLA'])
+    for idx, row in p.iterrows():
+        cod = row['CÓDIGO']
+        p.at[idx, 'CARGA_HORÁRIA'] = carga_dict.get(cod, 0)
+        p.at[idx, 'QTD_PL'] = 0
+        escs = escolas_dict.get(cod, set())
+        if escs:
+            p.at[idx, 'ESCOLAS_ALOCADAS'] = ",".join(sorted(escs))
+    return p
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escolas", type=int, default=30)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    dt, dc, dp, dd, da = gerar_rede(args.escolas, 2, 3, 3, args.semente)
+    indice_demanda = construir_indice_demanda(dt, dc, dd)
+    silencio = lambda mensagem: None  # noqa: E731
+
+    inicio = time.perf_counter()
+    resultado = gerar_grade_rede(dt, dc, dp, dd, da, indice_demanda, processos=1,
+                                 relatar=silencio, semente=args.semente)
+    t_completa = time.perf_counter() - inicio
+
+    # Salvar (aba 7) e recarregar (carregar_banco)
+    salvas = impressoes_blocos(dt, dc, resultado['professores'], dd, indice_demanda)
+    dp_recarregado = recalcular_professores(resultado['professores'], resultado['horario'])
+    recarregadas = impressoes_blocos(dt, dc, dp_recarregado, dd, indice_demanda)
+    alterados = sum(1 for k, h in recarregadas.items() if salvas.get(k) != h)
+    print(f"Após salvar e recarregar: {alterados} de {len(recarregadas)} blocos alterados")
+
+    inicio = time.perf_counter()
+    incremental = gerar_grade_rede(dt, dc, dp_recarregado, dd, da, indice_demanda, processos=1,
+                                   relatar=silencio, semente=args.semente,
+                                   horario_atual=resultado['horario'], impressoes_anteriores=salvas)
+    t_incremental = time.perf_counter() - inicio
+    mantidas = incremental['horario'].equals(resultado['horario'])
+    print(f"Geração completa {t_completa * 1000:.0f}ms, incremental sem mudanças "
+          f"{t_incremental * 1000:.0f}ms ({incremental['blocos_refeitos']} blocos refeitos, "
+          f"horário {'mantido' if mantidas else 'ALTERADO'})")
+
+    # Uma série com outro currículo: só os blocos das turmas dela mudam
+    serie = dt['SÉRIE/ANO'].iloc[0]
+    dc_alterado = dc[~((dc['SÉRIE/ANO'] == serie) & (dc.index == dc[dc['SÉRIE/ANO'] == serie].index[0]))]
+    depois = impressoes_blocos(dt, dc_alterado, dp_recarregado, dd, construir_indice_demanda(dt, dc_alterado, dd))
+    mudaram = {k for k, h in depois.items() if salvas.get(k) != h}
+    merged = dt.merge(dd, on="SÉRIE/ANO", how="left")
+    da_serie = {chave_bloco(r['ESCOLA'], r['DIA_PLANEJAMENTO'], r['TURNO'])
+                for r in merged[merged['SÉRIE/ANO'] == serie].to_dict('records')}
+    print(f"Currículo de '{serie}' alterado: {len(mudaram)} blocos alterados "
+          f"({len(da_serie)} blocos com turmas da série)")
+
+    if alterados or not mantidas or incremental['blocos_refeitos'] or mudaram != da_serie:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark da padronização de texto na leitura da aba Horario.
+
+Compara a padronização célula a célula com a cópia da implementação original
+de padronizar (sem cache) com a atual (memorizada por texto, usada por
+montar_dataframe_aba via map), em uma aba Horario sintética do tamanho da
+rede, e confere que o resultado é idêntico. A padronização atual é medida
+com os caches vazios (primeira leitura) e cheios (leituras seguintes).
+
+Uso:
+    python benchmarks/bench_leitura_horario.py [--escolas 60] [--turmas 12] [--repeticoes 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from config import COLS_PADRAO, DIAS_SEMANA, MATERIAS_ESPECIALISTAS, TURNOS  # noqa: E402
+from database import COLUNAS_NUMERICAS, montar_dataframe_aba  # noqa: E402
+from utils import padronizar, limpar_caches_normalizacao  # noqa: E402
+
+
+# ==========================================
+# IMPLEMENTAÇÃO ORIGINAL (SEM CACHE)
+# ==========================================
+def padronizar_original(texto) -> str:
+    if pd.isna(texto):
+        return ""
+    nfkd = unicodedata.normalize('NFKD', str(texto).upper().strip())
+    txt = "".join([c for c in nfkd if not unicodedata.combining(c)])
+    if txt == "NAN":
+        return ""
+    return " ".join(txt.split())
+
+
+def gerar_horario_bruto(n_escolas: int, turmas_por_escola: int, semente: int = 42):
+    """Gera as linhas cruas de uma aba Horario (cabeçalho + linhas), como vêm da API."""
+    rnd = random.Random(semente)
+    professores = [f"P{i}DFARTE" for i in range(n_escolas * 5)] + ["---"]
+    linhas = [COLS_PADRAO["Horario"]]
+    for e in range(n_escolas):
+        escola = f"Escola Municipal Nº {e} - São José"
+        for t in range(turmas_por_escola):
+            turno = TURNOS[t % 2].lower()
+            for dia in DIAS_SEMANA:
+                slots = [rnd.choice(professores) for _ in range(5)]
+                componente = rnd.choice(MATERIAS_ESPECIALISTAS)
+                linhas.append([escola, componente, slots[0], f"{t + 1}º Ano {chr(65 + t % 3)}",
+                               turno, dia.title()] + slots)
+    return linhas
+
+
+def padronizar_colunas(df: pd.DataFrame, funcao) -> pd.DataFrame:
+    """Padroniza célula a célula as colunas de texto, como montar_dataframe_aba."""
+    df = df.copy()
+    for c in df.columns:
+        if c not in COLUNAS_NUMERICAS:
+            df[c] = df[c].astype(str).map(funcao)
+    return df
+
+
+def cronometrar(funcao, repeticoes: int, limpar_caches: bool = True) -> float:
+    """Melhor tempo (segundos) entre as repetições, com os caches de texto vazios ou já cheios."""
+    melhor = float("inf")
+    funcao()
+    for _ in range(repeticoes):
+        if limpar_caches:
+            limpar_caches_normalizacao()
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escolas", type=int, default=60)
+    parser.add_argument("--turmas", type=int, default=12)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    linhas = gerar_horario_bruto(args.escolas, args.turmas)
+    bruto = pd.DataFrame(linhas[1:], columns=linhas[0])
+    print(f"Horario sintético: {len(bruto)} linhas x {len(bruto.columns)} colunas")
+
+    antigo = padronizar_colunas(bruto, padronizar_original)
+    novo = padronizar_colunas(bruto, padronizar)
+    identico = antigo.equals(novo) and all(
+        (antigo[c].to_numpy() == novo[c].to_numpy()).all() for c in antigo.columns
+    )
+    print(f"Resultado idêntico: {'SIM' if identico else 'NÃO'}")
+
+    t_antigo = cronometrar(lambda: padronizar_colunas(bruto, padronizar_original), args.repeticoes)
+    t_frio = cronometrar(lambda: padronizar_colunas(bruto, padronizar), args.repeticoes)
+    t_quente = cronometrar(lambda: padronizar_colunas(bruto, padronizar), args.repeticoes, limpar_caches=False)
+    t_aba = cronometrar(lambda: montar_dataframe_aba(linhas, COLS_PADRAO["Horario"]), args.repeticoes)
+
+    print(f"Original (sem cache):    {t_antigo * 1000:8.1f} ms")
+    print(f"Com cache, vazio:        {t_frio * 1000:8.1f} ms  ({t_antigo / t_frio:.1f}x)")
+    print(f"Com cache, cheio:        {t_quente * 1000:8.1f} ms  ({t_antigo / t_quente:.1f}x)")
+    print(f"montar_dataframe_aba:    {t_aba * 1000:8.1f} ms")
+
+    if not identico:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Micro-benchmark da camada de normalização de texto (utils).
+
+Compara as versões sem cache (cópia da implementação original) com as
+funções memorizadas por LRU e com o conjunto pré-calculado
+MATERIAS_ESPECIALISTAS_INTERNAS, conferindo que os resultados são iguais.
+
+Uso:
+    python benchmarks/bench_normalizacao.py [--chamadas 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd  # noqa: E402
+
+from config import MATERIAS_ESPECIALISTAS  # noqa: E402
+from utils import (  # noqa: E402
+    padronizar, padronizar_materia_interna, limpar_caches_normalizacao,
+    MATERIAS_ESPECIALISTAS_INTERNAS
+)
+
+
+# --- Implementação original, sem cache (referência) ---
+def remover_acentos_sem_cache(texto):
+    if not isinstance(texto, str):
+        return str(texto)
+    nfkd = unicodedata.normalize('NFKD', texto)
+    return "".join([c for c in nfkd if not unicodedata.combining(c)])
+
+
+def padronizar_sem_cache(texto):
+    if pd.isna(texto):
+        return ""
+    txt = remover_acentos_sem_cache(str(texto).upper().strip())
+    if txt == "NAN":
+        return ""
+    return " ".join(txt.split())
+
+
+def limpar_materia_sem_cache(nome):
+    nome_padrao = padronizar_sem_cache(nome)
+    if "ART" in nome_padrao:
+        return "ARTE"
+    if "FISICA" in nome_padrao:
+        return "EDUCAÇÃO FÍSICA"
+    if "INGLE" in nome_padrao:
+        return "LÍNGUA INGLESA"
+    if "RELIGIO" in nome_padrao:
+        return "ENSINO RELIGIOSO"
+    if "HIST" in nome_padrao and "CONTA" in nome_padrao:
+        return "CONTAÇÃO DE HISTÓRIA"
+    return nome
+
+
+def padronizar_materia_interna_sem_cache(nome):
+    return remover_acentos_sem_cache(limpar_materia_sem_cache(nome)).upper()
+
+
+def gerar_corpus(chamadas: int, semente: int = 7):
+    """Textos típicos do sistema (escolas, dias, matérias, códigos), muito repetidos."""
+    rnd = random.Random(semente)
+    base = (
+        [f"Escola Municipal Nº {i} - São José" for i in range(60)]
+        + ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira"]
+        + MATERIAS_ESPECIALISTAS + ["artes", "Ed. Física", "inglês", "---"]
+        + [f"P{i}DFARTE" for i in range(300)]
+    )
+    return [rnd.choice(base) for _ in range(chamadas)]
+
+
+def cronometrar(funcao) -> float:
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chamadas", type=int, default=200000)
+    args = parser.parse_args()
+
+    corpus = gerar_corpus(args.chamadas)
+    limpar_caches_normalizacao()
+
+    # Conferência de equivalência
+    iguais = all(
+        padronizar(t) == padronizar_sem_cache(t)
+        and padronizar_materia_interna(t) == padronizar_materia_interna_sem_cache(t)
+        for t in set(corpus)
+    )
+    lista_original = [padronizar_materia_interna_sem_cache(m) for m in MATERIAS_ESPECIALISTAS]
+    iguais = iguais and set(lista_original) == MATERIAS_ESPECIALISTAS_INTERNAS
+    print(f"{len(corpus)} chamadas, {len(set(corpus))} textos distintos")
+    print(f"Resultados idênticos: {'SIM' if iguais else 'NÃO'}")
+
+    casos = [
+        ("padronizar",
+         lambda: [padronizar_sem_cache(t) for t in corpus],
+         lambda: [padronizar(t) for t in corpus]),
+        ("padronizar_materia_interna",
+         lambda: [padronizar_materia_interna_sem_cache(t) for t in corpus],
+         lambda: [padronizar_materia_interna(t) for t in corpus]),
+        ("é matéria de especialista?",
+         lambda: [t in [padronizar_materia_interna_sem_cache(m) for m in MATERIAS_ESPECIALISTAS] for t in corpus],
+         lambda: [t in MATERIAS_ESPECIALISTAS_INTERNAS for t in corpus]),
+    ]
+    for nome, antes, depois in casos:
+        t_antes = cronometrar(antes)
+        t_depois = cronometrar(depois)
+        print(f"{nome:30s} sem cache {t_antes * 1000:8.1f} ms | com cache {t_depois * 1000:8.1f} ms"
+              f" ({t_antes / t_depois:.1f}x)")
+
+    if not iguais:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
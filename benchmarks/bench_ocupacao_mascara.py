@@ -0,0 +1,177 @@
+"""
+Prova e micro-benchmark da ocupação em bitmask (regras_alocacao / alocador).
+
+Compara, em TODOS os estados possíveis de um professor em um bloco (cada
+slot vazio ou em uma de três escolas, com e sem rotas), todo novo slot e
+toda escola:
+
+* verificar_janelas original (cópia da implementação antiga, sobre o
+  dicionário {slot: escola}) com verificar_janelas e verificar_janelas_mascara;
+* o filtro de candidatos antigo do resolver (conflito de horário, janela
+  na mesma escola e deslocamento sem rota) com o filtro por máscaras;
+* as máscaras mantidas por atribuir_aula/desfazer_atribuicoes com as
+  recalculadas por definir_ocupacao.
+
+Sai com código 1 se algum resultado divergir.
+
+Uso:
+    python benchmarks/bench_ocupacao_mascara.py [--repeticoes 3]
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import SLOTS_AULA  # noqa: E402
+from regras_alocacao import verificar_janelas, verificar_janelas_mascara  # noqa: E402
+from alocador import atribuir_aula, definir_ocupacao, desfazer_atribuicoes  # noqa: E402
+
+ESCOLAS = ["A", "B", "C"]
+ROTAS = [
+    {},
+    {"A": {"A", "B"}, "B": {"A", "B"}},
+    {"A": {"A", "B", "C"}, "B": {"A", "B", "C"}, "C": {"A", "B", "C"}},
+    {"D": {"D", "A"}},  # Rota declarada só do lado da escola nova
+]
+
+
+# ==========================================
+# IMPLEMENTAÇÃO ORIGINAL (SOBRE O DICIONÁRIO)
+# ==========================================
+def verificar_janelas_original(ocupacao_professor: dict, novo_slot: int, escola: str, rotas: dict):
+    if not ocupacao_professor:
+        return False, 0
+    aulas_mesma_escola = [s for s, e in ocupacao_professor.items() if e == escola]
+    if aulas_mesma_escola:
+        slots_escola = sorted(aulas_mesma_escola + [novo_slot])
+        for i in range(len(slots_escola) - 1):
+            gap = slots_escola[i+1] - slots_escola[i]
+            if gap > 1:
+                if novo_slot > slots_escola[i] and novo_slot < slots_escola[i+1]:
+                    return False, 1000
+                else:
+                    return True, 0
+        return False, 0
+    escolas_rota = rotas.get(escola, set())
+    aulas_na_rota = []
+    for s_ocup, e_ocup in ocupacao_professor.items():
+        if e_ocup == escola or e_ocup in escolas_rota or escola in rotas.get(e_ocup, set()):
+            aulas_na_rota.append(s_ocup)
+    if aulas_na_rota:
+        slots_rota = sorted(aulas_na_rota + [novo_slot])
+        for i in range(len(slots_rota) - 1):
+            gap = slots_rota[i+1] - slots_rota[i]
+            if gap > 1:
+                if novo_slot > slots_rota[i] and novo_slot < slots_rota[i+1]:
+                    return False, 1000
+                else:
+                    return True, 0
+        return False, 0
+    return False, 0
+
+
+def filtro_original(ocup: dict, slot: int, esc: str, rotas: dict):
+    """Regras 1 e 4 e deslocamento do resolver antigo: (aceito, bônus de aula na mesma escola)."""
+    if slot in ocup:
+        return False, 0
+    if ocup:
+        if any(e_occ == esc for e_occ in ocup.values()):
+            tem_janela, _ = verificar_janelas_original(ocup, slot, esc, rotas)
+            if tem_janela:
+                return False, 0
+    for s_occ, e_occ in ocup.items():
+        if e_occ != esc:
+            mesma_rota = esc in rotas.get(e_occ, set()) or e_occ in rotas.get(esc, set())
+            if not mesma_rota and abs(s_occ - slot) < 1:
+                return False, 0
+    return True, 500 if esc in ocup.values() else 0
+
+
+# ==========================================
+# IMPLEMENTAÇÃO POR MÁSCARAS (COMO NO RESOLVER)
+# ==========================================
+def filtro_mascara(prof: dict, slot: int, esc: str):
+    if prof['mascara'] & (1 << slot):
+        return False, 0
+    mascara_escola = prof['mascaras_escola'].get(esc, 0)
+    if mascara_escola:
+        tem_janela, _ = verificar_janelas_mascara(mascara_escola, 0, slot)
+        if tem_janela:
+            return False, 0
+    return True, 500 if mascara_escola else 0
+
+
+def estados():
+    """Todas as ocupações {slot: escola} de um bloco."""
+    for combinacao in itertools.product([None] + ESCOLAS, repeat=SLOTS_AULA):
+        yield {s: e for s, e in enumerate(combinacao) if e is not None}
+
+
+def novo_prof():
+    return {'ocup': {}, 'mascara': 0, 'mascaras_escola': {}, 'atrib': 0, 'escolas_reais': set()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições da medição de tempo")
+    args = parser.parse_args()
+
+    casos = [(ocup, slot, esc, rotas) for ocup in estados() for rotas in ROTAS
+             for slot in range(SLOTS_AULA) for esc in ESCOLAS + ["D"]]
+    divergencias = 0
+    profs = {}
+    for ocup, slot, esc, rotas in casos:
+        chave = tuple(sorted(ocup.items()))
+        if chave not in profs:
+            prof = novo_prof()
+            definir_ocupacao(prof, ocup)
+            profs[chave] = prof
+        prof = profs[chave]
+        esperado = verificar_janelas_original(ocup, slot, esc, rotas)
+        if verificar_janelas(ocup, slot, esc, rotas) != esperado:
+            divergencias += 1
+            print(f"verificar_janelas diverge: {ocup} slot={slot} escola={esc} rotas={rotas}")
+        if filtro_mascara(prof, slot, esc) != filtro_original(ocup, slot, esc, rotas):
+            divergencias += 1
+            print(f"filtro diverge: {ocup} slot={slot} escola={esc} rotas={rotas}")
+
+    # Máscaras mantidas aula a aula (e desfeitas) = máscaras recalculadas
+    for ocup in estados():
+        prof, registro = novo_prof(), []
+        for slot, esc in ocup.items():
+            atribuir_aula(prof, slot, esc, registro)
+        recalculado = novo_prof()
+        definir_ocupacao(recalculado, ocup)
+        desfeito = prof['ocup'] == ocup and \
+            (prof['mascara'], prof['mascaras_escola']) == (recalculado['mascara'], recalculado['mascaras_escola'])
+        desfazer_atribuicoes(registro)
+        if not desfeito or (prof['mascara'], prof['mascaras_escola'], prof['ocup']) != (0, {}, {}):
+            divergencias += 1
+            print(f"máscaras incrementais divergem: {ocup}")
+
+    print(f"{len(casos)} casos comparados, {divergencias} divergências")
+
+    def medir(funcao):
+        melhor = float("inf")
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            melhor = min(melhor, time.perf_counter() - inicio)
+        return melhor
+
+    pares = [(ocup, profs[tuple(sorted(ocup.items()))], slot, esc, rotas) for ocup, slot, esc, rotas in casos]
+    t_original = medir(lambda: [filtro_original(o, s, e, r) for o, _, s, e, r in pares])
+    t_mascara = medir(lambda: [filtro_mascara(p, s, e) for _, p, s, e, _ in pares])
+    print(f"Filtro do resolver: original {t_original * 1e9 / len(pares):.0f} ns/caso, "
+          f"máscaras {t_mascara * 1e9 / len(pares):.0f} ns/caso ({t_original / t_mascara:.1f}x)")
+
+    if divergencias:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 Configurações e constantes do sistema de gestão escolar.
 """
 
+import os
+
 # Regiões disponíveis
 REGIOES = ["FUNDÃO", "PRAIA GRANDE", "TIMBUÍ"]
 
@@ -55,6 +57,9 @@ COLS_PADRAO = {
     
     "Horario": ["ESCOLA", "COMPONENTE", "PROFESSOR", "TURMA", "TURNO", "DIA", "1ª", "2ª", "3ª", "4ª", "5ª"],
     
+    # Células do Horario travadas no editor manual (respeitadas pelo gerador)
+    "Travas": ["ESCOLA", "TURMA", "DIA", "SLOT"],
+    
     "CH": ["AULA", "PL", "CH", "AULAS", "HORA_ALUNO", "HORA_PL", "TOTAL_HORAS", "MINUTOS_TOTAL"]
 }
 # Configurações de carga horária padrão
@@ -64,10 +69,31 @@ MEDIA_ALVO_PADRAO = 20
 
 # Limites do algoritmo de geração
 MAX_TENTATIVAS_ALOCACAO = 50
+TENTATIVAS_ANTES_BUSCA_LOCAL = 5  # Reinícios gulosos por bloco quando a busca local está ativa
+TEMPO_BUSCA_LOCAL = 2  # Segundos de busca local por bloco (dia × turno); 0 = desativada
+ITERACOES_BUSCA_LOCAL = 5000  # Movimentos por bloco (com semente, é o único limite)
+TEMPO_LIMITE_SOLVER_EXATO = 10  # Segundos por bloco (dia × turno) no modo exato
+PROCESSOS_GERACAO = os.cpu_count() or 1  # Processos na geração em paralelo (blocos dia × turno)
+# Impressões digitais das entradas da última grade salva (geração incremental)
+ARQUIVO_IMPRESSOES_GERACAO = os.path.join(".cache_planilha", "ultima_geracao.json")
 LIMITE_NOVOS_PROFESSORES = 50
 
 # Configurações de cache
 CACHE_TTL_SEGUNDOS = 300  # Aumentado para 5 minutos para reduzir requisições
 
+# Armazenamento dos dados: "gsheets" (Google Sheets) ou "sqlite" (banco local)
+BACKEND_ARMAZENAMENTO = os.environ.get("BACKEND_ARMAZENAMENTO", "gsheets")
+ARQUIVO_BANCO_LOCAL = os.environ.get("ARQUIVO_BANCO_LOCAL", "dados_locais.sqlite3")
+
+# Cota da API do Google Sheets (requisições por minuto por usuário)
+QUOTA_LEITURAS_POR_MINUTO = 60
+QUOTA_ESCRITAS_POR_MINUTO = 60
+
+# Cache local em disco das abas (sobrevive a reinícios; validado pela versão da planilha)
+CACHE_LOCAL_ARQUIVO = os.path.join(".cache_planilha", "abas.sqlite3")
+
+# Máximo de textos distintos memorizados por função de normalização (utils)
+TAMANHO_CACHE_NORMALIZACAO = 65536
+
 # Slots de aula por dia
 SLOTS_AULA = 5
@@ -0,0 +1,643 @@
+"""
+Camada de acesso aos dados da planilha (Google Sheets).
+
+Funções puras de conversão entre os valores crus das abas e os DataFrames
+usados pelo sistema, leitura em lote de várias abas, cache local em disco
+(SQLite) validado pela versão da planilha no Google Drive e os mecanismos de
+armazenamento intercambiáveis (Google Sheets ou banco SQLite local).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from limitador_taxa import LimitadorTaxa, eh_erro_de_cota
+from utils import padronizar
+
+
+# Endpoint de metadados de arquivos do Google Drive (versão / modifiedTime)
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Colunas convertidas para inteiro na leitura
+COLUNAS_NUMERICAS = [
+    "QTD_AULAS", "CARGA_HORÁRIA", "QTD_PL",
+    "HORA_ALUNO", "HORA_PL", "TOTAL_HORAS", "MINUTOS_TOTAL"
+]
+
+
+def montar_dataframe_aba(dados_brutos: List[List[str]], colunas_esperadas: List[str]) -> pd.DataFrame:
+    """
+    Converte os valores crus de uma aba (lista de linhas) em um DataFrame padronizado.
+
+    Args:
+        dados_brutos: Linhas da aba, sendo a primeira o cabeçalho
+        colunas_esperadas: Colunas que o DataFrame final deve ter (na ordem)
+
+    Returns:
+        DataFrame apenas com as colunas esperadas, textos padronizados e
+        colunas numéricas convertidas para inteiro
+    """
+    if not dados_brutos:
+        return pd.DataFrame(columns=colunas_esperadas)
+
+    # A API omite células vazias no fim das linhas: completa para a largura máxima
+    largura = max(len(linha) for linha in dados_brutos)
+    linhas = [list(linha) + [""] * (largura - len(linha)) for linha in dados_brutos]
+
+    # A primeira linha é o cabeçalho
+    headers = linhas[0]
+    df = pd.DataFrame(linhas[1:], columns=headers)
+
+    # Padronizar nomes das colunas para maiúsculas/sem acento
+    df.columns = [padronizar(c) for c in df.columns]
+
+    # Garantir que temos todas as colunas esperadas
+    for col in colunas_esperadas:
+        col_norm = padronizar(col)
+        if col_norm not in df.columns:
+            df[col_norm] = ""
+
+    # Renomear para os nomes bonitos (originais)
+    rename_dict = {}
+    for col in colunas_esperadas:
+        col_norm = padronizar(col)
+        if col_norm in df.columns:
+            rename_dict[col_norm] = col
+
+    if rename_dict:
+        df = df.rename(columns=rename_dict)
+
+    # Manter apenas as colunas esperadas na ordem certa
+    df = df[colunas_esperadas].copy()
+
+    # Limpeza final
+    df = df.fillna("")
+    for c in df.columns:
+        if c in COLUNAS_NUMERICAS:
+            # Converte para número, força 0 se der erro
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype(int)
+        else:
+            df[c] = df[c].astype(str).map(padronizar)
+
+    return df
+
+
+def ler_valores_em_lote(spreadsheet, abas: List[str]) -> Dict[str, Optional[List[List[str]]]]:
+    """
+    Lê várias abas de uma planilha com uma única chamada values:batchGet.
+
+    Args:
+        spreadsheet: Planilha gspread já aberta
+        abas: Nomes das abas a ler
+
+    Returns:
+        Dicionário {aba: linhas}. Abas inexistentes na planilha recebem None.
+    """
+    existentes = {ws.title for ws in spreadsheet.worksheets()}
+    presentes = [a for a in abas if a in existentes]
+
+    resultado: Dict[str, Optional[List[List[str]]]] = {a: None for a in abas}
+    if not presentes:
+        return resultado
+
+    # Nome da aba entre aspas simples (aspas internas são duplicadas)
+    ranges = ["'" + a.replace("'", "''") + "'" for a in presentes]
+    resposta = spreadsheet.values_batch_get(ranges)
+
+    for aba, faixa in zip(presentes, resposta.get("valueRanges", [])):
+        resultado[aba] = faixa.get("values", [])
+
+    return resultado
+
+
+def valores_para_planilha(df: pd.DataFrame) -> List[List]:
+    """
+    Converte um DataFrame nas linhas que são gravadas na aba (cabeçalho + valores).
+
+    Args:
+        df: DataFrame a gravar
+
+    Returns:
+        Lista de linhas, sendo a primeira o cabeçalho
+    """
+    if df.empty:
+        return [df.columns.tolist()]
+    return [df.columns.tolist()] + df.fillna("").values.tolist()
+
+
+def _coluna_a1(numero: int) -> str:
+    """Converte um número de coluna (1 = A) na letra usada na notação A1."""
+    letras = ""
+    while numero > 0:
+        numero, resto = divmod(numero - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _sem_vazios_finais(linha: List) -> List[str]:
+    """Remove as células vazias do fim de uma linha (a API não as devolve)."""
+    valores = [str(v) for v in linha]
+    while valores and valores[-1] == "":
+        valores.pop()
+    return valores
+
+
+def calcular_faixas_alteradas(antigo: List[List[str]], novo: List[List]) -> Optional[List[Dict]]:
+    """
+    Compara o último conteúdo conhecido de uma aba com o conteúdo a gravar.
+
+    Linhas consecutivas com alterações viram um único bloco retangular, do
+    menor ao maior índice de coluna alterado. Linhas que deixaram de existir
+    são apagadas com células vazias.
+
+    Args:
+        antigo: Linhas lidas (ou gravadas) por último, com cabeçalho
+        novo: Linhas a gravar, com cabeçalho
+
+    Returns:
+        Lista de {'range': 'A2:C4', 'values': [...]} para uma atualização em lote
+        (vazia se nada mudou), ou None se o esquema mudou e a aba precisa ser
+        reescrita inteira.
+    """
+    if not antigo or not novo:
+        return None
+
+    cabecalho = _sem_vazios_finais(novo[0])
+    if _sem_vazios_finais(antigo[0]) != cabecalho:
+        return None
+
+    largura = len(novo[0])
+    if any(len(_sem_vazios_finais(linha)) > largura for linha in antigo):
+        return None
+
+    vazia = [""] * largura
+    faixas = []
+    bloco = []  # [(indice_linha, colunas_alteradas, valores)]
+
+    def fechar_bloco():
+        if not bloco:
+            return
+        c0 = min(min(cols) for _, cols, _ in bloco)
+        c1 = max(max(cols) for _, cols, _ in bloco)
+        l0, l1 = bloco[0][0], bloco[-1][0]
+        faixas.append({
+            "range": f"{_coluna_a1(c0 + 1)}{l0 + 1}:{_coluna_a1(c1 + 1)}{l1 + 1}",
+            "values": [valores[c0:c1 + 1] for _, _, valores in bloco],
+        })
+        bloco.clear()
+
+    for i in range(1, max(len(antigo), len(novo))):
+        linha_antiga = list(antigo[i]) if i < len(antigo) else []
+        linha_antiga = [str(v) for v in linha_antiga] + [""] * (largura - len(linha_antiga))
+        linha_nova = list(novo[i]) if i < len(novo) else vazia
+
+        alteradas = [j for j in range(largura) if str(linha_nova[j]) != linha_antiga[j]]
+        if alteradas:
+            bloco.append((i, alteradas, linha_nova))
+        else:
+            fechar_bloco()
+    fechar_bloco()
+
+    return faixas
+
+
+def contar_celulas(faixas: List[Dict]) -> int:
+    """Total de células enviadas em uma lista de faixas de atualização."""
+    return sum(len(f["values"]) * (len(f["values"][0]) if f["values"] else 0) for f in faixas)
+
+
+def impressao_digital(valores: List[List]) -> str:
+    """
+    Gera um hash do conteúdo de uma aba, insensível às células e linhas vazias
+    do final (que a API omite na leitura).
+
+    Args:
+        valores: Linhas da aba, com cabeçalho
+
+    Returns:
+        Hash SHA-1 em hexadecimal
+    """
+    linhas = [_sem_vazios_finais(linha) for linha in valores]
+    while linhas and not linhas[-1]:
+        linhas.pop()
+    return hashlib.sha1(json.dumps(linhas, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def obter_versao_planilha(client, planilha_id: str) -> Optional[str]:
+    """
+    Consulta a versão atual da planilha no Google Drive (chamada leve, só metadados).
+
+    Args:
+        client: Cliente gspread autorizado (com escopo do Drive)
+        planilha_id: ID da planilha
+
+    Returns:
+        Número de versão do arquivo (ou modifiedTime), ou None se não foi possível obter
+    """
+    try:
+        resposta = client.request(
+            "get", f"{DRIVE_FILES_URL}/{planilha_id}",
+            params={"fields": "version,modifiedTime", "supportsAllDrives": True}
+        )
+        meta = resposta.json()
+        return meta.get("version") or meta.get("modifiedTime")
+    except Exception:
+        return None
+
+
+class CacheLocal:
+    """
+    Cache em disco (SQLite) do conteúdo cru das abas, por planilha.
+
+    Cada planilha guarda a versão do Drive em que foi baixada; o cache só é
+    usado enquanto essa versão continuar sendo a atual. Abas inexistentes na
+    planilha são guardadas como None.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versoes ("
+                "planilha_id TEXT PRIMARY KEY, versao TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS abas ("
+                "planilha_id TEXT, aba TEXT, valores TEXT, impressao TEXT, "
+                "PRIMARY KEY (planilha_id, aba))"
+            )
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        # Uma conexão por operação: o Streamlit atende sessões em threads diferentes
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with conn:  # commit ao final (rollback em caso de erro)
+                yield conn
+        finally:
+            conn.close()
+
+    def versao(self, planilha_id: str) -> Optional[str]:
+        """Versão da planilha gravada no cache (None se não houver)."""
+        with self._conectar() as conn:
+            linha = conn.execute(
+                "SELECT versao FROM versoes WHERE planilha_id = ?", (planilha_id,)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def ler_abas(self, planilha_id: str, abas: List[str]) -> Dict[str, Optional[List[List[str]]]]:
+        """
+        Lê do disco as abas pedidas.
+
+        Returns:
+            Dicionário {aba: linhas} apenas com as abas presentes no cache
+        """
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT aba, valores FROM abas WHERE planilha_id = ?", (planilha_id,)
+            ).fetchall()
+        guardadas = {aba: json.loads(valores) for aba, valores in linhas}
+        return {aba: guardadas[aba] for aba in abas if aba in guardadas}
+
+    def gravar_abas(self, planilha_id: str, valores: Dict[str, Optional[List[List[str]]]],
+                    versao: Optional[str] = None) -> List[str]:
+        """
+        Grava no disco as abas cujo conteúdo mudou e, se informada, a nova versão.
+
+        Args:
+            planilha_id: ID da planilha
+            valores: {aba: linhas} (None para aba inexistente)
+            versao: Versão do Drive correspondente a esse conteúdo
+
+        Returns:
+            Lista das abas efetivamente regravadas
+        """
+        alteradas = []
+        with self._conectar() as conn:
+            atuais = dict(conn.execute(
+                "SELECT aba, impressao FROM abas WHERE planilha_id = ?", (planilha_id,)
+            ).fetchall())
+            for aba, linhas in valores.items():
+                impressao = impressao_digital(linhas) if linhas is not None else ""
+                if aba in atuais and atuais[aba] == impressao:
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO abas (planilha_id, aba, valores, impressao) "
+                    "VALUES (?, ?, ?, ?)",
+                    (planilha_id, aba, json.dumps(linhas, ensure_ascii=False), impressao)
+                )
+                alteradas.append(aba)
+            if versao is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO versoes (planilha_id, versao) VALUES (?, ?)",
+                    (planilha_id, versao)
+                )
+        return alteradas
+
+    def limpar(self, planilha_id: Optional[str] = None):
+        """Apaga o cache de uma planilha (ou de todas)."""
+        with self._conectar() as conn:
+            if planilha_id is None:
+                conn.execute("DELETE FROM abas")
+                conn.execute("DELETE FROM versoes")
+            else:
+                conn.execute("DELETE FROM abas WHERE planilha_id = ?", (planilha_id,))
+                conn.execute("DELETE FROM versoes WHERE planilha_id = ?", (planilha_id,))
+
+
+# ==========================================
+# MECANISMOS DE ARMAZENAMENTO
+# ==========================================
+
+class ArmazenamentoBase:
+    """
+    Interface comum dos mecanismos de armazenamento.
+
+    Trabalha com os valores crus das abas (lista de linhas, a primeira sendo o
+    cabeçalho); a conversão para DataFrame fica em montar_dataframe_aba.
+    """
+
+    # True quando o mecanismo depende de rede/cota (habilita novas tentativas)
+    remoto = False
+
+    def descricao(self) -> str:
+        """Texto curto que identifica o armazenamento na interface."""
+        raise NotImplementedError
+
+    def ler_valores(self, abas: List[str]) -> Dict[str, Optional[List[List[str]]]]:
+        """
+        Lê várias abas de uma vez.
+
+        Returns:
+            Dicionário {aba: linhas}. Abas inexistentes recebem None.
+        """
+        raise NotImplementedError
+
+    def registrar_erro(self, erro: Exception, tipo: str):
+        """Chamado quando uma operação falha; armazenamentos remotos ajustam a cota."""
+
+    def gravar_valores(self, aba: str, valores: List[List],
+                       faixas: Optional[List[Dict]] = None) -> int:
+        """
+        Grava uma aba (criando-a se não existir).
+
+        Args:
+            aba: Nome da aba
+            valores: Conteúdo completo da aba, com cabeçalho
+            faixas: Faixas alteradas (calcular_faixas_alteradas); None = reescrever tudo
+
+        Returns:
+            Número de células enviadas
+        """
+        raise NotImplementedError
+
+
+class ArmazenamentoGoogleSheets(ArmazenamentoBase):
+    """
+    Planilha do Google Sheets, com cache opcional em disco para as leituras.
+    Todas as chamadas à API passam pelo limitador de taxa, quando informado.
+    """
+
+    remoto = True
+
+    def __init__(self, client, planilha_id: str, cache: Optional[CacheLocal] = None,
+                 limitador: Optional[LimitadorTaxa] = None):
+        self.client = client
+        self.planilha_id = planilha_id
+        self.cache = cache
+        self.limitador = limitador
+        self._planilha = None
+
+    def _consumir(self, tipo: str, chamadas: int = 1):
+        if self.limitador is not None:
+            self.limitador.adquirir(tipo, chamadas)
+
+    def _abrir(self):
+        # A planilha aberta é reaproveitada (open_by_key custa uma leitura)
+        if self._planilha is None:
+            self._consumir("leitura")
+            self._planilha = self.client.open_by_key(self.planilha_id)
+        return self._planilha
+
+    def descricao(self) -> str:
+        try:
+            return f"Google Sheets ({self._abrir().title})"
+        except Exception:
+            return f"Google Sheets ({self.planilha_id})"
+
+    def ler_valores(self, abas: List[str]) -> Dict[str, Optional[List[List[str]]]]:
+        """
+        Antes de baixar, consulta a versão da planilha no Drive: se for a mesma
+        guardada no cache local, as abas são servidas do disco. Caso contrário,
+        baixa tudo em lote e regrava no disco só as abas cujo conteúdo mudou.
+        """
+        versao = None
+        if self.cache:
+            # Metadados do Drive: cota própria, mas contada como leitura por precaução
+            self._consumir("leitura")
+            versao = obter_versao_planilha(self.client, self.planilha_id)
+
+        if versao:
+            try:
+                if self.cache.versao(self.planilha_id) == versao:
+                    em_disco = self.cache.ler_abas(self.planilha_id, abas)
+                    if len(em_disco) == len(abas):
+                        return em_disco
+            except Exception:
+                pass  # Cache corrompido/inacessível: baixa da planilha
+
+        spreadsheet = self._abrir()
+        self._consumir("leitura", 2)  # Lista de abas + values:batchGet
+        valores = ler_valores_em_lote(spreadsheet, abas)
+        if versao:
+            try:
+                self.cache.gravar_abas(self.planilha_id, valores, versao)
+            except Exception:
+                pass  # Cache em disco é opcional: a leitura já foi feita
+        return valores
+
+    def gravar_valores(self, aba: str, valores: List[List],
+                       faixas: Optional[List[Dict]] = None) -> int:
+        import gspread  # Só necessário com este backend
+
+        spreadsheet = self._abrir()
+
+        # Verificar/Criar aba
+        try:
+            self._consumir("leitura")
+            worksheet = spreadsheet.worksheet(aba)
+        except gspread.exceptions.WorksheetNotFound:
+            cols = max(len(valores[0]), 1) if valores else 1
+            self._consumir("escrita")
+            worksheet = spreadsheet.add_worksheet(title=aba, rows=1000, cols=cols)
+            faixas = None
+
+        if faixas is None:
+            # Reescrita completa: limpar e gravar tudo a partir de A1
+            self._consumir("escrita", 2)
+            worksheet.clear()
+            worksheet.update(valores, 'A1')
+            return sum(len(linha) for linha in valores)
+
+        # Incremental: garantir que a grade comporta as linhas novas
+        if len(valores) > worksheet.row_count:
+            self._consumir("escrita")
+            worksheet.add_rows(len(valores) - worksheet.row_count)
+        self._consumir("escrita")
+        worksheet.batch_update(faixas, value_input_option="RAW")
+        return contar_celulas(faixas)
+
+    def registrar_erro(self, erro: Exception, tipo: str):
+        """Avisa o limitador quando a API respondeu 429 (cota excedida)."""
+        if self.limitador is not None and eh_erro_de_cota(erro):
+            self.limitador.esgotar(tipo)
+
+
+class ArmazenamentoSQLite(ArmazenamentoBase):
+    """
+    Banco SQLite local: leituras e gravações em milissegundos, sem rede nem cota.
+    Cada aba é uma linha da tabela 'abas' com o conteúdo cru em JSON.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS abas (aba TEXT PRIMARY KEY, valores TEXT)"
+            )
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def descricao(self) -> str:
+        return f"SQLite local ({os.path.basename(self.caminho)})"
+
+    def ler_valores(self, abas: List[str]) -> Dict[str, Optional[List[List[str]]]]:
+        with self._conectar() as conn:
+            guardadas = dict(conn.execute("SELECT aba, valores FROM abas").fetchall())
+        return {aba: json.loads(guardadas[aba]) if aba in guardadas else None for aba in abas}
+
+    def gravar_valores(self, aba: str, valores: List[List],
+                       faixas: Optional[List[Dict]] = None) -> int:
+        # Guarda sempre o conteúdo completo (como texto, igual à leitura da planilha)
+        linhas = [[str(v) for v in linha] for linha in valores]
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO abas (aba, valores) VALUES (?, ?)",
+                (aba, json.dumps(linhas, ensure_ascii=False))
+            )
+        if faixas is not None:
+            return contar_celulas(faixas)
+        return sum(len(linha) for linha in linhas)
+
+
+def criar_armazenamento(backend: str, client=None, planilha_id: Optional[str] = None,
+                        cache: Optional[CacheLocal] = None,
+                        caminho_sqlite: Optional[str] = None,
+                        limitador: Optional[LimitadorTaxa] = None) -> ArmazenamentoBase:
+    """
+    Cria o mecanismo de armazenamento escolhido na configuração.
+
+    Args:
+        backend: "gsheets" ou "sqlite"
+        client: Cliente gspread (backend gsheets)
+        planilha_id: ID da planilha (backend gsheets)
+        cache: Cache em disco das leituras (backend gsheets, opcional)
+        limitador: Limitador de taxa das chamadas à API (backend gsheets, opcional)
+        caminho_sqlite: Arquivo do banco (backend sqlite)
+
+    Returns:
+        Instância do armazenamento
+
+    Raises:
+        ValueError: Se o backend for desconhecido ou faltarem parâmetros
+    """
+    backend = (backend or "").strip().lower()
+    if backend == "gsheets":
+        if client is None or not planilha_id:
+            raise ValueError("Backend 'gsheets' requer cliente e ID da planilha")
+        return ArmazenamentoGoogleSheets(client, planilha_id, cache, limitador)
+    if backend == "sqlite":
+        if not caminho_sqlite:
+            raise ValueError("Backend 'sqlite' requer o caminho do arquivo")
+        return ArmazenamentoSQLite(caminho_sqlite)
+    raise ValueError(f"Backend de armazenamento desconhecido: '{backend}'")
+
+
+def copiar_abas(origem: ArmazenamentoBase, destino: ArmazenamentoBase, abas: List[str]) -> List[str]:
+    """
+    Copia abas entre armazenamentos (ex.: da planilha para o SQLite local).
+
+    Returns:
+        Lista das abas copiadas (as inexistentes na origem são ignoradas)
+    """
+    copiadas = []
+    for aba, valores in origem.ler_valores(abas).items():
+        if valores is not None:
+            destino.gravar_valores(aba, valores)
+            copiadas.append(aba)
+    return copiadas
+
+
+def gravar_aba(armazenamento: ArmazenamentoBase, registro: Dict[str, List[List[str]]],
+               aba: str, valores: List[List], incremental: bool = True,
+               tentativas: int = 5, espera_base: float = 2) -> int:
+    """
+    Grava uma aba enviando só as faixas alteradas em relação ao último
+    conteúdo conhecido (registro), com novas tentativas para armazenamento remoto.
+
+    Args:
+        armazenamento: Destino da gravação
+        registro: Último conteúdo conhecido de cada aba (atualizado aqui)
+        aba: Nome da aba
+        valores: Conteúdo completo, com cabeçalho
+        incremental: False força a reescrita completa
+        tentativas: Máximo de tentativas (só para armazenamento remoto)
+        espera_base: Base do backoff exponencial para falhas que não são de cota
+
+    Returns:
+        Número de células enviadas (0 se nada mudou)
+
+    Raises:
+        Exception: A última falha, depois de esgotadas as tentativas
+    """
+    faixas = None
+    if incremental and aba in registro:
+        faixas = calcular_faixas_alteradas(registro[aba], valores)
+        if faixas == []:
+            return 0  # Nada mudou: nenhuma chamada à API
+
+    maximo = tentativas if armazenamento.remoto else 1
+    for tentativa in range(maximo):
+        try:
+            celulas = armazenamento.gravar_valores(aba, valores, faixas)
+            registro[aba] = [[str(v) for v in linha] for linha in valores]
+            return celulas
+        except Exception as e:
+            if tentativa == maximo - 1:
+                registro.pop(aba, None)
+                raise
+            if eh_erro_de_cota(e):
+                # Cota excedida: a próxima tentativa espera na fila do limitador
+                armazenamento.registrar_erro(e, "escrita")
+            else:
+                time.sleep(espera_base * (2 ** tentativa))
+    return 0
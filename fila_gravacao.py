@@ -0,0 +1,187 @@
+"""
+Fila de gravação em segundo plano (write-behind).
+
+O botão "Salvar" só enfileira as abas alteradas e devolve o controle à
+interface; uma thread dedicada grava as abas no armazenamento, na ordem em
+que foram enfileiradas. Salvamentos seguidos da mesma aba ainda não gravada
+são fundidos: apenas a versão mais recente é enviada. As abas de um mesmo
+salvamento formam um lote, com o total de abas e células gravadas.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+class FilaGravacao:
+    """
+    Fila de abas a gravar, atendida por uma thread de trabalho.
+
+    Args:
+        gravar: Função (aba, DataFrame) -> células enviadas; deve lançar exceção em caso de falha
+        ao_falhar: Função chamada com o nome da aba quando a gravação falha (opcional)
+        pausa: Segundos de espera entre duas gravações (alívio de cota da API)
+    """
+
+    def __init__(self, gravar: Callable[[str, pd.DataFrame], int],
+                 ao_falhar: Optional[Callable[[str], None]] = None,
+                 pausa: float = 0.0):
+        self._gravar = gravar
+        self._ao_falhar = ao_falhar
+        self._pausa = pausa
+
+        self._cond = threading.Condition()
+        self._pendentes: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._em_gravacao: Optional[tuple] = None  # (aba, DataFrame)
+        self._falhas: Dict[str, tuple] = {}        # {aba: (DataFrame, mensagem)}
+        self._concluidas = deque(maxlen=20)        # [(aba, células, hora)]
+        self._salvamentos = deque(maxlen=20)       # [lote], um por salvamento
+        self._lote_pendente: Dict[str, dict] = {}  # {aba: lote} das abas na fila
+        self._fundidas = 0
+
+        self._thread = threading.Thread(target=self._trabalhar, name="fila-gravacao", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Interface usada pela aplicação
+    # ------------------------------------------------------------------
+    def enfileirar(self, aba: str, df: pd.DataFrame, lote: Optional[dict] = None):
+        """Enfileira uma aba; se já havia uma versão pendente, ela é substituída."""
+        with self._cond:
+            if aba in self._pendentes:
+                self._fundidas += 1
+                anterior = self._lote_pendente.pop(aba, None)
+                if anterior is not None:
+                    anterior['restantes'].discard(aba)  # Quem grava a aba é o lote mais novo
+            if lote is not None:
+                self._lote_pendente[aba] = lote
+            self._pendentes[aba] = df.copy()  # Mantém a posição original na fila
+            self._falhas.pop(aba, None)
+            self._cond.notify_all()
+
+    def enfileirar_lote(self, abas: List[Tuple[str, pd.DataFrame]]):
+        """
+        Enfileira as abas de um salvamento, contabilizadas juntas em estado()['salvamentos'].
+
+        Args:
+            abas: Lista de (aba, DataFrame) alterados no salvamento
+        """
+        if not abas:
+            return
+        with self._cond:
+            lote = {
+                'hora': datetime.now().strftime("%H:%M:%S"),
+                'restantes': {aba for aba, _ in abas},
+                'gravadas': 0, 'celulas': 0, 'falhas': 0,
+            }
+            self._salvamentos.append(lote)
+            for aba, df in abas:
+                self.enfileirar(aba, df, lote)
+
+    def pendentes(self) -> Dict[str, pd.DataFrame]:
+        """
+        Conteúdo ainda não confirmado no armazenamento (em gravação + na fila),
+        para que as leituras enxerguem os próprios salvamentos.
+        """
+        with self._cond:
+            resultado = {}
+            if self._em_gravacao is not None:
+                aba, df = self._em_gravacao
+                resultado[aba] = df
+            resultado.update(self._pendentes)
+            return resultado
+
+    def reenviar_falhas(self) -> List[str]:
+        """Devolve à fila as abas cuja gravação falhou."""
+        with self._cond:
+            abas = list(self._falhas.keys())
+            reenvio = [(aba, df) for aba, (df, _) in self._falhas.items() if aba not in self._pendentes]
+            self._falhas.clear()
+            self.enfileirar_lote(reenvio)
+            self._cond.notify_all()
+            return abas
+
+    def estado(self) -> Dict:
+        """
+        Resumo para a interface: pendentes, em gravação, concluídas, falhas e,
+        por salvamento, hora, abas/células gravadas, falhas e se já terminou.
+        """
+        with self._cond:
+            return {
+                'pendentes': list(self._pendentes.keys()),
+                'em_gravacao': self._em_gravacao[0] if self._em_gravacao else None,
+                'concluidas': list(self._concluidas),
+                'salvamentos': [
+                    {'hora': lote['hora'], 'abas': lote['gravadas'], 'celulas': lote['celulas'],
+                     'falhas': lote['falhas'], 'concluido': not lote['restantes']}
+                    for lote in self._salvamentos
+                ],
+                'falhas': {aba: msg for aba, (_, msg) in self._falhas.items()},
+                'fundidas': self._fundidas,
+            }
+
+    def ocupada(self) -> bool:
+        """True enquanto houver aba na fila ou em gravação."""
+        with self._cond:
+            return bool(self._pendentes) or self._em_gravacao is not None
+
+    def aguardar(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a fila esvaziar.
+
+        Returns:
+            True se esvaziou dentro do prazo
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pendentes or self._em_gravacao is not None:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+            return True
+
+    # ------------------------------------------------------------------
+    # Thread de trabalho
+    # ------------------------------------------------------------------
+    def _trabalhar(self):
+        while True:
+            with self._cond:
+                while not self._pendentes:
+                    self._cond.wait()
+                aba, df = self._pendentes.popitem(last=False)
+                lote = self._lote_pendente.pop(aba, None)
+                self._em_gravacao = (aba, df)
+
+            try:
+                celulas = self._gravar(aba, df)
+                with self._cond:
+                    self._concluidas.append((aba, celulas, datetime.now().strftime("%H:%M:%S")))
+                    if lote is not None:
+                        lote['gravadas'] += 1
+                        lote['celulas'] += celulas
+            except Exception as e:
+                if self._ao_falhar is not None:
+                    try:
+                        self._ao_falhar(aba)
+                    except Exception:
+                        pass
+                with self._cond:
+                    # Só guarda a falha se não houver versão mais nova já na fila
+                    if aba not in self._pendentes:
+                        self._falhas[aba] = (df, str(e))
+                    if lote is not None:
+                        lote['falhas'] += 1
+            finally:
+                with self._cond:
+                    if lote is not None:
+                        lote['restantes'].discard(aba)
+                    self._em_gravacao = None
+                    self._cond.notify_all()
+
+            if self._pausa:
+                time.sleep(self._pausa)
@@ -0,0 +1,632 @@
+"""
+Geração da grade da rede (aba 7), sem dependência do Streamlit.
+
+Reúne a FASE 1 (alocação dos professores existentes, bloco a bloco) e a
+FASE 2 (consolidação das aulas não preenchidas em novas vagas). O
+progresso é informado por uma função de relato, para que a geração possa
+rodar fora da thread do script (ver tarefa_geracao.py).
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from config import COLS_PADRAO, PROCESSOS_GERACAO, SLOTS_AULA
+from utils import (
+    padronizar, padronizar_materia_interna, gerar_codigo_padrao,
+    MATERIAS_ESPECIALISTAS_INTERNAS
+)
+from regras_alocacao import (
+    calcular_pl_ldb, verificar_limites_carga, distribuir_carga_inteligente,
+    REGRA_CARGA_HORARIA
+)
+from alocador import (
+    carregar_objs, carregar_rotas, definir_ocupacao, resolver_grade_inteligente,
+    construir_indice_candidatos, candidatos_elegiveis,
+    montar_particoes_rede, resolver_rede_paralela, somar_tempo, ler_materias_slots, REGRAS_DIAGNOSTICO
+)
+
+
+class GeracaoCancelada(Exception):
+    """Lançada dentro da geração quando o cancelamento é pedido."""
+
+
+# ==========================================
+# IMPRESSÕES DIGITAIS DOS BLOCOS (GERAÇÃO INCREMENTAL)
+# ==========================================
+def chave_bloco(escola: str, dia: str, turno: str) -> str:
+    """Chave textual de um bloco escola/dia/turno, igual para Turmas e Horario."""
+    return "|".join(padronizar(x) for x in (escola, dia, turno))
+
+
+def impressoes_blocos(dt: pd.DataFrame, dc: pd.DataFrame, dp: pd.DataFrame,
+                      dd: pd.DataFrame, indice_demanda: Dict) -> Dict[str, str]:
+    """
+    Impressão digital das entradas de cada bloco escola/dia/turno: turmas
+    (nome, série, região), aulas do currículo de cada série e professores
+    elegíveis (matéria, região e turno) com o vínculo.
+
+    CARGA_HORÁRIA, QTD_PL e ESCOLAS_ALOCADAS ficam de fora: carregar_banco
+    os recalcula a partir do Horario a cada leitura, e com eles todo bloco
+    pareceria alterado depois de salvar e recarregar.
+
+    Returns:
+        {chave_bloco: sha1}
+    """
+    profs = carregar_objs(dp)
+    indice_candidatos = construir_indice_candidatos(profs, dt['REGIÃO'])
+    merged = pd.merge(dt, dd, on="SÉRIE/ANO", how="left").fillna({'DIA_PLANEJAMENTO': 'NÃO CONFIGURADO'})
+
+    blocos = {}
+    for r in merged.to_dict('records'):
+        chave = chave_bloco(r['ESCOLA'], r['DIA_PLANEJAMENTO'], r['TURNO'])
+        turno, reg = padronizar(r['TURNO']), padronizar(r['REGIÃO'])
+        aulas = list(indice_demanda['aulas'].get(r['SÉRIE/ANO'], []))[:SLOTS_AULA]
+        elegiveis = set()
+        for mat in set(aulas) - {"---"}:
+            for prof, _ in candidatos_elegiveis(indice_candidatos, mat, reg):
+                if not prof['tf'] or prof['tf'] in ["AMBOS", "", turno]:
+                    elegiveis.add(prof['id'])
+        bloco = blocos.setdefault(chave, {'turmas': [], 'profs': set()})
+        bloco['turmas'].append([r['TURMA'], r['SÉRIE/ANO'], reg, aulas])
+        bloco['profs'].update(elegiveis)
+
+    por_id = {p['id']: p for p in profs}
+    impressoes = {}
+    for chave, bloco in blocos.items():
+        conteudo = {
+            'turmas': sorted(bloco['turmas']),
+            'profs': [[pid, por_id[pid]['vin']] for pid in sorted(bloco['profs'])],
+        }
+        impressoes[chave] = hashlib.sha1(json.dumps(conteudo, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return impressoes
+
+
+def ler_impressoes_geracao(caminho: str) -> Optional[Dict[str, str]]:
+    """Impressões salvas com a última grade gerada (None se não houver)."""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def gravar_impressoes_geracao(caminho: str, impressoes: Dict[str, str]):
+    """Guarda as impressões da grade salva, base da próxima geração incremental."""
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(impressoes, f, ensure_ascii=False)
+
+
+def fixar_blocos_inalterados(horario_atual: pd.DataFrame, manter: set, particoes: Dict,
+                             profs: list) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Separa as linhas do Horario dos blocos mantidos e aplica as aulas delas
+    aos professores (carga, escolas visitadas e ocupação por bloco dia/turno).
+
+    Args:
+        horario_atual: Aba Horario atual
+        manter: Chaves (chave_bloco) dos blocos que não serão refeitos
+        particoes: Blocos dia/turno de montar_particoes_rede (para as chaves da ocupação)
+        profs: Professores (alterados no lugar)
+
+    Returns:
+        (linhas mantidas, ocupacao_fixa {chave da partição: {id: {slot: escola}}})
+    """
+    if horario_atual is None or horario_atual.empty:
+        return pd.DataFrame(columns=COLS_PADRAO["Horario"]), {}
+
+    chaves = horario_atual.apply(lambda r: chave_bloco(r['ESCOLA'], r['DIA'], r['TURNO']), axis=1)
+    mantidas = horario_atual[chaves.isin(manter)]
+
+    # Partições pelas chaves padronizadas (o Horario lido da planilha vem padronizado)
+    particao_de = {}
+    for chave in particoes:
+        dia, turno, escola = chave
+        particao_de[(padronizar(dia), padronizar(turno), padronizar(escola) if escola else None)] = chave
+
+    por_id = {p['id']: p for p in profs}
+    ocupacao_fixa = {}
+    for r in mantidas.to_dict('records'):
+        dia, turno, esc = padronizar(r['DIA']), padronizar(r['TURNO']), padronizar(r['ESCOLA'])
+        particao = particao_de.get((dia, turno, None)) or particao_de.get((dia, turno, esc))
+        for slot, col in enumerate(COLS_PADRAO["Horario"][-SLOTS_AULA:]):
+            p = por_id.get(r[col])
+            if p is None:
+                continue
+            p['atrib'] += 1
+            p['escolas_reais'].add(esc)
+            if particao is not None:
+                ocupacao_fixa.setdefault(particao, {}).setdefault(p['id'], {})[slot] = esc
+    return mantidas, ocupacao_fixa
+
+
+# ==========================================
+# CÉLULAS TRAVADAS NO EDITOR MANUAL
+# ==========================================
+def fixar_celulas_travadas(travas: pd.DataFrame, horario_atual: pd.DataFrame, particoes: Dict,
+                           profs: list, ocupacao_fixa: Dict) -> int:
+    """
+    Aplica as células travadas (aba Travas) às turmas dos blocos que serão
+    resolvidos. O valor atual da célula no Horario vai para turma['fixas']
+    e não é realocado; se for um professor, a aula entra na carga, nas
+    escolas visitadas e na ocupação fixa do bloco. Se a linha tiver a grade
+    de matérias (COMPONENTE), a matéria da célula vai para
+    turma['materias_fixas'], para que a célula não mude de matéria.
+
+    Args:
+        travas: Aba Travas (ESCOLA, TURMA, DIA, SLOT)
+        horario_atual: Aba Horario atual (de onde vêm os valores travados)
+        particoes: Blocos dia/turno a resolver (turmas alteradas no lugar)
+        profs: Professores (alterados no lugar)
+        ocupacao_fixa: {chave da partição: {id: {slot: escola}}} (alterado no lugar)
+
+    Returns:
+        Número de células travadas aplicadas
+    """
+    if travas is None or travas.empty or horario_atual is None or horario_atual.empty:
+        return 0
+
+    # Colunas de slot pelo nome padronizado ("1ª" é lido da planilha como "1A")
+    colunas = COLS_PADRAO["Horario"][-SLOTS_AULA:]
+    slot_de = {padronizar(col): slot for slot, col in enumerate(colunas)}
+
+    travadas = {}
+    for r in travas.to_dict('records'):
+        slot = slot_de.get(padronizar(r['SLOT']))
+        if slot is not None:
+            chave = (padronizar(r['ESCOLA']), padronizar(r['TURMA']), padronizar(r['DIA']))
+            travadas.setdefault(chave, set()).add(slot)
+
+    valores, materias = {}, {}
+    for r in horario_atual.to_dict('records'):
+        chave = (padronizar(r['ESCOLA']), padronizar(r['TURMA']), padronizar(r['DIA']))
+        if chave in travadas:
+            valores[chave] = [r[col] or "---" for col in colunas]
+            materias[chave] = ler_materias_slots(r.get('COMPONENTE'))
+
+    por_id = {p['id']: p for p in profs}
+    aplicadas = 0
+    for chave_particao, turmas in particoes.items():
+        dia = padronizar(chave_particao[0])
+        for turma in turmas:
+            esc = padronizar(turma['escola_real'])
+            chave = (esc, padronizar(turma['nome_turma']), dia)
+            if chave not in valores:
+                continue
+            turma['fixas'] = {slot: valores[chave][slot] for slot in sorted(travadas[chave])}
+            if materias[chave] is not None:
+                turma['materias_fixas'] = {slot: materias[chave][slot] for slot in turma['fixas']}
+            for slot, valor in turma['fixas'].items():
+                aplicadas += 1
+                p = por_id.get(valor)
+                if p is None:
+                    continue
+                p['atrib'] += 1
+                p['escolas_reais'].add(esc)
+                ocupacao_fixa.setdefault(chave_particao, {}).setdefault(p['id'], {})[slot] = esc
+    return aplicadas
+
+
+# ==========================================
+# DIAGNÓSTICO DA ALOCAÇÃO (DESCARTES POR REGRA)
+# ==========================================
+def relatorio_diagnostico(diagnostico: Optional[Dict]) -> pd.DataFrame:
+    """
+    Tabela do rastro da alocação: uma linha por escola/dia/turno/componente,
+    com as aulas, as aulas sem professor, as avaliações de candidatos e os
+    descartes de cada regra. GARGALO é a regra que mais descartou
+    candidatos entre os que lecionam o componente (MATERIA só quando
+    nenhum outro descarte houve); as linhas com aulas sem professor vêm
+    primeiro.
+
+    Args:
+        diagnostico: Acumulador preenchido por resolver_rede_paralela
+
+    Returns:
+        DataFrame (vazio se não houver diagnóstico)
+    """
+    regras = [r for r in REGRAS_DIAGNOSTICO if r != 'avaliacoes']
+    colunas = ["ESCOLA", "DIA", "TURNO", "COMPONENTE", "AULAS", "SEM_PROFESSOR", "AVALIACOES"] + \
+        [r.upper() for r in regras] + ["GARGALO"]
+    linhas = []
+    for (esc, dia, turno, mat), c in (diagnostico or {}).get('regras', {}).items():
+        descartes = [c[r] for r in regras]
+        # A matéria descarta quase toda a rede; só é gargalo se for o único descarte
+        gargalo = max(regras[1:], key=lambda r: c[r])
+        gargalo = gargalo if c[gargalo] else ('materia' if c['materia'] else "")
+        linhas.append([esc, dia, turno, mat, c['aulas'], c['sem_professor'], c['avaliacoes']] +
+                      descartes + [gargalo.upper()])
+    df = pd.DataFrame(linhas, columns=colunas)
+    return df.sort_values(["SEM_PROFESSOR", "ESCOLA", "DIA", "TURNO", "COMPONENTE"],
+                          ascending=[False, True, True, True, True], ignore_index=True)
+
+
+# ==========================================
+# DEMANDA NÃO PREENCHIDA (FASE 2)
+# ==========================================
+def calcular_demanda_nao_preenchida(horario: pd.DataFrame, dt: pd.DataFrame, dp: pd.DataFrame,
+                                    indice_demanda: Dict) -> Dict[Tuple[str, str], int]:
+    """
+    Aulas de especialistas que faltam por (região, matéria), comparando as
+    aulas esperadas de cada turma do horário (currículo da série) com as
+    alocadas.
+
+    A matéria de uma aula alocada vem da grade de matérias que o alocador
+    grava na coluna COMPONENTE (ler_materias_slots). Nas linhas sem ela
+    (editadas à mão ou de gerações antigas), a aula conta para cada matéria
+    de especialista do professor (COMPONENTES). Tudo é feito com
+    merge/groupby: os slots do horário são derretidos em linhas (turma,
+    slot, professor), cruzados com a matéria do slot ou com as matérias dos
+    professores (explodidas uma vez) e os totais comparados com as aulas
+    esperadas.
+
+    Args:
+        horario: Aba Horario gerada (COLS_PADRAO["Horario"])
+        dt: Turmas (a primeira linha de cada escola/turma dá série e região)
+        dp: Professores
+        indice_demanda: Índice de construir_indice_demanda
+
+    Returns:
+        {(região padronizada, matéria): aulas faltando}
+    """
+    slots = COLS_PADRAO["Horario"][-SLOTS_AULA:]
+    turmas = horario[['ESCOLA', 'TURMA']].drop_duplicates().merge(
+        dt.drop_duplicates(['ESCOLA', 'TURMA'])[['ESCOLA', 'TURMA', 'SÉRIE/ANO', 'REGIÃO']],
+        on=['ESCOLA', 'TURMA']
+    )
+    if turmas.empty:
+        return {}
+
+    # Aulas esperadas por série e matéria
+    esperadas = pd.DataFrame(
+        [(serie, mat) for serie in turmas['SÉRIE/ANO'].unique() for mat in indice_demanda['aulas'].get(serie, [])],
+        columns=['SÉRIE/ANO', 'MATERIA']
+    ).value_counts().rename('ESPERADAS').reset_index()
+
+    # Aulas alocadas (slots derretidos), com o número da linha do horário
+    horario = horario.reset_index(drop=True).rename_axis('LINHA')
+    aulas = horario.melt(id_vars=['ESCOLA', 'TURMA'], value_vars=slots, var_name='SLOT',
+                         value_name='CÓDIGO', ignore_index=False)
+    aulas = aulas[aulas['CÓDIGO'].notna() & ~aulas['CÓDIGO'].isin(["---", ""])]
+
+    # Linhas com a grade de matérias do alocador: a matéria é a do slot
+    materias_slots = horario['COMPONENTE'].map(ler_materias_slots).dropna() \
+        if 'COMPONENTE' in horario else pd.Series(dtype=object)
+    pela_grade = aulas.index.isin(materias_slots.index)
+    grade = pd.DataFrame(materias_slots.tolist(), index=materias_slots.index, columns=slots) \
+        .melt(var_name='SLOT', value_name='MATERIA', ignore_index=False)
+    alocadas_grade = aulas[pela_grade].merge(grade, on=['LINHA', 'SLOT'])
+    alocadas_grade = alocadas_grade[alocadas_grade['MATERIA'].isin(MATERIAS_ESPECIALISTAS_INTERNAS)]
+    alocadas_grade = alocadas_grade.groupby(['ESCOLA', 'TURMA', 'MATERIA']).size().rename('ALOCADAS')
+
+    # Demais linhas: por professor, uma vez para cada matéria dele
+    aulas = aulas[~pela_grade].groupby(['ESCOLA', 'TURMA', 'CÓDIGO']).size().rename('QTD').reset_index()
+
+    # Matérias de especialista de cada professor (a primeira linha de cada código)
+    materias = dp.drop_duplicates('CÓDIGO')[['CÓDIGO', 'COMPONENTES']]
+    materias = materias.assign(MATERIA=materias['COMPONENTES'].astype(str).str.split(',')).explode('MATERIA')
+    materias['MATERIA'] = materias['MATERIA'].str.strip()
+    materias = materias[materias['MATERIA'] != ""]
+    materias['MATERIA'] = materias['MATERIA'].map(padronizar_materia_interna)
+    materias = materias[materias['MATERIA'].isin(MATERIAS_ESPECIALISTAS_INTERNAS)]
+
+    alocadas = aulas.merge(materias[['CÓDIGO', 'MATERIA']], on='CÓDIGO') \
+        .groupby(['ESCOLA', 'TURMA', 'MATERIA'])['QTD'].sum().rename('ALOCADAS')
+    alocadas = pd.concat([alocadas, alocadas_grade]).groupby(level=[0, 1, 2]).sum() \
+        .rename_axis(['ESCOLA', 'TURMA', 'MATERIA']).reset_index()
+
+    deficit = turmas.merge(esperadas, on='SÉRIE/ANO').merge(alocadas, on=['ESCOLA', 'TURMA', 'MATERIA'], how='left')
+    deficit['FALTAM'] = deficit['ESPERADAS'] - deficit['ALOCADAS'].fillna(0).astype(int)
+    deficit = deficit[deficit['FALTAM'] > 0]
+    deficit = deficit.assign(REGIÃO=deficit['REGIÃO'].map(padronizar)).groupby(['REGIÃO', 'MATERIA'])['FALTAM'].sum()
+    return {chave: int(qtd) for chave, qtd in deficit.items()}
+
+
+def gerar_grade_rede(
+    dt: pd.DataFrame,
+    dc: pd.DataFrame,
+    dp: pd.DataFrame,
+    dd: pd.DataFrame,
+    da: pd.DataFrame,
+    indice_demanda: Dict,
+    resolver: Callable = resolver_grade_inteligente,
+    processos: int = PROCESSOS_GERACAO,
+    relatar: Callable[[str], None] = print,
+    cancelado: Callable[[], bool] = lambda: False,
+    semente: Optional[int] = None,
+    horario_atual: Optional[pd.DataFrame] = None,
+    impressoes_anteriores: Optional[Dict[str, str]] = None,
+    travas: Optional[pd.DataFrame] = None,
+    diagnostico: bool = False
+) -> Dict:
+    """
+    Gera a grade de toda a rede e consolida as vagas não preenchidas.
+
+    Args:
+        dt, dc, dp, dd, da: Turmas, Currículo, Professores, ConfigDias e Agrupamentos
+        indice_demanda: Índice de construir_indice_demanda
+        resolver: resolver_grade_inteligente ou resolver_grade_exata
+        processos: Processos para os blocos dia/turno (1 = sequencial)
+        relatar: Recebe cada mensagem de progresso
+        cancelado: Consultada entre os blocos; se True, a geração é interrompida
+        semente: Semente da alocação (None = aleatória); a mesma semente com os
+            mesmos dados gera a mesma grade
+        horario_atual, impressoes_anteriores: Se informados (modo incremental),
+            só os blocos escola/dia/turno cujas entradas mudaram desde a última
+            geração são refeitos; as linhas dos demais ficam como estão
+        travas: Células travadas no editor manual (aba Travas); mantêm o valor
+            que têm em horario_atual e a alocação é feita em volta delas
+        diagnostico: Se True, registra os descartes de candidatos por regra
+            e o tempo de cada fase (só o motor heurístico conta os descartes)
+
+    Returns:
+        {'professores': dp com cargas atualizadas e novas vagas,
+         'horario': DataFrame da aba Horario, 'escolas': escolas processadas,
+         'blocos_refeitos': blocos refeitos (None = rede inteira),
+         'diagnostico': {'regras': relatorio_diagnostico, 'tempos': {fase: segundos}}
+         ou None}
+
+    Raises:
+        GeracaoCancelada: se o cancelamento for pedido
+    """
+    inicio = time.perf_counter()
+    rastro = {} if diagnostico else None
+    dp = dp.copy()  # O DataFrame original só muda quando o resultado é salvo
+    
+    profs_obj = carregar_objs(dp)
+    rotas_obj = carregar_rotas(da)
+    map_esc_reg = dict(zip(dt['ESCOLA'], dt['REGIÃO']))
+    
+    relatar("📊 Dados carregados:")
+    relatar(f"  • {len(dt)} turmas")
+    relatar(f"  • {len(profs_obj)} professores")
+    relatar(f"  • {len(rotas_obj)} rotas configuradas")
+    
+    merged = pd.merge(dt, dd, on="SÉRIE/ANO", how="left").fillna({'DIA_PLANEJAMENTO': 'NÃO CONFIGURADO'})
+    escolas = merged['ESCOLA'].unique()
+    
+    # Resetar estado INICIAL dos professores
+    for p in profs_obj:
+        definir_ocupacao(p, {})
+        p['atrib'] = 0
+        p['escolas_reais'] = set()
+        p['regs_alocadas_historico'] = set()
+    
+    # Candidatos por (matéria, região) calculados uma vez para toda a rede
+    indice_candidatos = construir_indice_candidatos(profs_obj, dt['REGIÃO'])
+    
+    # Blocos de aulas simultâneas: todas as escolas do mesmo dia/turno juntas
+    particoes = montar_particoes_rede(merged)
+    
+    # Modo incremental: refazer só os blocos escola/dia/turno alterados
+    linhas_mantidas = pd.DataFrame(columns=COLS_PADRAO["Horario"])
+    ocupacao_fixa = {}
+    blocos_refeitos = None
+    if horario_atual is not None and impressoes_anteriores is not None:
+        atuais = impressoes_blocos(dt, dc, dp, dd, indice_demanda)
+        alterados = {k for k, h in atuais.items() if impressoes_anteriores.get(k) != h}
+        linhas_mantidas, ocupacao_fixa = fixar_blocos_inalterados(
+            horario_atual, set(atuais) - alterados, particoes, profs_obj
+        )
+        particoes_alteradas = {}
+        for chave, turmas in particoes.items():
+            dia, turno, _ = chave
+            refazer = [t for t in turmas if chave_bloco(t['escola_real'], dia, turno) in alterados]
+            if refazer:
+                particoes_alteradas[chave] = refazer
+        particoes = particoes_alteradas
+        escolas = sorted({t['escola_real'] for turmas in particoes.values() for t in turmas})
+        blocos_refeitos = len(alterados)
+        relatar(f"♻️ Modo incremental: {len(alterados)} de {len(atuais)} blocos escola/dia/turno alterados; "
+                f"{len(linhas_mantidas)} linhas do horário mantidas")
+    
+    # Células travadas no editor manual: ocupação e carga pré-atribuídas
+    n_travadas = fixar_celulas_travadas(travas, horario_atual, particoes, profs_obj, ocupacao_fixa)
+    if n_travadas:
+        relatar(f"🔒 {n_travadas} células travadas mantidas")
+    
+    relatar(f"🏫 Processando {len(escolas)} escolas em {len(particoes)} blocos dia/turno...")
+    
+    def relatar_bloco(dia, turno, lt, sucesso, res, mensagem):
+        if cancelado():
+            raise GeracaoCancelada()
+        
+        # Contar quantas aulas foram alocadas corretamente
+        total_alocadas = sum(sum(1 for a in aulas if a and a != "---") for aulas in res.values()) if res else 0
+        
+        # Contar aulas esperadas baseado no currículo
+        total_esperadas = sum(indice_demanda['total_aulas'].get(turma['ano'], 0) for turma in lt)
+        n_escolas = len({turma['escola_real'] for turma in lt})
+        
+        relatar(f"    • {dia} - {turno}: {mensagem} ({n_escolas} escolas, {len(lt)} turmas, {total_alocadas}/{total_esperadas} aulas alocadas)")
+        
+        # Diagnóstico detalhado se não alocou nada
+        if total_alocadas == 0 and total_esperadas > 0:
+            relatar("      ⚠️ NENHUMA aula alocada! Verificando professores disponíveis...")
+            materias_necessarias = set()
+            for turma in lt:
+                materias_necessarias.update(indice_demanda['aulas'].get(turma['ano'], []))
+            
+            regioes_nec = sorted({padronizar(turma['regiao_real']) for turma in lt})
+            for mat_nec, reg_nec in ((m, r) for m in materias_necessarias for r in regioes_nec):
+                profs_disponiveis = sum(1 for p in profs_obj if mat_nec in p['mats'] and 
+                                       p['atrib'] < min(p['max'], REGRA_CARGA_HORARIA["maximo_aulas"]))
+                pode_regiao = len(candidatos_elegiveis(indice_candidatos, mat_nec, reg_nec))
+                relatar(f"        • {mat_nec}: {profs_disponiveis} profs disponíveis, {pode_regiao} compatíveis com região {reg_nec}")
+    
+    if rastro is not None:
+        agora = time.perf_counter()
+        somar_tempo(rastro, 'entrada', agora - inicio)
+        inicio = agora
+    novos_horarios = resolver_rede_paralela(
+        particoes, dc, profs_obj, rotas_obj, map_esc_reg,
+        resolver=resolver,
+        indice_demanda=indice_demanda,
+        indice_candidatos=indice_candidatos,
+        ao_resolver=relatar_bloco,
+        processos=processos,
+        semente=semente,
+        ocupacao_fixa=ocupacao_fixa,
+        diagnostico=rastro,
+        cancelado=cancelado
+    )
+    # Linhas dos blocos mantidos (modo incremental) entram como estão, com as edições manuais
+    novos_horarios = linhas_mantidas[COLS_PADRAO["Horario"]].values.tolist() + novos_horarios
+    escolas_processadas = len(escolas)
+    if cancelado():
+        raise GeracaoCancelada()
+    if rastro is not None:
+        agora = time.perf_counter()
+        somar_tempo(rastro, 'fase1', agora - inicio)
+        inicio = agora
+    
+    # NÃO converter professores criados durante alocação
+    # Tudo será consolidado na FASE 2 abaixo
+    
+    # Atualizar cargas horárias dos professores existentes baseado nas alocações
+    relatar("📊 Atualizando cargas horárias e PL dos professores...")
+    for p_obj in profs_obj:
+        # Encontrar professor no DataFrame
+        idx = dp[dp['CÓDIGO'] == p_obj['id']].index
+        if len(idx) > 0:
+            # Atualizar carga horária com base nas atribuições reais
+            carga_atual = p_obj['atrib']
+            if carga_atual > 0:
+                dp.loc[idx[0], 'CARGA_HORÁRIA'] = max(carga_atual, dp.loc[idx[0], 'CARGA_HORÁRIA'])
+                
+                # REGRA 5: Atualizar PL baseado na LDB
+                pl_ldb = calcular_pl_ldb(dp.loc[idx[0], 'CARGA_HORÁRIA'])
+                dp.loc[idx[0], 'QTD_PL'] = pl_ldb
+                
+                # Atualizar escolas alocadas
+                escolas_reais = ','.join(p_obj['escolas_reais']) if p_obj['escolas_reais'] else dp.loc[idx[0], 'ESCOLAS_ALOCADAS']
+                if escolas_reais:
+                    dp.loc[idx[0], 'ESCOLAS_ALOCADAS'] = escolas_reais
+    
+    # ===== FASE 2: CONSOLIDAR VAGAS NÃO PREENCHIDAS =====
+    relatar("📊 Analisando demanda não atendida e consolidando...")
+    
+    # Contar demanda não preenchida por região/matéria
+    demanda_nao_preenchida = calcular_demanda_nao_preenchida(
+        pd.DataFrame(novos_horarios, columns=COLS_PADRAO["Horario"]), dt, dp, indice_demanda
+    )
+    
+    total_aulas_faltando = sum(demanda_nao_preenchida.values())
+    relatar(f"📊 Total de aulas não preenchidas: {total_aulas_faltando} em {len(demanda_nao_preenchida)} combinações região/matéria")
+    
+    # Mostrar detalhes
+    if demanda_nao_preenchida:
+        relatar("📋 Detalhes por região/matéria:")
+        for (reg, mat), qtd in sorted(demanda_nao_preenchida.items()):
+            relatar(f"  • {mat} - {reg}: {qtd} aulas faltando")
+    
+    # ===== CRIAR NOVOS PROFESSORES CONSOLIDADOS =====
+    if demanda_nao_preenchida:
+        relatar("🔄 Criando novos professores consolidados para vagas não preenchidas...")
+        
+        novos_profs = []
+        numeros_existentes = []
+        
+        # Coletar números existentes de todos os professores (incluindo os criados durante alocação)
+        for _, p_row in dp.iterrows():
+            match = re.search(r'P(\d+)', str(p_row['CÓDIGO']))
+            if match:
+                numeros_existentes.append(int(match.group(1)))
+        
+        proximo_numero = max(numeros_existentes) + 1 if numeros_existentes else 1
+        
+        for (reg, mat), qtd_aulas in sorted(demanda_nao_preenchida.items()):
+            if qtd_aulas <= 0:
+                continue
+            
+            # REGRA 7: Distribuir carga de forma inteligente
+            cargas = distribuir_carga_inteligente(qtd_aulas)
+            
+            # Validar cada carga
+            cargas_validas = []
+            for carga in cargas:
+                valido, msg = verificar_limites_carga(carga, qtd_aulas)
+                if valido:
+                    cargas_validas.append(carga)
+                else:
+                    # Ajustar para o mínimo se necessário
+                    if REGRA_CARGA_HORARIA["permitir_menor_se_necessario"]:
+                        carga_ajustada = max(1, min(carga, qtd_aulas))
+                        cargas_validas.append(carga_ajustada)
+            
+            # Se não gerou cargas válidas, usar distribuição simples respeitando limites
+            if not cargas_validas:
+                carga_max = REGRA_CARGA_HORARIA["maximo_aulas"]
+                carga_min = REGRA_CARGA_HORARIA["minimo_aulas"]
+                if qtd_aulas <= carga_max:
+                    cargas_validas = [qtd_aulas]
+                else:
+                    # Dividir respeitando limites
+                    num_profs = math.ceil(qtd_aulas / carga_max)
+                    carga_por_prof = qtd_aulas / num_profs
+                    cargas_validas = []
+                    restante = qtd_aulas
+                    for i in range(num_profs):
+                        if i == num_profs - 1:
+                            carga = restante
+                        else:
+                            carga = min(carga_max, max(carga_min, round(carga_por_prof)))
+                            restante -= carga
+                        cargas_validas.append(max(1, carga))
+            
+            cargas = cargas_validas
+            
+            # Criar os professores
+            escolas_regiao = list(set(dt[dt['REGIÃO'] == reg]['ESCOLA'].unique()))
+            
+            for i, carga in enumerate(cargas):
+                if carga > 0:
+                    cod = gerar_codigo_padrao(proximo_numero, "DT", reg, mat)
+                    proximo_numero += 1
+                    
+                    # REGRA 5: Calcular PL baseado na LDB (1/3)
+                    pl_ldb = calcular_pl_ldb(carga)
+                    
+                    novos_profs.append({
+                        "CÓDIGO": cod,
+                        "NOME": f"VAGA {mat} {reg}",
+                        "COMPONENTES": mat,
+                        "CARGA_HORÁRIA": carga,
+                        "REGIÃO": reg,
+                        "VÍNCULO": "DT",
+                        "TURNO_FIXO": "",
+                        "ESCOLAS_ALOCADAS": ",".join(escolas_regiao[:2]),
+                        "QTD_PL": pl_ldb  # PL calculado pela LDB
+                    })
+                    
+                    relatar(f"  ✅ {cod}: {carga}h ({mat} - {reg})")
+        
+        # Adicionar novos professores ao dataframe
+        if novos_profs:
+            dp_com_novos = pd.concat([dp, pd.DataFrame(novos_profs)], ignore_index=True)
+            relatar(f"✅ {len(novos_profs)} novos professores consolidados criados")
+        else:
+            dp_com_novos = dp
+    else:
+        dp_com_novos = dp
+        relatar("✅ Todas as vagas foram preenchidas!")
+    
+    df_horario = pd.DataFrame(novos_horarios, columns=COLS_PADRAO["Horario"])
+    
+    relatorio = None
+    if rastro is not None:
+        somar_tempo(rastro, 'fase2', time.perf_counter() - inicio)
+        relatorio = {'regras': relatorio_diagnostico(rastro), 'tempos': rastro['tempos']}
+        relatar("🔬 Tempos: " + ", ".join(f"{fase} {seg:.2f}s" for fase, seg in rastro['tempos'].items()))
+    
+    return {'professores': dp_com_novos, 'horario': df_horario, 'escolas': escolas_processadas,
+            'blocos_refeitos': blocos_refeitos, 'diagnostico': relatorio}
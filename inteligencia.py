@@ -3,26 +3,97 @@ import math
 import re
 
 # 1. Importar Configurações
-from config import MATERIAS_ESPECIALISTAS, DIAS_SEMANA, SLOTS_AULA, CARGA_MAXIMA_PADRAO, MEDIA_ALVO_PADRAO
+from config import DIAS_SEMANA, SLOTS_AULA, CARGA_MAXIMA_PADRAO, MEDIA_ALVO_PADRAO
 
 # 2. Importar Utilitários
 # (Aqui só trazemos o que realmente existe em utils.py)
-from utils import padronizar, padronizar_materia_interna, gerar_codigo_padrao
+from utils import padronizar, padronizar_materia_interna, gerar_codigo_padrao, MATERIAS_ESPECIALISTAS_INTERNAS
 
 # 3. Importar Regras
 # (A função calcular_pl_ldb mora AQUI, em regras_alocacao.py)
 from regras_alocacao import distribuir_carga_inteligente, calcular_pl_ldb
 
+# ==============================================================================
+# ÍNDICE DE DEMANDA (CURRÍCULO POR SÉRIE)
+# ==============================================================================
+def construir_indice_demanda(dt, dc, dd=None):
+    """
+    Monta, em uma única passada, as consultas de demanda usadas pelo sistema
+    inteiro (análise, gerador, dashboard, editor), no lugar de filtrar
+    dc[dc['SÉRIE/ANO'] == serie] dentro de laços sobre as turmas.
+
+    Args:
+        dt: DataFrame de turmas
+        dc: DataFrame do currículo
+        dd: DataFrame de ConfigDias (opcional)
+
+    Returns:
+        Dicionário com:
+        - 'curriculo': {série: [(matéria interna, qtd), ...]} todos os componentes
+        - 'especialistas': {série: [(matéria interna, qtd), ...]} só especialistas
+        - 'aulas': {série: [matéria, matéria, ...]} aulas de especialistas expandidas
+        - 'total_aulas': {série: total de aulas de especialistas}
+        - 'turmas': {(escola, turma): {matéria: qtd}} vetor de demanda por turma
+        - 'dias': {série: [dias de planejamento]} (vazio sem dd)
+    """
+    curriculo, especialistas, aulas, total_aulas = {}, {}, {}, {}
+
+    if not dc.empty:
+        for serie, comp, qtd in zip(dc['SÉRIE/ANO'], dc['COMPONENTE'], dc['QTD_AULAS']):
+            mat = padronizar_materia_interna(comp)
+            qtd = int(qtd)
+            curriculo.setdefault(serie, []).append((mat, qtd))
+            if mat in MATERIAS_ESPECIALISTAS_INTERNAS:
+                especialistas.setdefault(serie, []).append((mat, qtd))
+                aulas.setdefault(serie, []).extend([mat] * qtd)
+                total_aulas[serie] = total_aulas.get(serie, 0) + qtd
+
+    # Vetor de demanda de especialistas por turma
+    vetores_serie = {}
+    for serie, itens in especialistas.items():
+        vetor = {}
+        for mat, qtd in itens:
+            vetor[mat] = vetor.get(mat, 0) + qtd
+        vetores_serie[serie] = vetor
+
+    turmas = {}
+    if not dt.empty:
+        for escola, turma, serie in zip(dt['ESCOLA'], dt['TURMA'], dt['SÉRIE/ANO']):
+            turmas[(escola, turma)] = vetores_serie.get(serie, {})
+
+    dias = {}
+    if dd is not None and not dd.empty:
+        for serie, dia in zip(dd['SÉRIE/ANO'], dd['DIA_PLANEJAMENTO']):
+            lista = dias.setdefault(serie, [])
+            if dia not in lista:
+                lista.append(dia)
+
+    return {
+        'curriculo': curriculo,
+        'especialistas': especialistas,
+        'aulas': aulas,
+        'total_aulas': total_aulas,
+        'turmas': turmas,
+        'dias': dias,
+    }
+
 # ==============================================================================
 # FUNÇÃO 1: ANÁLISE DE DEMANDA (CÉREBRO)
 # ==============================================================================
-def analisar_demanda_inteligente(dt, dc, dd, da):
+def analisar_demanda_inteligente(dt, dc, dd, da, indice=None):
     """
     Analisa a demanda considerando:
     1. Volume total de aulas
     2. Simultaneidade (aulas acontecendo ao mesmo tempo)
     3. Agrupamento por Região
+
+    O índice de demanda (construir_indice_demanda) é montado aqui se não for informado.
     """
+    if dt.empty:
+        return pd.DataFrame()
+    if indice is None:
+        indice = construir_indice_demanda(dt, dc, dd)
+
     # Dicionário para mapear ocupação: { (Dia, Turno, Região, Matéria): Qtd_Turmas_Simultaneas }
     mapa_simultaneidade = {}
     
@@ -30,28 +101,15 @@ def analisar_demanda_inteligente(dt, dc, dd, da):
     volume_total = {}
 
     # 1. Expandir a demanda no tempo (Cruzando Turmas + ConfigDias + Currículo)
-    for _, turma in dt.iterrows():
-        serie = turma['SÉRIE/ANO']
-        regiao = padronizar(turma['REGIÃO'])
-        turno_turma = turma['TURNO']
-        
-        # Buscar dias configurados para essa série
-        dias_config = dd[dd['SÉRIE/ANO'] == serie]
+    for serie, regiao, turno_turma in zip(dt['SÉRIE/ANO'], dt['REGIÃO'], dt['TURNO']):
+        regiao = padronizar(regiao)
         
+        # Dias configurados para essa série
         # Se não tiver dia configurado, assumimos distribuição uniforme (fallback)
-        dias_aula = dias_config['DIA_PLANEJAMENTO'].unique() if not dias_config.empty else DIAS_SEMANA
+        dias_aula = indice['dias'].get(serie) or DIAS_SEMANA
         
-        # Buscar currículo (quais matérias essa turma tem)
-        curr = dc[dc['SÉRIE/ANO'] == serie]
-        
-        for _, item in curr.iterrows():
-            mat = padronizar_materia_interna(item['COMPONENTE'])
-            
-            # Só nos interessa especialistas
-            if mat not in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                continue
-                
-            qtd_aulas = int(item['QTD_AULAS'])
+        # Currículo de especialistas da série (só eles nos interessam)
+        for mat, qtd_aulas in indice['especialistas'].get(serie, []):
             
             # A. Contabilizar Volume Total
             chave_vol = (regiao, mat)
@@ -103,13 +161,13 @@ def analisar_demanda_inteligente(dt, dc, dd, da):
 # ==============================================================================
 # FUNÇÃO 2: GERAÇÃO DE OBJETOS (CRIAÇÃO)
 # ==============================================================================
-def gerar_novos_professores_inteligentes(dt, dc, dd, da, dp_existente):
+def gerar_novos_professores_inteligentes(dt, dc, dd, da, dp_existente, indice=None):
     """
     1. Executa a análise inteligente (simultaneidade + volume).
     2. Converte as sugestões em objetos de professor prontos para o DataFrame.
     """
     # 1. Obter a análise baseada em dados
-    df_analise = analisar_demanda_inteligente(dt, dc, dd, da)
+    df_analise = analisar_demanda_inteligente(dt, dc, dd, da, indice)
     
     if df_analise.empty:
         return pd.DataFrame(), pd.DataFrame() # Sem sugestões (retorna vazio compatível)
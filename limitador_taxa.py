@@ -0,0 +1,100 @@
+"""
+Limitador de taxa (token bucket) para as chamadas à API do Google Sheets.
+
+Um único limitador é compartilhado pelo processo inteiro, de modo que várias
+sessões abertas ao mesmo tempo dividem a mesma cota. Cada tipo de chamada
+(leitura/escrita) tem seu próprio balde, reabastecido continuamente até o
+limite por minuto. Quem encontra o balde vazio entra na fila e espera apenas
+o tempo necessário para a sua vez, em vez de dormir às cegas.
+"""
+
+import threading
+import time
+from typing import Dict
+
+
+def eh_erro_de_cota(erro: Exception) -> bool:
+    """True se a exceção indica cota da API excedida (HTTP 429)."""
+    texto = str(erro).lower()
+    return '429' in texto or 'quota exceeded' in texto
+
+
+class LimitadorTaxa:
+    """
+    Token bucket por tipo de chamada.
+
+    Args:
+        limites_por_minuto: {tipo: chamadas permitidas por minuto}, ex.
+            {"leitura": 60, "escrita": 60}
+    """
+
+    def __init__(self, limites_por_minuto: Dict[str, int]):
+        self._lock = threading.Lock()
+        agora = time.monotonic()
+        self._baldes = {
+            tipo: {
+                'capacidade': float(limite),
+                'taxa': limite / 60.0,  # fichas por segundo
+                'fichas': float(limite),
+                'atualizado': agora,
+            }
+            for tipo, limite in limites_por_minuto.items()
+        }
+        self._metricas = {
+            tipo: {'chamadas': 0, 'esperas': 0, 'segundos_espera': 0.0, 'cotas_excedidas': 0}
+            for tipo in limites_por_minuto
+        }
+
+    def _reabastecer(self, balde: Dict, agora: float):
+        decorrido = agora - balde['atualizado']
+        balde['fichas'] = min(balde['capacidade'], balde['fichas'] + decorrido * balde['taxa'])
+        balde['atualizado'] = agora
+
+    def adquirir(self, tipo: str, quantidade: int = 1) -> float:
+        """
+        Reserva fichas para uma chamada, esperando a vez se o balde estiver vazio.
+
+        A reserva é feita na hora (o saldo pode ficar negativo), então as
+        esperas formam uma fila: cada chamada aguarda o reabastecimento do
+        saldo deixado pelas anteriores.
+
+        Returns:
+            Segundos esperados
+        """
+        with self._lock:
+            balde = self._baldes[tipo]
+            self._reabastecer(balde, time.monotonic())
+            balde['fichas'] -= quantidade
+            espera = -balde['fichas'] / balde['taxa'] if balde['fichas'] < 0 else 0.0
+
+            metricas = self._metricas[tipo]
+            metricas['chamadas'] += quantidade
+            if espera > 0:
+                metricas['esperas'] += 1
+                metricas['segundos_espera'] += espera
+
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    def esgotar(self, tipo: str, segundos: float = 10.0):
+        """
+        Registra uma resposta 429: zera o saldo e adia as próximas chamadas
+        desse tipo por alguns segundos (elas esperam na fila do limitador).
+        """
+        with self._lock:
+            balde = self._baldes[tipo]
+            self._reabastecer(balde, time.monotonic())
+            balde['fichas'] = min(balde['fichas'], 0.0) - segundos * balde['taxa']
+            self._metricas[tipo]['cotas_excedidas'] += 1
+
+    def metricas(self) -> Dict[str, Dict]:
+        """Cópia das métricas por tipo (chamadas, esperas, tempo esperado, 429 recebidos)."""
+        with self._lock:
+            agora = time.monotonic()
+            resultado = {}
+            for tipo, metricas in self._metricas.items():
+                balde = self._baldes[tipo]
+                self._reabastecer(balde, agora)
+                resultado[tipo] = dict(metricas, disponiveis=max(0, int(balde['fichas'])))
+            return resultado
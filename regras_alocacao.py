@@ -101,12 +101,47 @@ REGRA_JANELAS = {
     "preferencia_aulas_consecutivas": True
 }
 
+def mascara_slots(slots) -> int:
+    """Bitmask dos slots (bit s ligado = aula no slot s)."""
+    mascara = 0
+    for s in slots:
+        mascara |= 1 << s
+    return mascara
+
+
+def slots_contiguos(mascara: int) -> bool:
+    """True se os slots da máscara formam um único bloco, sem buracos."""
+    # Somar o bit mais baixo "apaga" o primeiro bloco de bits; sobra algo só se houver outro bloco
+    return mascara & (mascara + (mascara & -mascara)) == 0
+
+
+def verificar_janelas_mascara(mascara_escola: int, mascara_rota: int, novo_slot: int) -> tuple[bool, int]:
+    """
+    Versão de verificar_janelas sobre bitmasks de slots (O(1)).
+
+    Args:
+        mascara_escola: Slots com aula do professor na mesma escola
+        mascara_rota: Slots com aula em escolas da mesma rota (usada só
+            se não houver aula na mesma escola)
+        novo_slot: Slot onde quer adicionar a aula (0-4)
+
+    Returns:
+        tuple: (cria_janela, bonus_preenchimento), como em verificar_janelas
+    """
+    mascara = mascara_escola or mascara_rota
+    if not mascara:
+        return False, 0  # Primeira aula na escola/rota, não há janela - PERMITIR
+    # O novo slot entra no conjunto: sem buracos = PERMITIR. O bônus de
+    # preenchimento nunca ocorre (um slot do conjunto não fica entre dois vizinhos)
+    return not slots_contiguos(mascara | (1 << novo_slot)), 0
+
+
 def verificar_janelas(ocupacao_professor: dict, novo_slot: int, escola: str, rotas: dict) -> tuple[bool, int]:
     """
     Verifica se adicionar uma aula em um slot criaria janelas/buracos.
     
     REGRA: Não pode ter janelas/buracos entre aulas na mesma escola ou rota.
-    PERMITE: Alocações que PREENCHEM buracos existentes.
+    A rota só é considerada se o professor ainda não tem aula na escola.
     
     Args:
         ocupacao_professor: Dicionário {slot: escola} das aulas já alocadas
@@ -117,66 +152,19 @@ def verificar_janelas(ocupacao_professor: dict, novo_slot: int, escola: str, rot
     Returns:
         tuple: (cria_janela: bool, bonus_preenchimento: int)
         - cria_janela: True se criar janela (NÃO PERMITIR), False se não criar (PERMITIR)
-        - bonus_preenchimento: Bonus positivo se preencher um buraco existente (para priorizar)
+        - bonus_preenchimento: Sempre 0 (ver verificar_janelas_mascara)
     """
     if not ocupacao_professor:
         return False, 0  # Primeira aula, não há janela - PERMITIR
     
-    # Verificar se há aulas na mesma escola
-    aulas_mesma_escola = [s for s, e in ocupacao_professor.items() if e == escola]
-    
-    if aulas_mesma_escola:
-        # Se há aulas na mesma escola, verificar se o novo slot é consecutivo
-        slots_escola = sorted(aulas_mesma_escola + [novo_slot])
-        
-        # Verificar se preenche um buraco existente
-        bonus_preenchimento = 0
-        for i in range(len(slots_escola) - 1):
-            gap = slots_escola[i+1] - slots_escola[i]
-            if gap > 1:
-                # Há um buraco existente
-                if novo_slot > slots_escola[i] and novo_slot < slots_escola[i+1]:
-                    # O novo slot PREENCHE o buraco - PERMITIR e dar bonus
-                    bonus_preenchimento = 1000  # Grande bonus por preencher buraco
-                    return False, bonus_preenchimento
-                else:
-                    # O novo slot CRIA um novo buraco - NÃO PERMITIR
-                    return True, 0
-        
-        # Não há buracos - PERMITIR
-        return False, 0
-    
-    # Verificar rotas (escolas que podem ser visitadas no mesmo dia)
     escolas_rota = rotas.get(escola, set())
-    aulas_na_rota = []
-    
+    mascara_escola = mascara_rota = 0
     for s_ocup, e_ocup in ocupacao_professor.items():
-        # Verificar se está na mesma rota
-        if e_ocup == escola or e_ocup in escolas_rota or escola in rotas.get(e_ocup, set()):
-            aulas_na_rota.append(s_ocup)
-    
-    if aulas_na_rota:
-        # Se há aulas na rota, verificar se o novo slot é consecutivo
-        slots_rota = sorted(aulas_na_rota + [novo_slot])
-        
-        # Verificar se preenche um buraco existente
-        for i in range(len(slots_rota) - 1):
-            gap = slots_rota[i+1] - slots_rota[i]
-            if gap > 1:
-                # Há um buraco existente
-                if novo_slot > slots_rota[i] and novo_slot < slots_rota[i+1]:
-                    # O novo slot PREENCHE o buraco - PERMITIR e dar bonus
-                    return False, 1000  # Grande bonus por preencher buraco
-                else:
-                    # O novo slot CRIA um novo buraco - NÃO PERMITIR
-                    return True, 0
-        
-        # Não há buracos - PERMITIR
-        return False, 0
-    
-    # Se é escola diferente e não está na rota, não há problema de janela
-    # (professor pode ter aulas em escolas diferentes sem problema)
-    return False, 0  # PERMITIR
+        if e_ocup == escola:
+            mascara_escola |= 1 << s_ocup
+        elif e_ocup in escolas_rota or escola in rotas.get(e_ocup, set()):
+            mascara_rota |= 1 << s_ocup
+    return verificar_janelas_mascara(mascara_escola, mascara_rota, novo_slot)
 
 # ==========================================
 # REGRA 5: LDB - CÁLCULO DE PL (PLANEJAMENTO)
@@ -0,0 +1,115 @@
+"""
+Execução da geração da grade em segundo plano.
+
+A geração roda em uma thread própria, fora do script do Streamlit: ela
+continua mesmo se a página for recarregada ou a aba do navegador fechada.
+As mensagens de progresso ficam guardadas para a interface exibir, o
+cancelamento é atendido entre os blocos e o resultado fica disponível até
+ser salvo ou descartado.
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from gerador import GeracaoCancelada
+
+
+class TarefaGeracao:
+    """
+    Uma geração por vez, atendida por uma thread de trabalho.
+
+    A função executada recebe (relatar, cancelado): relatar(mensagem)
+    registra o progresso e cancelado() informa se o cancelamento foi pedido.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._situacao = "ociosa"  # ociosa | executando | concluida | cancelada | erro
+        self._mensagens: List[str] = []
+        self._resultado: Any = None
+        self._erro: Optional[str] = None
+        self._inicio: Optional[str] = None
+        self._fim: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Interface usada pela aplicação
+    # ------------------------------------------------------------------
+    def iniciar(self, funcao: Callable[..., Any]) -> bool:
+        """
+        Inicia a geração, se não houver outra em andamento.
+
+        Um resultado anterior ainda não salvo é descartado.
+
+        Returns:
+            True se a geração foi iniciada
+        """
+        with self._lock:
+            if self._situacao == "executando":
+                return False
+            self._cancelar.clear()
+            self._situacao = "executando"
+            self._mensagens = []
+            self._resultado = None
+            self._erro = None
+            self._inicio = datetime.now().strftime("%H:%M:%S")
+            self._fim = None
+            self._thread = threading.Thread(target=self._trabalhar, args=(funcao,),
+                                            name="tarefa-geracao", daemon=True)
+            self._thread.start()
+            return True
+
+    def cancelar(self):
+        """Pede o cancelamento; a geração para no próximo ponto de verificação."""
+        self._cancelar.set()
+
+    def descartar(self):
+        """Esquece o resultado (após salvar) e volta ao estado ocioso."""
+        with self._lock:
+            if self._situacao != "executando":
+                self._situacao = "ociosa"
+                self._resultado = None
+                self._mensagens = []
+                self._erro = None
+
+    def estado(self) -> Dict:
+        """Resumo para a interface: situação, mensagens, resultado e horários."""
+        with self._lock:
+            return {
+                'situacao': self._situacao,
+                'mensagens': list(self._mensagens),
+                'resultado': self._resultado,
+                'erro': self._erro,
+                'inicio': self._inicio,
+                'fim': self._fim,
+                'cancelando': self._cancelar.is_set() and self._situacao == "executando",
+            }
+
+    def executando(self) -> bool:
+        """True enquanto houver geração em andamento."""
+        with self._lock:
+            return self._situacao == "executando"
+
+    # ------------------------------------------------------------------
+    # Thread de trabalho
+    # ------------------------------------------------------------------
+    def _relatar(self, mensagem: str):
+        with self._lock:
+            self._mensagens.append(mensagem)
+
+    def _trabalhar(self, funcao: Callable[..., Any]):
+        try:
+            resultado = funcao(self._relatar, self._cancelar.is_set)
+            situacao, erro = "concluida", None
+        except GeracaoCancelada:
+            resultado, situacao, erro = None, "cancelada", None
+        except Exception as e:
+            resultado, situacao, erro = None, "erro", str(e)
+
+        with self._lock:
+            self._resultado = resultado
+            self._situacao = situacao
+            self._erro = erro
+            self._fim = datetime.now().strftime("%H:%M:%S")
@@ -4,9 +4,10 @@ Funções utilitárias para processamento de texto e dados.
 
 import re
 import unicodedata
+from functools import lru_cache
 from typing import Optional, List
 import pandas as pd
-from config import MATERIAS_ESPECIALISTAS
+from config import MATERIAS_ESPECIALISTAS, TAMANHO_CACHE_NORMALIZACAO
 
 
 def remover_acentos(texto: str) -> str:
@@ -21,6 +22,11 @@ def remover_acentos(texto: str) -> str:
     """
     if not isinstance(texto, str):
         return str(texto)
+    return _remover_acentos_texto(texto)
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_NORMALIZACAO)
+def _remover_acentos_texto(texto: str) -> str:
     nfkd = unicodedata.normalize('NFKD', texto)
     return "".join([c for c in nfkd if not unicodedata.combining(c)])
 
@@ -35,9 +41,16 @@ def padronizar(texto) -> str:
     Returns:
         Texto padronizado
     """
+    if isinstance(texto, str):
+        return _padronizar_texto(texto)
     if pd.isna(texto):
         return ""
-    txt = remover_acentos(str(texto).upper().strip())
+    return _padronizar_texto(str(texto))
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_NORMALIZACAO)
+def _padronizar_texto(texto: str) -> str:
+    txt = remover_acentos(texto.upper().strip())
     if txt == "NAN":
         return ""
     return " ".join(txt.split())
@@ -53,6 +66,12 @@ def limpar_materia(nome: str) -> str:
     Returns:
         Nome padronizado da matéria
     """
+    if isinstance(nome, str):
+        return _limpar_materia_texto(nome)
+    return _limpar_materia_valor(nome)
+
+
+def _limpar_materia_valor(nome):
     nome_padrao = padronizar(nome)
     if "ART" in nome_padrao:
         return "ARTE"
@@ -67,6 +86,9 @@ def limpar_materia(nome: str) -> str:
     return nome
 
 
+_limpar_materia_texto = lru_cache(maxsize=TAMANHO_CACHE_NORMALIZACAO)(_limpar_materia_valor)
+
+
 def padronizar_materia_interna(nome: str) -> str:
     """
     Padroniza o nome de uma matéria para uso interno (sem acentos, maiúsculas).
@@ -77,9 +99,29 @@ def padronizar_materia_interna(nome: str) -> str:
     Returns:
         Nome padronizado para uso interno
     """
+    if isinstance(nome, str):
+        return _padronizar_materia_texto(nome)
     return remover_acentos(limpar_materia(nome)).upper()
 
 
+@lru_cache(maxsize=TAMANHO_CACHE_NORMALIZACAO)
+def _padronizar_materia_texto(nome: str) -> str:
+    return remover_acentos(limpar_materia(nome)).upper()
+
+
+# Matérias de especialistas já no formato interno (consulta O(1) em laços)
+MATERIAS_ESPECIALISTAS_INTERNAS = frozenset(
+    padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS
+)
+
+
+def limpar_caches_normalizacao():
+    """Esvazia os caches LRU das funções de normalização de texto."""
+    for funcao in (_remover_acentos_texto, _padronizar_texto,
+                   _limpar_materia_texto, _padronizar_materia_texto):
+        funcao.cache_clear()
+
+
 def gerar_sigla_regiao(regiao: str) -> str:
     """
     Gera sigla de uma região.
@@ -1,20 +1,27 @@
+from typing import Dict, Optional
+
 import streamlit as st
 import pandas as pd
 
 from config import MATERIAS_ESPECIALISTAS
-from utils import padronizar, padronizar_materia_interna
+from inteligencia import construir_indice_demanda
+from utils import padronizar, padronizar_materia_interna, MATERIAS_ESPECIALISTAS_INTERNAS
 
 
 def render_dashboard(dt: pd.DataFrame,
                      dc: pd.DataFrame,
                      dp: pd.DataFrame,
-                     gerar_estilo_professor_dinamico):
+                     gerar_estilo_professor_dinamico,
+                     indice_demanda: Optional[Dict] = None):
     """Renderiza a aba de Dashboard Gerencial."""
 
     if dt.empty or dc.empty:
         st.info("📝 O Dashboard ficará ativo assim que você cadastrar Turmas e Currículo.")
         return
 
+    if indice_demanda is None:
+        indice_demanda = construir_indice_demanda(dt, dc)
+
     st.markdown("### 📊 Visão Geral da Rede")
 
     # --- 1. FILTROS GLOBAIS ---
@@ -47,16 +54,11 @@ def render_dashboard(dt: pd.DataFrame,
         turma_nome = row['TURMA']
         escola_nome = row['ESCOLA']
 
-        curr = dc[dc['SÉRIE/ANO'] == serie]
-
-        for _, item in curr.iterrows():
-            mat_nome = padronizar_materia_interna(item['COMPONENTE'])
-            if mat_nome in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]:
-                if filtro_materia == "Todas" or padronizar_materia_interna(filtro_materia) == mat_nome:
-                    qtd = int(item['QTD_AULAS'])
-                    demanda_por_materia[mat_nome] = demanda_por_materia.get(mat_nome, 0) + qtd
-                    total_aulas_demanda += qtd
-                    auditoria_demanda.append(f"📌 {escola_nome} - {turma_nome}: +{qtd} {mat_nome}")
+        for mat_nome, qtd in indice_demanda['especialistas'].get(serie, []):
+            if filtro_materia == "Todas" or padronizar_materia_interna(filtro_materia) == mat_nome:
+                demanda_por_materia[mat_nome] = demanda_por_materia.get(mat_nome, 0) + qtd
+                total_aulas_demanda += qtd
+                auditoria_demanda.append(f"📌 {escola_nome} - {turma_nome}: +{qtd} {mat_nome}")
 
     # 3. CÁLCULO DE OFERTA (PROFESSORES)
     df_profs_filt = dp.copy()
@@ -93,7 +95,7 @@ def render_dashboard(dt: pd.DataFrame,
         carga_aulas = int(row['CARGA_HORÁRIA'])
 
         # Filtra apenas especialistas
-        mats_validas = [c for c in comps if c in [padronizar_materia_interna(m) for m in MATERIAS_ESPECIALISTAS]]
+        mats_validas = [c for c in comps if c in MATERIAS_ESPECIALISTAS_INTERNAS]
 
         if mats_validas:
             # Se der mais de uma matéria, divide. Se der só uma, pega tudo.